@@ -26,6 +26,9 @@ from models_db import Task
 from db_service import DBService
 from state_manager import state_manager
 from tasks import start_monitoring_task
+from message_extractor import extraction_cache
+from geo_filter import geo_filter
+from parse_pool import parse_pool
 from blacklist_service import BlacklistService
 from callback_handler import CallbackHandler
 
@@ -42,7 +45,11 @@ app = FastAPI(
 )
 
 # Сервис БД
-db_service = DBService(db_path=config.DB_PATH)
+db_service = DBService(
+    db_path=config.DB_PATH,
+    read_connections=config.DB_READ_CONNECTIONS,
+    flush_interval=config.DB_WRITE_FLUSH_MS / 1000
+)
 
 # Сервис черного списка (инициализируется при startup)
 blacklist_service: BlacklistService = None
@@ -78,7 +85,8 @@ async def cleanup_old_items_periodically():
                 f"📊 Статистика БД: "
                 f"задач={stats['tasks_count']}, "
                 f"объявлений={stats['found_items_count']}, "
-                f"кеш ЧС={stats['blacklist_cache_count']}"
+                f"кеш ЧС={stats['blacklist_cache_count']}, "
+                f"индекс ЧС={stats['blacklist_index_count']}"
             )
 
         except Exception as e:
@@ -100,26 +108,10 @@ async def startup_event():
     if paused_tasks:
         logger.info(f"Восстановление {len(paused_tasks)} задач после рестарта...")
 
-        # Дедупликация по session_path: одна сессия Pyrogram = один клиент.
-        # Если несколько задач используют одну сессию — восстанавливаем только последнюю
-        # (по порядку created_at), остальные помечаем как stopped.
-        latest_by_session: dict = {}
-        for task in paused_tasks:
-            key = task.session_path or config.SESSION_PATH
-            existing = latest_by_session.get(key)
-            if existing is None or task.created_at > existing.created_at:
-                latest_by_session[key] = task
-
-        # Помечаем устаревшие дубли как stopped
-        for task in paused_tasks:
-            key = task.session_path or config.SESSION_PATH
-            if latest_by_session[key].task_id != task.task_id:
-                await db_service.update_task_status(task_id=task.task_id, status='stopped')
-                logger.info(f"Дубль задачи {task.task_id} (та же сессия) → stopped")
-
-        # Восстанавливаем только уникальные задачи по сессии
+        # Задачи с одной session_path делят общий Pyrogram клиент
+        # (parser.client_registry), поэтому восстанавливаем все.
         restored = 0
-        for task in latest_by_session.values():
+        for task in paused_tasks:
             try:
                 filters = json.loads(task.filters)
                 filters['date_from'] = date_type.fromisoformat(filters['date_from'])
@@ -134,8 +126,11 @@ async def startup_event():
                     api_id=config.API_ID,
                     api_hash=config.API_HASH,
                     notification_chat_id=task.notification_chat_id,
+                    # Полную историю не перечитываем: пропущенное за время простоя
+                    # догоняется с сохранённых отметок чатов (chat_watermarks)
                     parse_history_days=0,
-                    session_path=task.session_path or config.SESSION_PATH
+                    session_path=task.session_path or config.SESSION_PATH,
+                    db_service=db_service
                 )
                 restored += 1
                 logger.info(f"Задача {task.task_id} (user={task.user_id}) восстановлена")
@@ -143,7 +138,8 @@ async def startup_event():
                 logger.error(f"Ошибка восстановления задачи {task.task_id}: {e}")
         logger.info(f"Восстановлено задач: {restored} из {len(paused_tasks)}")
 
-    # Инициализация сервиса черного списка (без запуска клиента!)
+    # Инициализация сервиса черного списка (клиент запускается при первой проверке
+    # и остаётся подключённым до простоя BLACKLIST_CLIENT_IDLE_TIMEOUT)
     # Используем ОТДЕЛЬНУЮ сессию чтобы не конфликтовать с основным парсером
     blacklist_service = BlacklistService(
         api_id=config.API_ID,
@@ -207,6 +203,16 @@ async def shutdown_event():
         except asyncio.CancelledError:
             logger.info("🧹 Auto-cleanup задача остановлена")
 
+    # Останавливаем тёплые клиенты черного списка
+    if blacklist_service:
+        await blacklist_service.clients.close()
+
+    # Останавливаем пул разбора истории (если был запущен)
+    parse_pool.shutdown()
+
+    # Дописываем очередь отложенных записей и закрываем соединения с БД
+    await db_service.close()
+
     logger.success("Workers Service остановлен")
 
 
@@ -282,7 +288,8 @@ async def start_monitoring(request: StartMonitoringRequest):
             api_hash=request.api_hash or config.API_HASH,
             notification_chat_id=request.notification_chat_id,
             parse_history_days=request.parse_history_days,
-            session_path=session_path
+            session_path=session_path,
+            db_service=db_service
         )
 
         return StartMonitoringResponse(
@@ -323,7 +330,12 @@ async def get_task_status(task_id: str):
             'items_found': max(in_mem['items_found'], db_items_found),
             'notifications_sent': max(in_mem['notifications_sent'], db_notifications_sent),
             'last_update': in_mem['last_update'],
+            'chats': {chat: dict(p) for chat, p in in_mem.get('chats', {}).items()},
         }
+        # Метрики polling fallback: сколько сообщений поймано мимо real-time
+        scheduler = task_state.get('poll_scheduler')
+        if scheduler:
+            stats['polling'] = scheduler.stats()
 
         return TaskStatusResponse(
             task_id=task_id,
@@ -510,6 +522,60 @@ async def check_in_blacklist(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/blacklist/index/sync")
+async def sync_blacklist_index(blacklist_session_path: Optional[str] = None):
+    """
+    Дочитать локальный индекс ЧС сейчас (обычно — не чаще BLACKLIST_SYNC_INTERVAL при проверках)
+
+    Args:
+        blacklist_session_path: путь к сессии ЧС (опционально)
+    """
+    try:
+        if not blacklist_service:
+            raise HTTPException(status_code=503, detail="Сервис черного списка не инициализирован")
+
+        result = await blacklist_service.refresh_index(session_name=blacklist_session_path)
+        return {"status": "ok", **result}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка синхронизации индекса ЧС: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/blacklist/search")
+async def search_blacklist_index(
+    fio: Optional[str] = None,
+    phone: Optional[str] = None,
+    days: int = 365,
+    limit: int = 20,
+):
+    """
+    Полнотекстовый поиск по локальному индексу ЧС (FTS5), без обращения к Telegram
+
+    Args:
+        fio: ФИО или его начало — каждое слово ищется как префикс ("Козл Ив")
+        phone: телефон в любой записи (сравниваются последние 10 цифр)
+        days: глубина поиска в днях
+        limit: максимум результатов (по релевантности, до 100)
+    """
+    try:
+        if not blacklist_service:
+            raise HTTPException(status_code=503, detail="Сервис черного списка не инициализирован")
+
+        result = await blacklist_service.search_index(fio=fio, phone=phone, days=days, limit=limit)
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка поиска по индексу ЧС: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ========== Управление чатами черного списка ==========
 
 @app.get("/blacklist/chats", response_model=BlacklistChatsListResponse)
@@ -621,59 +687,55 @@ async def get_chat_topics(chat_username: str, blacklist_session_path: Optional[s
     Returns:
         is_forum: bool, topics: [{id, name}]
     """
-    from pyrogram import Client
     from pyrogram.raw.functions.channels import GetForumTopics
     from pyrogram.raw.types import InputPeerChannel
 
-    effective_session = blacklist_session_path or config.BLACKLIST_SESSION_PATH
+    if not blacklist_service:
+        raise HTTPException(status_code=503, detail="Сервис черного списка не инициализирован")
 
-    client = Client(
-        name=effective_session,
-        api_id=config.API_ID,
-        api_hash=config.API_HASH,
-    )
+    effective_session = blacklist_session_path or config.BLACKLIST_SESSION_PATH
 
     try:
-        await client.start()
+        # Тёплый клиент ЧС (тот же, что у проверок), без start/stop на запрос
+        async with blacklist_service.clients.session(effective_session) as client:
+            chat = await client.get_chat(chat_username)
+            chat_id = chat.id
+            chat_title = chat.title
+
+            # Пробуем получить топики
+            peer = await client.resolve_peer(chat_id)
+
+            if not isinstance(peer, InputPeerChannel):
+                return {
+                    "is_forum": False,
+                    "chat_title": chat_title,
+                    "topics": []
+                }
 
-        chat = await client.get_chat(chat_username)
-        chat_id = chat.id
-        chat_title = chat.title
+            result = await client.invoke(
+                GetForumTopics(
+                    channel=peer,
+                    offset_date=0,
+                    offset_id=0,
+                    offset_topic=0,
+                    limit=100
+                )
+            )
 
-        # Пробуем получить топики
-        peer = await client.resolve_peer(chat_id)
+            topics = []
+            if hasattr(result, 'topics'):
+                for topic in result.topics:
+                    topics.append({
+                        "id": topic.id,
+                        "name": topic.title
+                    })
 
-        if not isinstance(peer, InputPeerChannel):
             return {
-                "is_forum": False,
+                "is_forum": len(topics) > 0,
                 "chat_title": chat_title,
-                "topics": []
+                "topics": topics
             }
 
-        result = await client.invoke(
-            GetForumTopics(
-                channel=peer,
-                offset_date=0,
-                offset_id=0,
-                offset_topic=0,
-                limit=100
-            )
-        )
-
-        topics = []
-        if hasattr(result, 'topics'):
-            for topic in result.topics:
-                topics.append({
-                    "id": topic.id,
-                    "name": topic.title
-                })
-
-        return {
-            "is_forum": len(topics) > 0,
-            "chat_title": chat_title,
-            "topics": topics
-        }
-
     except Exception as e:
         error_str = str(e)
         if "CHANNEL_FORUM_MISSING" in error_str:
@@ -685,9 +747,6 @@ async def get_chat_topics(chat_username: str, blacklist_session_path: Optional[s
         logger.error(f"Ошибка получения топиков чата {chat_username}: {e}")
         raise HTTPException(status_code=500, detail=error_str)
 
-    finally:
-        await client.stop()
-
 
 # ========== Admin Endpoints ==========
 
@@ -697,13 +756,17 @@ async def get_db_stats():
     Получить статистику БД (для мониторинга)
 
     Returns:
-        Словарь с количеством записей, датами, размером БД
+        Словарь с количеством записей, датами, размером БД,
+        счётчиками кэша извлечения (hits/misses) и тёплыми клиентами ЧС
     """
     try:
         stats = await db_service.get_db_stats()
         return {
             "status": "success",
-            "stats": stats
+            "stats": stats,
+            "extraction_cache": extraction_cache.stats(),
+            "geo_cache": geo_filter.cache_stats(),
+            "blacklist_clients": blacklist_service.clients.stats() if blacklist_service else {}
         }
     except Exception as e:
         logger.error(f"Ошибка получения статистики БД: {e}")
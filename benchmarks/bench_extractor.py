@@ -0,0 +1,75 @@
+"""
+Бенчмарк MessageExtractor.extract на записанном корпусе сообщений
+
+Корпус (benchmarks/corpus.jsonl): синтетические обезличенные объявления
+ПВЗ-чатов + примеры из tests/, ~18% кросс-постов. Поле expected — результат
+extract(), записанный эталонной реализацией: бенчмарк сначала сверяет с ним.
+
+Запуск:
+    python benchmarks/bench_extractor.py [--rounds 20] [--repeat 5]
+
+Время — лучшее из --repeat замеров (меньше шума от соседних процессов).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from loguru import logger
+
+from message_extractor import MessageExtractor
+
+CORPUS_PATH = Path(__file__).parent / 'corpus.jsonl'
+
+
+def load_corpus(path: Path = CORPUS_PATH) -> list:
+    """Прочитать корпус: [{'text', 'date': datetime, 'expected'}]"""
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            row['date'] = datetime.fromisoformat(row['date'])
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20, help='проходов по корпусу за замер')
+    parser.add_argument('--repeat', type=int, default=5, help='замеров (берётся лучший)')
+    args = parser.parse_args()
+
+    logger.remove()
+    corpus = load_corpus()
+
+    mismatches = [
+        row['text'] for row in corpus
+        if MessageExtractor.extract(row['text'], row['date']) != row['expected']
+    ]
+    if mismatches:
+        print(f"❌ Результат extract() расходится с эталоном: {len(mismatches)} сообщений")
+        for text in mismatches[:5]:
+            print(f"   {text[:70]!r}")
+        sys.exit(1)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for row in corpus:
+                MessageExtractor.extract(row['text'], row['date'])
+        timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+
+    total = len(corpus) * args.rounds
+    print(f"MessageExtractor.extract: {total} сообщений за {elapsed:.3f}с")
+    print(f"  {total / elapsed:,.0f} msgs/sec, {elapsed / total * 1e6:.1f} мкс/сообщение")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Набор бенчмарков конвейера обработки сообщений
+
+Замеряет на записанном корпусе (benchmarks/corpus.jsonl):
+  extract         — MessageExtractor.extract (без кэша)
+  geo_moscow      — GeoFilter.should_take_for_moscow (холодный кэш)
+  geo_spb         — GeoFilter.should_take_for_spb    (холодный кэш)
+  item_filter     — ItemFilter.matches по результатам extract
+  content_hash    — Deduplicator.create_content_hash
+  process_message — MonitoringTask.process_message end-to-end: фейковое
+                    сообщение Pyrogram, временная SQLite, уведомления заглушены
+
+Для каждого этапа — msgs/sec и латентность p50/p99 на сообщение, лучший
+из --repeat замеров (шум раннера только замедляет, особенно SQLite-этап
+process_message). Сравнение с benchmarks/baseline.json: если пропускная
+способность этапа упала больше чем на --tolerance, скрипт завершается
+с кодом 1 (для CI).
+
+Запуск:
+    python benchmarks/bench_pipeline.py                     # замер + проверка регрессий
+    python benchmarks/bench_pipeline.py --update-baseline   # записать текущие цифры как эталон
+    python benchmarks/bench_pipeline.py --only extract,geo_moscow
+
+Базовые цифры зависят от машины: эталон записывается на том же раннере,
+где потом проверяется.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from loguru import logger
+
+from bench_extractor import load_corpus
+from config import config
+from deduplicator import Deduplicator
+from filters import ItemFilter
+from geo_filter import geo_filter
+from message_extractor import MessageExtractor, extraction_cache
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+
+FILTERS = {
+    'date_from': date(2026, 1, 1),
+    'date_to': date(2027, 12, 31),
+    'min_price': 1000,
+    'max_price': 10000,
+    'shk_filter': 'любое',
+}
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summary(latencies_ns: list) -> dict:
+    """msgs/sec и p50/p99 (мкс) по латентностям отдельных сообщений."""
+    latencies_ns.sort()
+    total = sum(latencies_ns)
+    return {
+        'messages': len(latencies_ns),
+        'msgs_per_sec': round(len(latencies_ns) / (total / 1e9), 1) if total else 0.0,
+        'p50_us': round(_percentile(latencies_ns, 0.50) / 1000, 2),
+        'p99_us': round(_percentile(latencies_ns, 0.99) / 1000, 2),
+    }
+
+
+def _time_each(items: list, func, rounds: int, before_round=None) -> dict:
+    latencies = []
+    perf = time.perf_counter_ns
+    for _ in range(rounds):
+        if before_round:
+            before_round()
+        for item in items:
+            start = perf()
+            func(item)
+            latencies.append(perf() - start)
+    return _summary(latencies)
+
+
+# --------------------------------------------------------------------------- #
+# Этапы                                                                         #
+# --------------------------------------------------------------------------- #
+
+def bench_extract(corpus: list, rounds: int) -> dict:
+    return _time_each(corpus, lambda row: MessageExtractor.extract(row['text'], row['date']), rounds)
+
+
+def bench_geo_moscow(corpus: list, rounds: int) -> dict:
+    texts = [row['text'] for row in corpus]
+    return _time_each(texts, geo_filter.should_take_for_moscow, rounds, geo_filter.clear_cache)
+
+
+def bench_geo_spb(corpus: list, rounds: int) -> dict:
+    texts = [row['text'] for row in corpus]
+    return _time_each(texts, geo_filter.should_take_for_spb, rounds, geo_filter.clear_cache)
+
+
+def bench_item_filter(corpus: list, rounds: int) -> dict:
+    item_filter = ItemFilter(**FILTERS)
+    extracted = [row['expected'] for row in corpus if row['expected']]
+    return _time_each(extracted, item_filter.matches, rounds)
+
+
+def bench_content_hash(corpus: list, rounds: int) -> dict:
+    rows = [
+        ('author', (row['expected'] or {}).get('price'), None, row['text'])
+        for row in corpus
+    ]
+    return _time_each(rows, lambda args: Deduplicator.create_content_hash(*args), rounds)
+
+
+def _fake_message(index: int, row: dict):
+    """Сообщение в форме pyrogram.types.Message, достаточной для process_message."""
+    author_id = index % 97  # повторяющиеся авторы — срабатывает дедупликация по автору
+    return SimpleNamespace(
+        id=index + 1,
+        chat=SimpleNamespace(id=-100500, username='bench_chat', title='Bench'),
+        text=row['text'],
+        date=row['date'],
+        from_user=SimpleNamespace(
+            id=author_id, username=f'user{author_id}', first_name='Имя', last_name=None
+        ),
+        reply_to_top_message_id=None,
+        reply_to_message_id=None,
+    )
+
+
+def bench_process_message(corpus: list, rounds: int) -> dict:
+    """End-to-end: каждый раунд — новая задача и новая БД (иначе всё уйдёт в дедупликацию)."""
+    from db_service import DBService
+    from tasks import MonitoringTask
+
+    async def notify(data, item_id, mode):
+        return True
+
+    async def run_round(db_path: str, latencies: list):
+        db = DBService(db_path)
+        await db.init_db()
+        task = MonitoringTask(
+            task_id='bench', user_id=1, mode='worker', chats=['@bench_chat'],
+            filters_dict={**FILTERS, 'city_filter': 'МСК'},
+            api_id=1, api_hash='bench', notification_chat_id=1,
+            parse_history_days=0, db_service=db,
+        )
+        task.notifier.send_notification = notify
+        perf = time.perf_counter_ns
+        for index, row in enumerate(corpus):
+            message = _fake_message(index, row)
+            start = perf()
+            await task.process_message(message, '@bench_chat')
+            latencies.append(perf() - start)
+        await db.close()
+
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(rounds):
+            extraction_cache.clear()
+            geo_filter.clear_cache()
+            asyncio.run(run_round(os.path.join(tmp, f'bench_{i}.db'), latencies))
+    return _summary(latencies)
+
+
+STAGES = {
+    'extract': (bench_extract, 20),
+    'geo_moscow': (bench_geo_moscow, 5),
+    'geo_spb': (bench_geo_spb, 5),
+    'item_filter': (bench_item_filter, 50),
+    'content_hash': (bench_content_hash, 50),
+    'process_message': (bench_process_message, 2),
+}
+
+
+# --------------------------------------------------------------------------- #
+
+def run_stage(stage: str, corpus: list, rounds: int, repeat: int) -> dict:
+    """Лучший (по msgs/sec) из repeat замеров этапа."""
+    func, _ = STAGES[stage]
+    runs = [func(corpus, rounds) for _ in range(max(1, repeat))]
+    return max(runs, key=lambda r: r['msgs_per_sec'])
+
+
+def check_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Этапы, где msgs/sec упали ниже baseline * (1 - tolerance)."""
+    regressions = []
+    for stage, current in results.items():
+        expected = baseline.get(stage)
+        if not expected:
+            continue
+        floor = expected['msgs_per_sec'] * (1 - tolerance)
+        if current['msgs_per_sec'] < floor:
+            regressions.append(
+                f"{stage}: {current['msgs_per_sec']:,.0f} msgs/sec < "
+                f"{floor:,.0f} (эталон {expected['msgs_per_sec']:,.0f} − {tolerance:.0%})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки конвейера обработки сообщений")
+    parser.add_argument('--only', help='этапы через запятую: ' + ', '.join(STAGES))
+    parser.add_argument('--rounds-scale', type=float, default=1.0,
+                        help='множитель числа проходов по корпусу')
+    parser.add_argument('--repeat', type=int, default=3, help='замеров этапа (берётся лучший)')
+    parser.add_argument('--tolerance', type=float, default=0.30,
+                        help='допустимое падение msgs/sec относительно эталона (0.30 = 30%%)')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='записать результаты в эталон вместо проверки')
+    args = parser.parse_args()
+
+    # Логи конвейера не выводим
+    logger.remove()
+    # TelegramNotifier проверяет формат токена при создании задачи
+    if not config.BOT_TOKEN:
+        config.BOT_TOKEN = '123456:benchmark'
+
+    corpus = load_corpus()
+
+    stages = args.only.split(',') if args.only else list(STAGES)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"неизвестные этапы: {', '.join(unknown)}")
+
+    results = {}
+    print(f"Корпус: {len(corpus)} сообщений")
+    print(f"{'этап':<16} {'msgs/sec':>12} {'p50, мкс':>10} {'p99, мкс':>10}")
+    for stage in stages:
+        _, rounds = STAGES[stage]
+        results[stage] = run_stage(
+            stage, corpus, max(1, round(rounds * args.rounds_scale)), args.repeat
+        )
+        r = results[stage]
+        print(f"{stage:<16} {r['msgs_per_sec']:>12,.0f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f}")
+
+    if args.update_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        baseline.update(results)
+        args.baseline.write_text(
+            json.dumps(baseline, ensure_ascii=False, indent=2) + "\n", encoding='utf-8'
+        )
+        print(f"Эталон обновлён: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"Эталон {args.baseline} не найден — проверка регрессий пропущена")
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    regressions = check_regressions(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ Регрессии производительности:")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
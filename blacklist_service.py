@@ -1,21 +1,260 @@
 """
 Сервис для поиска в черном списке
 
-Поиск происходит в реальном времени при запросе (без кеширования).
 Поддерживает несколько чатов ЧС (список хранится в БД).
+
+По умолчанию (BLACKLIST_INDEX=true) поиск идёт по локальному индексу в SQLite:
+сообщения чатов ЧС дочитываются по message_id (не чаще BLACKLIST_SYNC_INTERVAL),
+из каждого заранее извлекаются User ID и @username, а текст (ё→е, нижний
+регистр) и телефоны попадают в полнотекстовый индекс FTS5. Проверка — это
+запросы по индексу; ФИО и телефон ищутся через FTS с ранжированием. С BLACKLIST_INDEX=false — прежний поиск по истории
+чатов в реальном времени.
 """
 import re
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import AsyncIterator, Callable, Optional, Dict, List, Set, Tuple
 from loguru import logger
 
 from pyrogram import Client
 from pyrogram.raw.functions.messages import GetReplies
 from pyrogram.raw.types import InputPeerChannel
-from pyrogram.errors import FloodWait
+from pyrogram.errors import FloodWait, RPCError
 import asyncio
 
+from config import config
 from db_service import DBService
+from parser import FloodGate
+
+# Сколько раз продолжаем историю чата ЧС после FloodWait, прежде чем сдаться
+_FLOOD_RETRIES = 5
+
+# Слова запроса по ФИО: только буквы, от 2 символов
+_WORD_PATTERN = re.compile(r'[^\W\d_]{2,}')
+# Телефон РФ в свободной записи: +7 (999) 123-45-67, 89991234567, 999 123 45 67
+_PHONE_PATTERN = re.compile(
+    r'(?<!\d)(?:\+?7|8)?[\s\-]*\(?\d{3}\)?[\s\-]*\d{3}[\s\-]*\d{2}[\s\-]*\d{2}(?!\d)'
+)
+
+
+def _normalize_text(text: str) -> str:
+    return text.lower().replace('ё', 'е')
+
+
+class BlacklistMatcher:
+    """Все критерии поиска по ЧС для одного прохода по истории.
+
+    match(text) проверяет сообщение сразу по username, User ID и ФИО и
+    возвращает совпавшие критерии в порядке приоритета.
+    """
+
+    PRIORITY = ("username", "user_id", "fio")
+
+    def __init__(
+        self,
+        username: Optional[str] = None,
+        user_id: Optional[int] = None,
+        fio_words: Optional[List[str]] = None,
+    ):
+        self.values: Dict[str, object] = {}
+        self._username = None
+        self._user_id = None
+        self._user_id_str = None
+        self._fio_words = [word.lower() for word in fio_words or []]
+
+        if username:
+            self._username = re.compile(re.escape(username), re.IGNORECASE)
+            self.values["username"] = username
+        if user_id:
+            self._user_id = int(user_id)
+            self._user_id_str = str(self._user_id)
+            self.values["user_id"] = user_id
+        if self._fio_words:
+            self.values["fio"] = " ".join(fio_words)
+
+        # Самый приоритетный из заданных критериев: после совпадения по нему
+        # читать историю дальше не нужно
+        self.top = next((t for t in self.PRIORITY if t in self.values), None)
+
+    def match(self, text: str) -> List[str]:
+        matched = []
+        if self._username is not None and self._username.search(text):
+            matched.append("username")
+        # Дешёвая проверка подстроки отсекает почти все сообщения до regex
+        if self._user_id is not None and self._user_id_str in text:
+            if any(int(m) == self._user_id for m in BlacklistService.ID_PATTERN.findall(text)):
+                matched.append("user_id")
+        if self._fio_words:
+            text_lower = text.lower()
+            if all(word in text_lower for word in self._fio_words):
+                matched.append("fio")
+        return matched
+
+
+class BlacklistClientPool:
+    """Тёплые Pyrogram-клиенты ЧС по пути сессии.
+
+    Раньше каждая проверка запускала Client и останавливала его после ответа:
+    handshake, открытие SQLite-файла сессии и резолв пиров добавляли секунды
+    к каждому запросу, а параллельные проверки упирались в блокировку сессии.
+    Теперь клиент сессии запускается при первом запросе и остаётся подключённым:
+
+      - запросы к одной сессии выполняются по очереди (lock на сессию)
+      - перед запросом клиент проверяется: отключён — перезапуск; простаивал
+        дольше BLACKLIST_CLIENT_HEALTH_INTERVAL или прошлый запрос упал не
+        с ошибкой Telegram (RPCError) — get_me()
+      - клиент, простаивающий дольше BLACKLIST_CLIENT_IDLE_TIMEOUT, останавливается
+    """
+
+    # Сколько ждать ответа на get_me() при проверке клиента
+    _HEALTH_TIMEOUT = 10
+
+    def __init__(
+        self,
+        api_id: int,
+        api_hash: str,
+        idle_timeout: float = 600.0,
+        health_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._clock = clock
+        self._entries: Dict[str, dict] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def _entry(self, session_name: str) -> dict:
+        entry = self._entries.get(session_name)
+        if entry is None:
+            entry = {
+                'client': None,
+                'lock': asyncio.Lock(),
+                'last_used': self._clock(),
+                'suspect': False,    # прошлый запрос упал — проверить клиент
+                'flood_gate': FloodGate(),
+                'requests': 0,
+                'starts': 0,
+            }
+            self._entries[session_name] = entry
+        return entry
+
+    async def _stop(self, session_name: str, client: Client) -> None:
+        try:
+            await client.stop()
+        except ConnectionError:
+            pass  # клиент уже отключён
+        except Exception as e:
+            logger.warning(f"Ошибка остановки клиента ЧС {session_name!r}: {e}")
+
+    async def _healthy(self, session_name: str, entry: dict) -> bool:
+        client = entry['client']
+        if client is None or not client.is_connected:
+            return False
+        idle = self._clock() - entry['last_used']
+        if not entry['suspect'] and idle < self.health_interval:
+            return True
+        try:
+            await asyncio.wait_for(client.get_me(), self._HEALTH_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.warning(f"Клиент ЧС {session_name!r} не отвечает ({e}), перезапуск")
+            return False
+
+    async def _ensure_client(self, session_name: str, entry: dict) -> Client:
+        if await self._healthy(session_name, entry):
+            return entry['client']
+        if entry['client'] is not None:
+            await self._stop(session_name, entry['client'])
+            entry['client'] = None
+        client = Client(name=session_name, api_id=self.api_id, api_hash=self.api_hash)
+        await client.start()
+        entry['client'] = client
+        entry['suspect'] = False
+        entry['starts'] += 1
+        logger.info(f"Pyrogram клиент ЧС запущен (сессия: {session_name})")
+        return client
+
+    @asynccontextmanager
+    async def session(self, session_name: str) -> AsyncIterator[Client]:
+        """Подключённый клиент сессии на время запроса (запросы сессии — по очереди)."""
+        entry = self._entry(session_name)
+        async with entry['lock']:
+            client = await self._ensure_client(session_name, entry)
+            entry['requests'] += 1
+            try:
+                yield client
+            except RPCError:
+                raise  # ответ Telegram — соединение живо
+            except BaseException:
+                entry['suspect'] = True
+                raise
+            finally:
+                entry['last_used'] = self._clock()
+        self._start_reaper()
+
+    def flood_gate(self, session_name: str) -> FloodGate:
+        """Общая пауза FloodWait клиента сессии (все проходы по чатам ЧС)."""
+        return self._entry(session_name)['flood_gate']
+
+    def _start_reaper(self) -> None:
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_periodically())
+
+    async def _reap_periodically(self) -> None:
+        while any(entry['client'] is not None for entry in self._entries.values()):
+            await asyncio.sleep(min(self.idle_timeout, 60))
+            await self.reap_idle()
+
+    async def reap_idle(self) -> int:
+        """Остановить клиенты, простаивающие дольше idle_timeout; возвращает их число."""
+        stopped = 0
+        now = self._clock()
+        for session_name, entry in list(self._entries.items()):
+            if entry['lock'].locked() or entry['client'] is None:
+                continue
+            if now - entry['last_used'] < self.idle_timeout:
+                continue
+            # Останавливаем под блокировкой сессии: иначе следующий запрос запустит
+            # новый клиент на том же файле сессии, пока старый ещё закрывается
+            async with entry['lock']:
+                client = entry['client']
+                if client is None or self._clock() - entry['last_used'] < self.idle_timeout:
+                    continue
+                entry['client'] = None
+                await self._stop(session_name, client)
+            stopped += 1
+            logger.info(f"Pyrogram клиент ЧС остановлен по простою (сессия: {session_name})")
+        return stopped
+
+    async def close(self) -> None:
+        """Остановить все клиенты (shutdown сервиса)."""
+        if self._reaper is not None and not self._reaper.done():
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+        for session_name, entry in list(self._entries.items()):
+            if entry['client'] is not None:
+                await self._stop(session_name, entry['client'])
+                logger.info(f"Pyrogram клиент ЧС остановлен (сессия: {session_name})")
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        now = self._clock()
+        return {
+            session_name: {
+                'connected': bool(entry['client'] is not None and entry['client'].is_connected),
+                'busy': entry['lock'].locked(),
+                'idle_seconds': round(now - entry['last_used'], 1),
+                'requests': entry['requests'],
+                'starts': entry['starts'],
+            }
+            for session_name, entry in self._entries.items()
+        }
 
 
 class BlacklistService:
@@ -36,32 +275,109 @@ class BlacklistService:
         self.api_hash = api_hash
         self.session_name = session_name
         self.db = db_service
-
-    async def _get_topic_messages(
+        # Тёплые клиенты по сессиям вместо start/stop на каждую проверку
+        self.clients = BlacklistClientPool(
+            api_id, api_hash,
+            idle_timeout=config.BLACKLIST_CLIENT_IDLE_TIMEOUT,
+            health_interval=config.BLACKLIST_CLIENT_HEALTH_INTERVAL,
+        )
+        # Когда чат (топик) ЧС последний раз дочитывался в индекс (monotonic):
+        # {(chat_username, topic_id or 0): время}
+        self._synced_at: Dict[Tuple[str, int], float] = {}
+        self._sync_lock = asyncio.Lock()
+
+    @staticmethod
+    def _split_entry(chat_entry: dict) -> Tuple[str, Optional[int]]:
+        """(chat_username, topic_id) записи blacklist_chats; старый формат "@chat/topic_id" разбирается"""
+        chat_username = chat_entry["chat_username"]
+        topic_id = chat_entry.get("topic_id")
+        if '/' in chat_username:
+            parts = chat_username.rsplit('/', 1)
+            try:
+                if topic_id is None:
+                    topic_id = int(parts[1])
+                chat_username = parts[0]
+            except ValueError:
+                pass
+        return chat_username, topic_id
+
+    @classmethod
+    def _index_terms(cls, text: str) -> Set[Tuple[str, str]]:
+        """Термины сообщения ЧС для индекса: User ID и @username"""
+        terms = {('id', str(int(m))) for m in cls.ID_PATTERN.findall(text)}
+        terms.update(('username', m.lower()) for m in cls.USERNAME_PATTERN.findall(text))
+        return terms
+
+    @classmethod
+    def _phones(cls, text: str) -> List[str]:
+        """Телефоны сообщения — последние 10 цифр (без +7 / 8); User ID телефоном не считается"""
+        text = cls.ID_PATTERN.sub(' ', text)
+        digits = (re.sub(r'\D', '', m) for m in _PHONE_PATTERN.findall(text))
+        return list(dict.fromkeys(d[-10:] for d in digits))
+
+    @classmethod
+    def _index_row(cls, message_id: int, message_date: str, text: str) -> tuple:
+        """Строка для DBService.save_blacklist_messages: термины и поля FTS (ё→е, нижний регистр)"""
+        return (
+            message_id, message_date, text, cls._index_terms(text),
+            _normalize_text(text), " ".join(cls._phones(text)),
+        )
+
+    @staticmethod
+    def _fio_words(fio: str) -> List[str]:
+        """Слова ФИО в форме индекса"""
+        return _WORD_PATTERN.findall(_normalize_text(fio))
+
+    @classmethod
+    def _fio_query(cls, fio: str) -> Optional[str]:
+        """FTS5-запрос по ФИО: все слова, каждое — префикс ("Козл Ив" найдёт "Козлов Иван")"""
+        words = cls._fio_words(fio)
+        if not words:
+            return None
+        return "body : ({})".format(" AND ".join(f'"{word}"*' for word in words))
+
+    @staticmethod
+    def _phone_query(phone: str) -> Optional[str]:
+        """FTS5-запрос по телефону (последние 10 цифр)"""
+        digits = re.sub(r'\D', '', phone)
+        if len(digits) < 10:
+            return None
+        return f'phones : "{digits[-10:]}"'
+
+    async def _iter_topic_messages(
         self,
         client: Client,
         chat_id: int,
         topic_id: int,
-        time_limit: datetime
-    ) -> List:
+        time_limit: datetime,
+        min_id: int = 0,
+        flood_gate: Optional[FloodGate] = None
+    ) -> AsyncIterator:
         """
-        Получить сообщения из конкретного топика через raw API GetReplies
+        Сообщения конкретного топика через raw API GetReplies, новые первыми
+
+        Следующая страница (100 сообщений) запрашивается, только когда
+        обработана текущая: живой поиск, нашедший совпадение или отменённый,
+        не докачивает топик целиком.
 
         Args:
             client: Pyrogram клиент
             chat_id: ID чата
             topic_id: ID топика (корневого сообщения)
             time_limit: временная граница (сообщения старше игнорируются)
+            min_id: только сообщения новее этого ID (синхронизация индекса)
+            flood_gate: общая пауза FloodWait клиента (без неё — ждём сами)
 
-        Returns:
-            Список raw сообщений
+        Yields:
+            raw сообщения
         """
-        messages = []
         offset_id = 0
 
         peer = await client.resolve_peer(chat_id)
 
         while True:
+            if flood_gate is not None:
+                await flood_gate.wait()
             try:
                 result = await client.invoke(
                     GetReplies(
@@ -72,151 +388,424 @@ class BlacklistService:
                         add_offset=0,
                         limit=100,
                         max_id=0,
-                        min_id=0,
+                        min_id=min_id,
                         hash=0
                     )
                 )
+            except FloodWait as e:
+                logger.warning(f"FloodWait при получении сообщений топика: ждём {e.value} сек")
+                if flood_gate is not None:
+                    flood_gate.pause(e.value)
+                else:
+                    await asyncio.sleep(e.value)
+                continue
 
-                if not result.messages:
-                    break
-
-                for raw_msg in result.messages:
-                    # raw_msg.date — Unix timestamp (int)
-                    msg_date = datetime.fromtimestamp(raw_msg.date)
-                    if msg_date < time_limit:
-                        return messages
-
-                    messages.append(raw_msg)
+            if not result.messages:
+                return
 
-                # Пагинация: offset_id = ID последнего сообщения
-                offset_id = result.messages[-1].id
+            for raw_msg in result.messages:
+                # raw_msg.date — Unix timestamp (int)
+                msg_date = datetime.fromtimestamp(raw_msg.date)
+                if msg_date < time_limit:
+                    return
 
-                # Если получили меньше 100, значит достигли конца
-                if len(result.messages) < 100:
-                    break
+                yield raw_msg
 
-            except FloodWait as e:
-                logger.warning(f"FloodWait при получении сообщений топика: ждём {e.value} сек")
-                await asyncio.sleep(e.value)
+            # Пагинация: offset_id = ID последнего сообщения
+            offset_id = result.messages[-1].id
 
-        return messages
+            # Если получили меньше 100, значит достигли конца
+            if len(result.messages) < 100:
+                return
 
-    async def _scan_chats(
+    async def _get_topic_messages(
         self,
         client: Client,
-        blacklist_chats: List[dict],
+        chat_id: int,
+        topic_id: int,
         time_limit: datetime,
-        *,
-        username: Optional[str] = None,
-        user_id: Optional[int] = None,
-        fio_words: Optional[List[str]] = None,
-        match_type: str,
-        total_messages_checked: int = 0,
-    ) -> Dict:
+        min_id: int = 0,
+        flood_gate: Optional[FloodGate] = None
+    ) -> List:
+        """Все сообщения топика списком (синхронизация индекса), см. _iter_topic_messages"""
+        return [
+            raw_msg async for raw_msg in self._iter_topic_messages(
+                client, chat_id, topic_id, time_limit, min_id=min_id, flood_gate=flood_gate
+            )
+        ]
+
+    async def _fetch_new_messages(
+        self,
+        client: Client,
+        chat_username: str,
+        topic_id: Optional[int],
+        last_msg_id: int,
+        time_limit: datetime
+    ) -> Tuple[List[tuple], int]:
         """
-        Один проход по всем чатам ЧС с одним критерием поиска.
+        Прочитать сообщения чата (топика) ЧС новее last_msg_id, но не старше time_limit
 
-        Args:
-            match_type: "username" | "user_id" | "fio"  — для метки в результате
         Returns:
-            {"found": True, ...} или {"found": False, "messages_checked": N, "chats_checked": [...]}
+            ([строка _index_row], самый новый message_id)
         """
-        chats_checked = []
+        chat = await client.get_chat(chat_username)
+        rows = []
+        newest_id = last_msg_id
 
-        for chat_entry in blacklist_chats:
-            chat_username = chat_entry["chat_username"]
-            topic_id = chat_entry.get("topic_id")
-            topic_name = chat_entry.get("topic_name")
+        if topic_id:
+            raw_messages = await self._get_topic_messages(
+                client, chat.id, topic_id, time_limit, min_id=last_msg_id
+            )
+            for raw_msg in raw_messages:
+                if raw_msg.id <= last_msg_id:
+                    break
+                newest_id = max(newest_id, raw_msg.id)
+                text = getattr(raw_msg, 'message', None)
+                if text:
+                    message_date = datetime.fromtimestamp(raw_msg.date).isoformat()
+                    rows.append(self._index_row(raw_msg.id, message_date, text))
+        else:
+            async for message in client.get_chat_history(chat.id):
+                if message.id <= last_msg_id or message.date < time_limit:
+                    break
+                newest_id = max(newest_id, message.id)
+                text = message.text or message.caption
+                if text:
+                    rows.append(self._index_row(message.id, message.date.isoformat(), text))
+
+        return rows, newest_id
+
+    async def sync_index(self, client: Client, blacklist_chats: List[dict], force: bool = False) -> int:
+        """
+        Дочитать в локальный индекс новые сообщения чатов ЧС (по отметкам message_id)
+
+        Каждый чат (топик) — не чаще BLACKLIST_SYNC_INTERVAL секунд (если не
+        force): повторные проверки из кнопок уведомлений не обращаются к Telegram,
+        а только что добавленный чат дочитывается сразу.
 
-            # Старый формат "@chat/topic_id" → разбираем
-            if '/' in chat_username:
-                parts = chat_username.rsplit('/', 1)
+        Returns:
+            Сколько сообщений добавлено в индекс
+        """
+        async with self._sync_lock:
+            now = time.monotonic()
+            due = []
+            for chat_entry in blacklist_chats:
+                chat_username, topic_id = self._split_entry(chat_entry)
+                synced_at = self._synced_at.get((chat_username, topic_id or 0))
+                if (
+                    force or synced_at is None
+                    or now - synced_at >= config.BLACKLIST_SYNC_INTERVAL
+                ):
+                    due.append((chat_username, topic_id))
+            if not due:
+                return 0
+
+            marks = await self.db.get_blacklist_sync_marks()
+            time_limit = datetime.now() - timedelta(days=config.BLACKLIST_INDEX_DAYS)
+            added = 0
+
+            for chat_username, topic_id in due:
+                last_msg_id = marks.get((chat_username, topic_id or 0), 0)
+                # Отметка и при ошибке: недоступный чат не опрашивается на каждой проверке
+                self._synced_at[(chat_username, topic_id or 0)] = time.monotonic()
                 try:
-                    if topic_id is None:
-                        topic_id = int(parts[1])
-                    chat_username = parts[0]
-                except ValueError:
-                    pass
+                    rows, newest_id = await self._fetch_new_messages(
+                        client, chat_username, topic_id, last_msg_id, time_limit
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка синхронизации индекса ЧС для {chat_username}: {e}")
+                    continue
+                if newest_id > last_msg_id:
+                    await self.db.save_blacklist_messages(
+                        chat_username, topic_id or 0, rows, newest_id
+                    )
+                    added += len(rows)
+                    logger.info(
+                        f"Индекс ЧС: {chat_username}"
+                        f"{f' (топик {topic_id})' if topic_id else ''} +{len(rows)} сообщений"
+                    )
 
-            try:
-                topic_info = f" (топик: {topic_name or topic_id})" if topic_id else ""
-                chat = await client.get_chat(chat_username)
-                chat_id_tg = chat.id
-                chats_checked.append(chat_username)
-
-                if topic_id:
-                    raw_messages = await self._get_topic_messages(client, chat_id_tg, topic_id, time_limit)
-                    for raw_msg in raw_messages:
-                        try:
-                            total_messages_checked += 1
-                            text = getattr(raw_msg, 'message', None)
-                            if not text:
-                                continue
-
-                            if self._matches(text, username=username, user_id=user_id, fio_words=fio_words):
-                                logger.info(f"Найден в ЧС {match_type}: в чате {chat_username}{topic_info}")
-                                return self._build_found_result_raw(raw_msg, text, match_type,
-                                                                     username or user_id or " ".join(fio_words or []),
-                                                                     chat_username, topic_id)
-                            if total_messages_checked % 500 == 0:
-                                logger.debug(f"[{match_type}] Проверено {total_messages_checked} сообщений...")
-                        except Exception as e:
-                            logger.error(f"Ошибка raw сообщения: {e}")
-                else:
-                    async for message in client.get_chat_history(chat_id_tg):
-                        try:
-                            if message.date < time_limit:
-                                break
-                            total_messages_checked += 1
-                            text = message.text or message.caption
-                            if not text:
-                                continue
-
-                            if self._matches(text, username=username, user_id=user_id, fio_words=fio_words):
-                                logger.info(f"Найден в ЧС {match_type}: в чате {chat_username}")
-                                return self._build_found_result(message, text, match_type,
-                                                                username or user_id or " ".join(fio_words or []),
-                                                                chat_username)
-                            if total_messages_checked % 500 == 0:
-                                logger.debug(f"[{match_type}] Проверено {total_messages_checked} сообщений...")
-                        except FloodWait as e:
-                            logger.warning(f"FloodWait: ждём {e.value} сек")
-                            await asyncio.sleep(e.value)
-                        except Exception as e:
-                            logger.error(f"Ошибка сообщения: {e}")
+            pruned = await self.db.prune_blacklist_index(time_limit.isoformat())
+            if pruned:
+                logger.info(f"Индекс ЧС: удалено {pruned} сообщений старше {config.BLACKLIST_INDEX_DAYS} дней")
+            return added
 
-            except Exception as e:
-                logger.error(f"Ошибка доступа к чату {chat_username}: {e}")
-                continue
+    async def refresh_index(self, session_name: Optional[str] = None) -> Dict:
+        """Принудительно дочитать индекс ЧС (без ожидания BLACKLIST_SYNC_INTERVAL)"""
+        blacklist_chats = await self.db.get_blacklist_chats(active_only=True)
+        async with self.clients.session(session_name or self.session_name) as client:
+            added = await self.sync_index(client, blacklist_chats, force=True)
+        return {
+            "messages_added": added,
+            "messages_indexed": await self.db.count_blacklist_messages(),
+        }
+
+    async def _search_indexed(
+        self,
+        client: Client,
+        blacklist_chats: List[dict],
+        username: Optional[str],
+        user_id: Optional[int],
+        fio: Optional[str],
+        days: int
+    ) -> Dict:
+        """Поиск по локальному индексу: username > User ID > ФИО"""
+        synced = await self.sync_index(client, blacklist_chats)
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        active = {(chat, topic_id or 0) for chat, topic_id in map(self._split_entry, blacklist_chats)}
+        steps_done = []
+
+        def first_active(rows: List[dict]) -> Optional[dict]:
+            # Чаты, отключённые в blacklist_chats, остаются в индексе, но не участвуют в поиске
+            return next((r for r in rows if (r["chat_username"], r["topic_id"]) in active), None)
 
+        # === ШАГ 1: поиск по username ===
+        if username:
+            steps_done.append("по никнейму")
+            row = first_active(await self.db.find_blacklist_term('username', username.lower(), since))
+            if row:
+                logger.info(f"Найден в ЧС username (индекс): в чате {row['chat_username']}")
+                return self._build_found_result_indexed(row, "username", username)
+
+        # === ШАГ 2: User ID (известный или резолвленный из username) ===
+        if username and not user_id:
+            try:
+                user_obj = await client.get_users(username.lstrip("@"))
+                user_id = user_obj.id
+                logger.info(f"ЧС шаг 2: {username} → user_id={user_id}")
+            except Exception as e:
+                logger.warning(f"Не удалось резолвить {username} → user_id: {e}")
+        if user_id:
+            steps_done.append("по User ID")
+            row = first_active(await self.db.find_blacklist_term('id', str(user_id), since))
+            if row:
+                logger.info(f"Найден в ЧС user_id (индекс): в чате {row['chat_username']}")
+                return self._build_found_result_indexed(row, "user_id", user_id)
+
+        # === ШАГ 3: поиск по ФИО (FTS, слова — префиксы) ===
+        query = self._fio_query(fio) if fio else None
+        if query:
+            steps_done.append("по ФИО")
+            rows = await self.db.search_blacklist_fts(
+                query, since, chats=sorted(active), limit=1, newest_first=True
+            )
+            if rows:
+                logger.info(f"Найден в ЧС fio (индекс): в чате {rows[0]['chat_username']}")
+                return self._build_found_result_indexed(rows[0], "fio", " ".join(self._fio_words(fio)))
+
+        messages_checked = await self.db.count_blacklist_messages(since)
+        logger.info(f"В ЧС не найден (индекс: {messages_checked} сообщений, шаги: {steps_done})")
         return {
             "found": False,
-            "messages_checked": total_messages_checked,
-            "chats_checked": chats_checked,
+            "username": username,
+            "messages_checked": messages_checked,
+            "messages_synced": synced,
+            "chats_checked": sorted({chat for chat, _ in active}),
+            "steps_done": steps_done,
+            "message": "В черном списке не найден",
         }
 
-    def _matches(
+    async def search_index(
         self,
-        text: str,
-        *,
-        username: Optional[str] = None,
-        user_id: Optional[int] = None,
-        fio_words: Optional[List[str]] = None,
-    ) -> bool:
-        """Проверяет, удовлетворяет ли текст сообщения критерию поиска."""
-        text_lower = text.lower()
+        fio: Optional[str] = None,
+        phone: Optional[str] = None,
+        days: int = 365,
+        limit: int = 20
+    ) -> Dict:
+        """
+        Полнотекстовый поиск по локальному индексу ЧС (без обращения к Telegram)
 
-        if username:
-            return username.lower() in text_lower
+        ФИО — все слова как префиксы, телефон — по последним 10 цифрам;
+        результаты упорядочены по релевантности (bm25). Индекс дочитывается
+        проверками и POST /blacklist/index/sync.
+        """
+        queries = []
+        if fio:
+            query = self._fio_query(fio)
+            if not query:
+                return {"found": False, "error": "В ФИО нет слов для поиска"}
+            queries.append(query)
+        if phone:
+            query = self._phone_query(phone)
+            if not query:
+                return {"found": False, "error": "Телефон должен содержать не меньше 10 цифр"}
+            queries.append(query)
+        if not queries:
+            return {"found": False, "error": "Необходимо указать ФИО или телефон для поиска"}
 
-        if user_id:
-            found_ids = [int(m) for m in self.ID_PATTERN.findall(text)]
-            return user_id in found_ids
+        blacklist_chats = await self.db.get_blacklist_chats(active_only=True)
+        active = sorted({(chat, topic_id or 0) for chat, topic_id in map(self._split_entry, blacklist_chats)})
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        rows = await self.db.search_blacklist_fts(
+            " AND ".join(queries), since, chats=active, limit=min(max(limit, 1), 100)
+        )
+
+        match_type = "fio" if fio else "phone"
+        match_value = " ".join(self._fio_words(fio)) if fio else phone
+        results = []
+        for row in rows:
+            result = self._build_found_result_indexed(row, match_type, match_value)
+            result["rank"] = round(row["rank"], 4)
+            results.append(result)
+        return {"found": bool(results), "count": len(results), "results": results}
+
+    async def _iter_chat_texts(
+        self,
+        client: Client,
+        chat_username: str,
+        topic_id: Optional[int],
+        time_limit: datetime,
+        flood_gate: FloodGate,
+        progress: dict,
+    ) -> AsyncIterator[Tuple[str, Callable]]:
+        """
+        Тексты сообщений чата (топика) ЧС не старше time_limit, новые первыми
 
-        if fio_words:
-            return all(word.lower() in text_lower for word in fio_words)
+        Yields:
+            (text, build) — build(match_type, value) собирает результат по сообщению.
+            progress["messages_checked"] учитывает и сообщения без текста.
+        """
+        await flood_gate.wait()
+        chat = await client.get_chat(chat_username)
 
-        return False
+        if topic_id:
+            raw_messages = self._iter_topic_messages(
+                client, chat.id, topic_id, time_limit, flood_gate=flood_gate
+            )
+            async for raw_msg in raw_messages:
+                progress["messages_checked"] += 1
+                text = getattr(raw_msg, 'message', None)
+                if text:
+                    yield text, lambda match_type, value, raw_msg=raw_msg, text=text: (
+                        self._build_found_result_raw(raw_msg, text, match_type, value, chat_username, topic_id)
+                    )
+            return
+
+        # FloodWait посреди истории: пауза на весь клиент, затем продолжаем с последнего id
+        offset_id = 0
+        for attempt in range(1, _FLOOD_RETRIES + 1):
+            await flood_gate.wait()
+            try:
+                async for message in client.get_chat_history(chat.id, offset_id=offset_id):
+                    offset_id = message.id
+                    if message.date < time_limit:
+                        return
+                    progress["messages_checked"] += 1
+                    text = message.text or message.caption
+                    if text:
+                        yield text, lambda match_type, value, message=message, text=text: (
+                            self._build_found_result(message, text, match_type, value, chat_username)
+                        )
+                return
+            except FloodWait as e:
+                if attempt == _FLOOD_RETRIES:
+                    raise
+                logger.warning(f"FloodWait {e.value}с на истории ЧС {chat_username}, продолжим с msg_id={offset_id}")
+                flood_gate.pause(e.value)
+
+    async def _scan_chats(
+        self,
+        client: Client,
+        blacklist_chats: List[dict],
+        time_limit: datetime,
+        matcher: "BlacklistMatcher",
+        flood_gate: Optional[FloodGate] = None,
+    ) -> Dict:
+        """
+        Параллельный проход по чатам ЧС сразу по всем критериям поиска.
+
+        Чаты и топики читаются одновременно (не больше BLACKLIST_SCAN_CONCURRENCY
+        на клиент) с общей паузой FloodWait клиента. Каждое сообщение проверяется
+        matcher'ом один раз; для каждого критерия запоминается совпадение из чата,
+        стоящего раньше в списке. Совпадение по самому приоритетному из заданных
+        критериев подтверждает результат и отменяет остальные проходы.
+
+        Returns:
+            {"found": True, ...} (лучшее совпадение по приоритету
+            username > user_id > fio) или
+            {"found": False, "messages_checked": N, "chats_checked": [...]};
+            в обоих случаях "chats" — прогресс и время по каждому чату
+        """
+        flood_gate = flood_gate or FloodGate()
+        # Запросы одного клиента к ЧС идут по очереди (BlacklistClientPool),
+        # поэтому семафор прохода ограничивает нагрузку на клиент
+        semaphore = asyncio.Semaphore(max(1, config.BLACKLIST_SCAN_CONCURRENCY))
+        found: Dict[str, Tuple[int, Dict]] = {}    # match_type → (позиция чата, результат)
+        progress = []
+        tasks: List[asyncio.Task] = []
+        started = time.monotonic()
+
+        async def scan(index: int, chat_username: str, topic_id: Optional[int]) -> None:
+            chat_progress = progress[index]
+            topic_info = f" (топик: {chat_progress['topic_name'] or topic_id})" if topic_id else ""
+            chat_started = None
+            try:
+                async with semaphore:
+                    chat_started = time.monotonic()
+                    chat_progress["status"] = "running"
+                    async for text, build in self._iter_chat_texts(
+                        client, chat_username, topic_id, time_limit, flood_gate, chat_progress
+                    ):
+                        for match_type in matcher.match(text):
+                            current = found.get(match_type)
+                            if current is None or index < current[0]:
+                                found[match_type] = (index, build(match_type, matcher.values[match_type]))
+                        if found.get(matcher.top, (None,))[0] == index:
+                            chat_progress["status"] = "found"
+                            logger.info(f"Найден в ЧС {matcher.top}: в чате {chat_username}{topic_info}")
+                            for task in tasks:
+                                if task is not asyncio.current_task():
+                                    task.cancel()
+                            return
+                        if chat_progress["messages_checked"] % 500 == 0:
+                            logger.debug(
+                                f"[ЧС] {chat_username}{topic_info}: проверено "
+                                f"{chat_progress['messages_checked']} сообщений..."
+                            )
+                    chat_progress["status"] = "done"
+            except asyncio.CancelledError:
+                chat_progress["status"] = "cancelled"
+                raise
+            except Exception as e:
+                chat_progress["status"] = "error"
+                chat_progress["error"] = str(e)
+                logger.error(f"Ошибка доступа к чату {chat_username}{topic_info}: {e}")
+            finally:
+                if chat_started is not None:
+                    chat_progress["seconds"] = round(time.monotonic() - chat_started, 3)
+
+        for chat_entry in blacklist_chats:
+            chat_username, topic_id = self._split_entry(chat_entry)
+            progress.append({
+                "chat": chat_username,
+                "topic_id": topic_id,
+                "topic_name": chat_entry.get("topic_name"),
+                "status": "pending",
+                "messages_checked": 0,
+                "seconds": 0.0,
+            })
+            tasks.append(asyncio.create_task(scan(len(progress) - 1, chat_username, topic_id)))
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        messages_checked = sum(chat["messages_checked"] for chat in progress)
+        scan_seconds = round(time.monotonic() - started, 3)
+        for match_type in matcher.PRIORITY:
+            if match_type in found:
+                result = found[match_type][1]
+                if match_type != matcher.top:
+                    logger.info(f"Найден в ЧС {match_type}: в чате {result['chat']}")
+                result["messages_checked"] = messages_checked
+                result["scan_seconds"] = scan_seconds
+                result["chats"] = progress
+                return result
+
+        return {
+            "found": False,
+            "messages_checked": messages_checked,
+            "chats_checked": [chat["chat"] for chat in progress if chat["status"] == "done"],
+            "scan_seconds": scan_seconds,
+            "chats": progress,
+        }
 
     async def search_in_blacklist(
         self,
@@ -229,12 +818,14 @@ class BlacklistService:
     ) -> Dict:
         """
         Трёхступенчатый поиск в черном списке:
-          1. По @username (строковое совпадение)
+          1. По @username
           2. По User ID (Pyrogram резолвит username → user_id)
           3. По ФИО (все слова присутствуют в тексте)
 
-        Каждая ступень — полный проход по всем чатам ЧС.
-        Останавливается при первом совпадении.
+        С индексом (BLACKLIST_INDEX) каждая ступень — запрос к SQLite после
+        инкрементальной синхронизации; без индекса — один проход по истории
+        чатов ЧС, в котором каждое сообщение проверяется сразу по всем
+        критериям. Результат выбирается по приоритету ступеней.
         """
         if not user_id and not username and not fio:
             return {"found": False, "error": "Необходимо указать username или ФИО для поиска"}
@@ -249,82 +840,75 @@ class BlacklistService:
         effective_session = session_name or self.session_name
         logger.info(f"Поиск в ЧС: username={username}, fio={fio}, чатов: {len(blacklist_chats)}")
 
-        client = Client(name=effective_session, api_id=self.api_id, api_hash=self.api_hash)
-        steps_done = []
-        total_checked = 0
-        all_chats_checked = []
-
         try:
-            await client.start()
-            time_limit = datetime.now() - timedelta(days=days)
-
-            # === ШАГ 1: поиск по username ===
-            if username:
-                steps_done.append("по никнейму")
-                logger.info(f"ЧС шаг 1: поиск по username={username}")
-                result = await self._scan_chats(
-                    client, blacklist_chats, time_limit,
-                    username=username, match_type="username",
-                    total_messages_checked=total_checked,
+            async with self.clients.session(effective_session) as client:
+                if config.BLACKLIST_INDEX:
+                    return await self._search_indexed(client, blacklist_chats, username, user_id, fio, days)
+                return await self._search_live(
+                    client, blacklist_chats, username, user_id, fio, days,
+                    flood_gate=self.clients.flood_gate(effective_session),
                 )
-                total_checked = result.get("messages_checked", total_checked)
-                all_chats_checked = result.get("chats_checked", [])
-                if result["found"]:
-                    return result
-
-            # === ШАГ 2: резолвим user_id и ищем по нему ===
-            if username:
-                resolved_user_id = None
+
+        except Exception as e:
+            logger.error(f"Ошибка поиска в ЧС: {e}")
+            return {"found": False, "error": str(e)}
+
+    async def _search_live(
+        self,
+        client: Client,
+        blacklist_chats: List[dict],
+        username: Optional[str],
+        user_id: Optional[int],
+        fio: Optional[str],
+        days: int,
+        flood_gate: Optional[FloodGate] = None
+    ) -> Dict:
+        """Поиск по истории чатов ЧС за один проход: username > User ID > ФИО"""
+        steps_done = []
+        time_limit = datetime.now() - timedelta(days=days)
+
+        # Все критерии проверяются за один проход по истории, поэтому
+        # user_id резолвим заранее, а не после неудачи поиска по username
+        resolved_user_id = user_id
+        if username:
+            steps_done.append("по никнейму")
+            if not resolved_user_id:
                 try:
                     user_obj = await client.get_users(username.lstrip("@"))
                     resolved_user_id = user_obj.id
-                    logger.info(f"ЧС шаг 2: {username} → user_id={resolved_user_id}")
+                    logger.info(f"ЧС: {username} → user_id={resolved_user_id}")
                 except Exception as e:
                     logger.warning(f"Не удалось резолвить {username} → user_id: {e}")
+        if resolved_user_id:
+            steps_done.append("по User ID")
 
-                if resolved_user_id:
-                    steps_done.append("по User ID")
-                    result = await self._scan_chats(
-                        client, blacklist_chats, time_limit,
-                        user_id=resolved_user_id, match_type="user_id",
-                        total_messages_checked=total_checked,
-                    )
-                    total_checked = result.get("messages_checked", total_checked)
-                    if result["found"]:
-                        return result
-
-            # === ШАГ 3: поиск по ФИО ===
-            if fio:
-                fio_words = [w for w in fio.strip().split() if len(w) >= 2]
-                if fio_words:
-                    steps_done.append("по ФИО")
-                    logger.info(f"ЧС шаг 3: поиск по ФИО={fio_words}")
-                    result = await self._scan_chats(
-                        client, blacklist_chats, time_limit,
-                        fio_words=fio_words, match_type="fio",
-                        total_messages_checked=total_checked,
-                    )
-                    total_checked = result.get("messages_checked", total_checked)
-                    if result["found"]:
-                        return result
-
-            logger.info(f"В ЧС не найден (проверено {total_checked} сообщений, шаги: {steps_done})")
-            return {
-                "found": False,
-                "username": username,
-                "messages_checked": total_checked,
-                "chats_checked": all_chats_checked,
-                "steps_done": steps_done,
-                "message": "В черном списке не найден",
-            }
+        fio_words = [w for w in fio.strip().split() if len(w) >= 2] if fio else []
+        if fio_words:
+            steps_done.append("по ФИО")
 
-        except Exception as e:
-            logger.error(f"Ошибка поиска в ЧС: {e}")
-            return {"found": False, "error": str(e)}
+        if not steps_done:
+            return {"found": False, "error": "Необходимо указать username или ФИО для поиска"}
 
-        finally:
-            await client.stop()
-            logger.debug("Pyrogram клиент для поиска в ЧС остановлен")
+        matcher = BlacklistMatcher(username=username, user_id=resolved_user_id, fio_words=fio_words)
+        logger.info(f"ЧС: поиск за один проход ({', '.join(steps_done)})")
+        result = await self._scan_chats(client, blacklist_chats, time_limit, matcher, flood_gate)
+        if result["found"]:
+            return result
+
+        logger.info(
+            f"В ЧС не найден (проверено {result['messages_checked']} сообщений "
+            f"за {result['scan_seconds']}с, шаги: {steps_done})"
+        )
+        return {
+            "found": False,
+            "username": username,
+            "messages_checked": result["messages_checked"],
+            "chats_checked": result["chats_checked"],
+            "scan_seconds": result["scan_seconds"],
+            "chats": result["chats"],
+            "steps_done": steps_done,
+            "message": "В черном списке не найден",
+        }
 
     def _build_found_result_raw(self, raw_msg, text: str, match_type: str, match_value, chat_username: str, topic_id: Optional[int] = None) -> Dict:
         """Формирует результат при нахождении в ЧС (raw API сообщение)"""
@@ -353,6 +937,26 @@ class BlacklistService:
             "message_text": text
         }
 
+    def _build_found_result_indexed(self, row: dict, match_type: str, match_value) -> Dict:
+        """Формирует результат при нахождении в ЧС (сообщение из локального индекса)"""
+        chat_name = row["chat_username"].lstrip("@")
+        if row["topic_id"]:
+            message_link = f"https://t.me/{chat_name}/{row['topic_id']}/{row['message_id']}"
+        else:
+            message_link = f"https://t.me/{chat_name}/{row['message_id']}"
+
+        return {
+            "found": True,
+            "match_type": match_type,
+            "match_value": match_value,
+            "chat": row["chat_username"],
+            "message_link": message_link,
+            "message_id": row["message_id"],
+            "message_date": row["message_date"],
+            "extracted_info": self._extract_info(row["message_text"]),
+            "message_text": row["message_text"]
+        }
+
     def _build_found_result(self, message, text: str, match_type: str, match_value, chat_username: str) -> Dict:
         """Формирует результат при нахождении в ЧС"""
         # Формируем ссылку на сообщение
@@ -31,13 +31,48 @@ class Config:
     LOG_PATH: str = os.getenv("LOG_PATH", "workers_service.log")
     SESSION_PATH: str = os.getenv("SESSION_PATH", "workers_session")
 
+    # Database
+    # Количество постоянных соединений на чтение (плюс одно на запись)
+    DB_READ_CONNECTIONS: int = int(os.getenv("DB_READ_CONNECTIONS", "2"))
+    # Максимальная задержка группового коммита отложенных записей (мс)
+    DB_WRITE_FLUSH_MS: int = int(os.getenv("DB_WRITE_FLUSH_MS", "50"))
+
     # Parsing
     PARSE_HISTORY_DAYS: int = int(os.getenv("PARSE_HISTORY_DAYS", "3"))
+    # Разбор истории вне event loop: off | thread | process (см. parse_pool.py)
+    PARSE_POOL: str = os.getenv("PARSE_POOL", "off").lower()
+    PARSE_POOL_WORKERS: int = int(os.getenv("PARSE_POOL_WORKERS", "2"))
+    # Сколько сообщений истории разбирается одной пачкой
+    PARSE_POOL_CHUNK: int = int(os.getenv("PARSE_POOL_CHUNK", "200"))
+    # Сколько чатов задачи загружают топики и историю одновременно
+    HISTORY_CONCURRENCY: int = int(os.getenv("HISTORY_CONCURRENCY", "4"))
+    # Насколько далеко назад (дней) догонять историю с сохранённой отметки после рестарта
+    RESUME_MAX_DAYS: int = int(os.getenv("RESUME_MAX_DAYS", "7"))
+    # Polling fallback: интервал опроса чата подстраивается в этих пределах (сек)
+    POLL_MIN_INTERVAL: float = float(os.getenv("POLL_MIN_INTERVAL", "5"))
+    POLL_MAX_INTERVAL: float = float(os.getenv("POLL_MAX_INTERVAL", "120"))
+    # Сколько чатов задачи опрашиваются одновременно
+    POLL_CONCURRENCY: int = int(os.getenv("POLL_CONCURRENCY", "4"))
+    # После переподключения: сколько сообщений на чат догоняем, не больше
+    RECONNECT_GAP_MAX_MESSAGES: int = int(os.getenv("RECONNECT_GAP_MAX_MESSAGES", "1000"))
+    # Сколько последних message_id на чат помнит защита от двойной обработки
+    PROCESSED_WINDOW: int = int(os.getenv("PROCESSED_WINDOW", "4096"))
 
     # Blacklist (Черный список) - поиск в реальном времени
     BLACKLIST_CHAT: str = os.getenv("BLACKLIST_CHAT", "@Blacklist_pvz")
     # Отдельная сессия для поиска в ЧС (чтобы не конфликтовать с основным парсером)
     BLACKLIST_SESSION_PATH: str = os.getenv("BLACKLIST_SESSION_PATH", "blacklist_session")
+    # Поиск по локальному индексу сообщений ЧС (false — полный проход по истории чатов)
+    BLACKLIST_INDEX: bool = os.getenv("BLACKLIST_INDEX", "true").lower() in ("1", "true", "yes")
+    # Глубина индекса ЧС (дней) и как часто дочитывать новые сообщения (сек)
+    BLACKLIST_INDEX_DAYS: int = int(os.getenv("BLACKLIST_INDEX_DAYS", "365"))
+    BLACKLIST_SYNC_INTERVAL: int = int(os.getenv("BLACKLIST_SYNC_INTERVAL", "300"))
+    # Клиент ЧС остаётся подключённым между проверками: остановка после простоя (сек)
+    # и проверка get_me() перед запросом после паузы (сек)
+    BLACKLIST_CLIENT_IDLE_TIMEOUT: int = int(os.getenv("BLACKLIST_CLIENT_IDLE_TIMEOUT", "600"))
+    BLACKLIST_CLIENT_HEALTH_INTERVAL: int = int(os.getenv("BLACKLIST_CLIENT_HEALTH_INTERVAL", "60"))
+    # Сколько чатов/топиков ЧС читается одновременно при поиске без индекса
+    BLACKLIST_SCAN_CONCURRENCY: int = int(os.getenv("BLACKLIST_SCAN_CONCURRENCY", "4"))
 
 
 config = Config()
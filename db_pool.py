@@ -0,0 +1,335 @@
+"""
+Пул постоянных соединений SQLite для DBService
+
+Вместо aiosqlite.connect() на каждый вызов держим долгоживущие соединения:
+  - один writer (все записи сериализуются через asyncio.Lock)
+  - N readers (WAL позволяет читать параллельно с записью)
+
+PRAGMA применяются один раз при открытии соединения.
+
+Write-behind: операции записи можно ставить в очередь (submit / submit_nowait).
+Один фоновый writer выполняет их одной транзакцией (group commit), каждую —
+в своём SAVEPOINT. Транзакция открыта не дольше flush_interval и не больше
+max_batch операций:
+
+  - submit(op) — результат после коммита; такая операция закрывает
+    транзакцию сразу (flush, запись, за которой сразу читают readers)
+  - submit(op, urgent=False) — результат сразу после выполнения op в открытой
+    транзакции, коммит — вместе с остальными. Последовательные вставки
+    (разбор истории) не платят коммит за каждую; до коммита их не видят
+    readers, при падении процесса теряется не больше flush_interval записей
+  - submit_nowait(op) — без ожидания результата
+"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, List, Optional
+
+import aiosqlite
+from loguru import logger
+
+
+# Применяются к каждому соединению пула при открытии
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",       # читатели не блокируют писателя
+    "PRAGMA synchronous=NORMAL",     # в WAL безопасно, fsync только на checkpoint
+    "PRAGMA busy_timeout=5000",      # ждём блокировку вместо мгновенного 'database is locked'
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",       # ~8 MB page cache на соединение
+)
+
+
+class SQLitePool:
+    """Пул соединений: один writer + несколько readers.
+
+    Соединения открываются лениво при первом обращении и живут до close().
+    Пул привязан к event loop, на котором был открыт; при смене loop
+    (например, несколько asyncio.run() в тестах) открывается заново.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        readers: int = 2,
+        flush_interval: float = 0.05,
+        max_batch: int = 500
+    ):
+        self.db_path = db_path
+        self.readers_count = max(1, readers)
+        # Сколько максимум держать групповую транзакцию открытой без срочных операций
+        self.flush_interval = flush_interval
+        # После скольких операций групповая транзакция коммитится без ожидания
+        self.max_batch = max(1, max_batch)
+        # Сколько групповых транзакций закоммичено (метрика/тесты)
+        self.commits = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._opening_readers = 0
+        self._closed = False
+
+        # Очередь write-behind: [(op, future | None, urgent)]
+        self._pending: list = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batch_worker: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------ #
+
+    def _bind_loop(self):
+        """Привязать примитивы синхронизации к текущему event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            # Старый loop завершён — его соединения уже не дождаться,
+            # потоки aiosqlite daemon и не мешают выходу из процесса.
+            logger.debug(f"SQLitePool({self.db_path}): смена event loop, пул открывается заново")
+        self._loop = loop
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._idle_readers = asyncio.Queue()
+        self._all_readers = []
+        self._opening_readers = 0
+        self._closed = False
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._batch_worker = None
+
+    async def _open(self, read_only: bool) -> aiosqlite.Connection:
+        """Открыть соединение и применить PRAGMA."""
+        conn = aiosqlite.connect(self.db_path)
+        # Поток aiosqlite не должен держать процесс при выходе
+        conn.daemon = True
+        await conn
+        conn.row_factory = aiosqlite.Row
+        for pragma in _PRAGMAS:
+            await conn.execute(pragma)
+        if read_only:
+            await conn.execute("PRAGMA query_only=1")
+        return conn
+
+    # ------------------------------------------------------------------ #
+
+    @asynccontextmanager
+    async def reader(self):
+        """Взять соединение для чтения (возвращается в пул после выхода)."""
+        self._bind_loop()
+        if self._closed:
+            raise RuntimeError("SQLitePool закрыт")
+
+        if self._idle_readers.empty() and self._opening_readers < self.readers_count:
+            self._opening_readers += 1
+            try:
+                conn = await self._open(read_only=True)
+            except Exception:
+                self._opening_readers -= 1
+                raise
+            self._all_readers.append(conn)
+        else:
+            conn = await self._idle_readers.get()
+
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                await conn.close()
+            else:
+                self._idle_readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Эксклюзивное соединение для записи.
+
+        При выходе без исключения — commit, при исключении — rollback.
+        """
+        self._bind_loop()
+        if self._closed:
+            raise RuntimeError("SQLitePool закрыт")
+
+        async with self._write_lock:
+            if self._writer is None:
+                self._writer = await self._open(read_only=False)
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+    # ------------------------------------------------------------------ #
+    # Write-behind                                                         #
+    # ------------------------------------------------------------------ #
+
+    def _enqueue(self, op: Callable, future: Optional[asyncio.Future], urgent: bool) -> None:
+        self._bind_loop()
+        if self._closed:
+            raise RuntimeError("SQLitePool закрыт")
+        self._pending.append((op, future, urgent))
+        self._wakeup.set()
+        if self._batch_worker is None or self._batch_worker.done():
+            self._batch_worker = asyncio.create_task(self._run_batches())
+
+    async def submit(
+        self,
+        op: Callable[[aiosqlite.Connection], Awaitable[Any]],
+        urgent: bool = True
+    ) -> Any:
+        """Выполнить op(db) в групповой транзакции и вернуть результат.
+
+        urgent=True — результат после коммита (транзакция закрывается сразу);
+        urgent=False — сразу после выполнения op, коммит вместе с остальными.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(op, future, urgent)
+        return await future
+
+    def submit_nowait(self, op: Callable[[aiosqlite.Connection], Awaitable[Any]]) -> None:
+        """Поставить op(db) в очередь, не дожидаясь коммита (не позже flush_interval)."""
+        self._enqueue(op, None, False)
+
+    async def flush(self) -> None:
+        """Дождаться коммита всех операций, поставленных в очередь до вызова."""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        if not self._pending and (self._batch_worker is None or self._batch_worker.done()):
+            return
+
+        async def noop(db):
+            return None
+
+        await self.submit(noop)
+
+    async def _run_batches(self) -> None:
+        """Фоновый writer: групповые транзакции, пока есть операции в очереди.
+
+        Если writer падает, все операции в очереди завершаются ошибкой (или
+        отменой) — submit() не может повиснуть на будущем без исполнителя.
+        """
+        try:
+            while self._pending:
+                await self._commit_batch()
+        except BaseException as e:
+            abandoned, self._pending = self._pending, []
+            for _, future, _ in abandoned:
+                if future is None or future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel()
+            if isinstance(e, Exception):
+                logger.error(f"Фоновая запись в БД остановлена: {e}")
+            else:
+                raise
+
+    async def _commit_batch(self) -> None:
+        """Одна групповая транзакция.
+
+        Выполняет операции по мере поступления, пока не придёт срочная, не наберётся
+        max_batch или не истечёт flush_interval с начала транзакции; затем commit.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        # Операции, взятые из очереди, но ещё не выполненные (первая — выполняется)
+        queued: deque = deque()
+        # Срочные операции, ждущие коммита: (future, result, error)
+        awaiting_commit: list = []
+        executed = 0
+        urgent = False
+
+        def settle(future, result, error):
+            if future is None:
+                if error is not None:
+                    logger.error(f"Ошибка отложенной записи в БД: {error}")
+            elif not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        try:
+            async with self._write_lock:
+                if self._writer is None:
+                    self._writer = await self._open(read_only=False)
+                db = self._writer
+                try:
+                    await db.execute("BEGIN IMMEDIATE")
+                    while True:
+                        queued, self._pending = deque(self._pending), []
+                        self._wakeup.clear()
+                        while queued:
+                            # Операция остаётся в queued, пока не выполнена: при
+                            # сбое посреди неё её future тоже получит ошибку
+                            op, future, op_urgent = queued[0]
+                            await db.execute("SAVEPOINT write_behind")
+                            try:
+                                result = await op(db)
+                            except Exception as e:
+                                await db.execute("ROLLBACK TO write_behind")
+                                await db.execute("RELEASE write_behind")
+                                result, error = None, e
+                            else:
+                                await db.execute("RELEASE write_behind")
+                                error = None
+                            queued.popleft()
+                            executed += 1
+                            if op_urgent:
+                                urgent = True
+                                awaiting_commit.append((future, result, error))
+                            else:
+                                settle(future, result, error)
+
+                        remaining = deadline - loop.time()
+                        if urgent or executed >= self.max_batch or remaining <= 0:
+                            break
+                        if not self._pending:
+                            try:
+                                await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                            except asyncio.TimeoutError:
+                                pass
+                            if not self._pending:
+                                break
+                    await db.commit()
+                    self.commits += 1
+                except BaseException:
+                    await db.rollback()
+                    raise
+        except Exception as e:
+            logger.error(f"Ошибка групповой записи в БД ({executed} операций): {e}")
+            # Несрочные операции уже вернули результат — их записи потеряны, это в логе
+            awaiting_commit = [(future, None, e) for future, _, _ in awaiting_commit]
+            awaiting_commit += [(future, None, e) for _, future, _ in queued]
+        except BaseException:
+            # Транзакция прервана (CancelledError при остановке и т.п.): никто
+            # не должен остаться ждать результата навсегда
+            abandoned, self._pending = list(queued) + self._pending, []
+            for future in [f for f, _, _ in awaiting_commit] + [f for _, f, _ in abandoned]:
+                if future is not None and not future.done():
+                    future.cancel()
+            raise
+
+        for future, result, error in awaiting_commit:
+            settle(future, result, error)
+
+    # ------------------------------------------------------------------ #
+
+    async def close(self):
+        """Закрыть все соединения пула (предварительно записав очередь)."""
+        if self._loop is None or self._loop is not asyncio.get_running_loop():
+            return
+        await self.flush()
+        self._closed = True
+
+        async with self._write_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+
+        while not self._idle_readers.empty():
+            conn = self._idle_readers.get_nowait()
+            await conn.close()
+
+        logger.info(f"Пул соединений SQLite закрыт ({self.db_path})")
@@ -3,21 +3,87 @@
 """
 import aiosqlite
 import json
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
 from loguru import logger
 from models_db import Task, FoundItem, BlacklistRecord
+from db_pool import SQLitePool
+
+
+# Горячие запросы к found_items (выполняются на каждое принятое сообщение / запрос API).
+# Каждый обязан идти по индексу — см. tests/test_db_indexes.py (EXPLAIN QUERY PLAN).
+CONTENT_DUPLICATE_SQL = """
+    SELECT date FROM found_items
+    WHERE content_hash = ?
+      AND task_id = ?
+      AND found_at > ?
+"""
+
+# price может быть None — AND price = NULL в SQL всегда FALSE, поэтому обрабатываем отдельно
+AUTHOR_DUPLICATE_SQL = """
+    SELECT id FROM found_items
+    WHERE author_username = ?
+      AND date = ?
+      AND (price = ? OR (? IS NULL AND price IS NULL))
+      AND task_id = ?
+      AND found_at > ?
+    LIMIT 1
+"""
+
+FOUND_ITEMS_BY_TASK_SQL = "SELECT * FROM found_items WHERE task_id = ? ORDER BY found_at DESC LIMIT ?"
+COUNT_ITEMS_SQL = "SELECT COUNT(*) FROM found_items WHERE task_id = ?"
+COUNT_NOTIFIED_ITEMS_SQL = "SELECT COUNT(*) FROM found_items WHERE task_id = ? AND notified = 1"
+
+# Поиск в локальном индексе ЧС: термин (id / username) → сообщения, новые первыми
+BLACKLIST_TERM_SQL = """
+    SELECT m.chat_username, m.topic_id, m.message_id, m.message_date, m.message_text
+    FROM blacklist_terms t
+    JOIN blacklist_messages m
+      ON m.chat_username = t.chat_username
+     AND m.topic_id = t.topic_id
+     AND m.message_id = t.message_id
+    WHERE t.kind = ? AND t.value = ? AND m.message_date >= ?
+    ORDER BY m.message_date DESC
+"""
+
+# Полнотекстовый поиск по сообщениям ЧС (FTS5): {chats} — фильтр по чатам,
+# {order} — "rank" или "m.message_date DESC"
+BLACKLIST_FTS_SQL = """
+    SELECT m.chat_username, m.topic_id, m.message_id, m.message_date, m.message_text,
+           bm25(blacklist_fts) AS rank
+    FROM blacklist_fts
+    JOIN blacklist_messages m ON m.rowid = blacklist_fts.rowid
+    WHERE blacklist_fts MATCH ? AND m.message_date >= ?{chats}
+    ORDER BY {order}
+    LIMIT ?
+"""
 
 
 class DBService:
     """Сервис для работы с базой данных"""
 
-    def __init__(self, db_path: str = "workers.db"):
+    def __init__(
+        self,
+        db_path: str = "workers.db",
+        read_connections: int = 2,
+        flush_interval: float = 0.05
+    ):
         self.db_path = db_path
+        # Постоянные соединения (WAL, writer + readers) вместо connect() на каждый вызов.
+        # flush_interval — максимальная задержка коммита отложенных записей (write-behind)
+        self._pool = SQLitePool(db_path, readers=read_connections, flush_interval=flush_interval)
+
+    async def flush(self):
+        """Дождаться коммита всех отложенных записей (write-behind)"""
+        await self._pool.flush()
+
+    async def close(self):
+        """Записать очередь и закрыть соединения с БД (вызывается при остановке сервиса)"""
+        await self._pool.close()
 
     async def init_db(self):
         """Инициализация базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             # Таблица задач
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS tasks (
@@ -229,6 +295,32 @@ class DBService:
             except Exception as e:
                 logger.error(f"Ошибка миграции price nullable: {e}")
 
+            # Миграция: составные индексы под горячие запросы found_items.
+            # Создаются ПОСЛЕ пересоздания таблицы выше (DROP TABLE удаляет индексы).
+            # task_id первым — все запросы фильтруют по задаче.
+            #   УРОВЕНЬ 1 (content_hash): covering — date берётся из индекса
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_found_items_task_hash
+                ON found_items(task_id, content_hash, found_at, date)
+            """)
+            #   УРОВЕНЬ 2 (автор + дата + цена): covering — id это rowid.
+            #   price последним: условие с OR не годится для поиска по индексу,
+            #   но проверяется по самому индексу без чтения строки
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_found_items_task_author
+                ON found_items(task_id, author_username, date, found_at, price)
+            """)
+            #   get_found_items (ORDER BY found_at без сортировки) и count_items
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_found_items_task_found_at
+                ON found_items(task_id, found_at)
+            """)
+            #   count_notified_items
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_found_items_task_notified
+                ON found_items(task_id, notified)
+            """)
+
             # Миграция: добавляем session_path и blacklist_session_path в tasks
             try:
                 await db.execute("ALTER TABLE tasks ADD COLUMN session_path TEXT")
@@ -242,6 +334,20 @@ class DBService:
             except:
                 pass
 
+            # Отметки прогресса по чатам: последнее обработанное сообщение задачи
+            # в каждом чате (история после рестарта продолжается с него)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS chat_watermarks (
+                    task_id TEXT NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    chat_name TEXT,
+                    last_msg_id INTEGER NOT NULL,
+                    last_msg_date TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (task_id, chat_id)
+                )
+            """)
+
             # Таблица кеша черного списка
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS blacklist_cache (
@@ -314,18 +420,75 @@ class DBService:
                 ON blacklist_chats(chat_username, COALESCE(topic_id, -1))
             """)
 
+            # Локальный индекс ЧС: сообщения чатов ЧС, синхронизируемые по message_id
+            # (topic_id = 0 — чат без топика)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS blacklist_messages (
+                    chat_username TEXT NOT NULL,
+                    topic_id INTEGER NOT NULL DEFAULT 0,
+                    message_id INTEGER NOT NULL,
+                    message_date TEXT NOT NULL,
+                    message_text TEXT NOT NULL,
+                    PRIMARY KEY (chat_username, topic_id, message_id)
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_blacklist_messages_date
+                ON blacklist_messages(message_date)
+            """)
+
+            # Термины сообщений ЧС: kind = 'id' | 'username'
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS blacklist_terms (
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    chat_username TEXT NOT NULL,
+                    topic_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    PRIMARY KEY (kind, value, chat_username, topic_id, message_id)
+                ) WITHOUT ROWID
+            """)
+
+            # Отметки синхронизации: последний прочитанный message_id по чату/топику ЧС
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS blacklist_sync (
+                    chat_username TEXT NOT NULL,
+                    topic_id INTEGER NOT NULL DEFAULT 0,
+                    last_msg_id INTEGER NOT NULL,
+                    synced_at TEXT NOT NULL,
+                    PRIMARY KEY (chat_username, topic_id)
+                )
+            """)
+
+            # Полнотекстовый индекс сообщений ЧС (rowid = blacklist_messages.rowid).
+            # body — текст в нижнем регистре с ё→е, phones — номера телефонов (10 цифр)
+            async with db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'blacklist_fts'"
+            ) as cursor:
+                fts_exists = await cursor.fetchone() is not None
+            if not fts_exists:
+                await db.execute("""
+                    CREATE VIRTUAL TABLE blacklist_fts USING fts5(
+                        body, phones, tokenize = 'unicode61'
+                    )
+                """)
+                # Индекс, собранный без FTS, дочитывается заново при следующей синхронизации
+                await db.execute("DELETE FROM blacklist_terms")
+                await db.execute("DELETE FROM blacklist_messages")
+                await db.execute("DELETE FROM blacklist_sync")
+                logger.info("Создан полнотекстовый индекс ЧС (blacklist_fts)")
+
             # Добавляем дефолтный чат если ещё не существует
             await db.execute("""
                 INSERT OR IGNORE INTO blacklist_chats (chat_username, chat_title, added_at, is_active)
                 VALUES ('@Blacklist_pvz', 'Чёрный Список ПВЗ', datetime('now'), 1)
             """)
 
-            await db.commit()
             logger.info("База данных инициализирована")
 
     async def create_task(self, task: Task):
         """Создать задачу"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             await db.execute("""
                 INSERT INTO tasks
                 (task_id, user_id, mode, chats, filters,
@@ -338,13 +501,11 @@ class DBService:
                 task.status, task.created_at, task.stopped_at,
                 task.session_path, task.blacklist_session_path
             ))
-            await db.commit()
             logger.info(f"Задача {task.task_id} создана")
 
     async def get_task(self, task_id: str) -> Optional[Task]:
         """Получить задачу по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._pool.reader() as db:
             async with db.execute(
                 "SELECT * FROM tasks WHERE task_id = ?", (task_id,)
             ) as cursor:
@@ -355,8 +516,7 @@ class DBService:
 
     async def get_tasks_by_status(self, status: str) -> List[Task]:
         """Получить все задачи с заданным статусом"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._pool.reader() as db:
             async with db.execute(
                 "SELECT * FROM tasks WHERE status = ?", (status,)
             ) as cursor:
@@ -365,7 +525,7 @@ class DBService:
 
     async def update_task_status(self, task_id: str, status: str, stopped_at: Optional[str] = None):
         """Обновить статус задачи"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             if stopped_at:
                 await db.execute(
                     "UPDATE tasks SET status = ?, stopped_at = ? WHERE task_id = ?",
@@ -376,9 +536,81 @@ class DBService:
                     "UPDATE tasks SET status = ? WHERE task_id = ?",
                     (status, task_id)
                 )
-            await db.commit()
             logger.info(f"Статус задачи {task_id} обновлён на {status}")
 
+    @staticmethod
+    def _window_threshold(hours_window: int) -> str:
+        """Временная метка начала окна дедупликации (N часов назад)"""
+        return (datetime.utcnow() - timedelta(hours=hours_window)).isoformat()
+
+    @staticmethod
+    async def _is_content_duplicate(
+        db,
+        content_hash: str,
+        work_date: str,
+        task_id: str,
+        time_threshold: str
+    ) -> bool:
+        """УРОВЕНЬ 1 на переданном соединении (см. check_duplicate_smart)"""
+        # Ищем записи с таким же хешем за последние N часов
+        async with db.execute(
+            CONTENT_DUPLICATE_SQL, (content_hash, task_id, time_threshold)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        # Если не нашли записей с таким хешем → не дубликат
+        if not rows:
+            return False
+
+        # Проверяем, есть ли запись с ТАКОЙ ЖЕ датой работы
+        existing_dates = [row[0] for row in rows]
+
+        if work_date in existing_dates:
+            # Нашли запись с той же датой работы → ДУБЛИКАТ
+            logger.debug(
+                f"Дубликат обнаружен: content_hash={content_hash[:8]}..., "
+                f"дата работы={work_date}"
+            )
+            return True
+
+        # Хеш тот же, но дата работы ДРУГАЯ → НОВОЕ объявление
+        logger.debug(
+            f"Обновление объявления: content_hash={content_hash[:8]}..., "
+            f"новая дата работы={work_date}, старые даты={existing_dates}"
+        )
+        return False
+
+    @staticmethod
+    async def _is_author_duplicate(
+        db,
+        author_username: str,
+        work_date: str,
+        price: Optional[int],
+        task_id: str,
+        time_threshold: str
+    ) -> bool:
+        """УРОВЕНЬ 2 на переданном соединении (см. check_duplicate_by_author)"""
+        # Ищем записи от ЭТОГО АВТОРА с ЭТОЙ ДАТОЙ и ЭТОЙ ЦЕНОЙ за последние N часов
+        async with db.execute(
+            AUTHOR_DUPLICATE_SQL,
+            (author_username, work_date, price, price, task_id, time_threshold)
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        if row:
+            # Нашли запись от этого автора с той же датой и ценой → ДУБЛИКАТ
+            logger.debug(
+                f"Дубликат по автору: {author_username}, дата={work_date}, цена={price}"
+            )
+            return True
+
+        # Не нашли → это НОВОЕ объявление
+        # (автор либо изменил цену, либо ищет работу на другой день)
+        logger.debug(
+            f"Новое объявление от {author_username}: дата={work_date}, цена={price}"
+        )
+        return False
+
     async def check_duplicate_smart(
         self,
         content_hash: str,
@@ -402,41 +634,11 @@ class DBService:
         Returns:
             True если дубликат, False если новое объявление
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            # Временная метка N часов назад
-            from datetime import datetime, timedelta
-            time_threshold = (datetime.utcnow() - timedelta(hours=hours_window)).isoformat()
-
-            # Ищем записи с таким же хешем за последние N часов
-            async with db.execute("""
-                SELECT date FROM found_items
-                WHERE content_hash = ?
-                  AND task_id = ?
-                  AND found_at > ?
-            """, (content_hash, task_id, time_threshold)) as cursor:
-                rows = await cursor.fetchall()
-
-                # Если не нашли записей с таким хешем → не дубликат
-                if not rows:
-                    return False
-
-                # Проверяем, есть ли запись с ТАКОЙ ЖЕ датой работы
-                existing_dates = [row[0] for row in rows]
-
-                if work_date in existing_dates:
-                    # Нашли запись с той же датой работы → ДУБЛИКАТ
-                    logger.debug(
-                        f"Дубликат обнаружен: content_hash={content_hash[:8]}..., "
-                        f"дата работы={work_date}"
-                    )
-                    return True
-                else:
-                    # Хеш тот же, но дата работы ДРУГАЯ → НОВОЕ объявление
-                    logger.debug(
-                        f"Обновление объявления: content_hash={content_hash[:8]}..., "
-                        f"новая дата работы={work_date}, старые даты={existing_dates}"
-                    )
-                    return False
+        async with self._pool.reader() as db:
+            return await self._is_content_duplicate(
+                db, content_hash, work_date, task_id,
+                self._window_threshold(hours_window)
+            )
 
     async def check_duplicate_by_author(
         self,
@@ -475,64 +677,77 @@ class DBService:
         if not author_username:
             return False
 
-        async with aiosqlite.connect(self.db_path) as db:
-            # Временная метка N часов назад
-            from datetime import datetime, timedelta
-            time_threshold = (datetime.utcnow() - timedelta(hours=hours_window)).isoformat()
-
-            # Ищем записи от ЭТОГО АВТОРА с ЭТОЙ ДАТОЙ и ЭТОЙ ЦЕНОЙ за последние N часов
-            # price может быть None — AND price = NULL в SQL всегда FALSE, поэтому обрабатываем отдельно
-            async with db.execute("""
-                SELECT id FROM found_items
-                WHERE author_username = ?
-                  AND date = ?
-                  AND (price = ? OR (? IS NULL AND price IS NULL))
-                  AND task_id = ?
-                  AND found_at > ?
-                LIMIT 1
-            """, (author_username, work_date, price, price, task_id, time_threshold)) as cursor:
-                row = await cursor.fetchone()
-
-                if row:
-                    # Нашли запись от этого автора с той же датой и ценой → ДУБЛИКАТ
-                    logger.debug(
-                        f"Дубликат по автору: {author_username}, дата={work_date}, цена={price}"
-                    )
-                    return True
-                else:
-                    # Не нашли → это НОВОЕ объявление
-                    # (автор либо изменил цену, либо ищет работу на другой день)
-                    logger.debug(
-                        f"Новое объявление от {author_username}: дата={work_date}, цена={price}"
-                    )
-                    return False
+        async with self._pool.reader() as db:
+            return await self._is_author_duplicate(
+                db, author_username, work_date, price, task_id,
+                self._window_threshold(hours_window)
+            )
 
-    async def add_found_item(self, item: FoundItem) -> Optional[int]:
+    async def get_recent_dedup_keys(self, task_id: str, hours_window: int = 24) -> List[tuple]:
         """
-        Добавить найденное объявление (с умной дедупликацией)
+        Ключи дедупликации задачи за последние N часов (для прогрева DedupWindow)
 
-        Проверяет:
-        1. message_link (UNIQUE constraint) - защита от повторной обработки
-        2. content_hash + дата работы + временное окно 24ч - умная дедупликация
+        Returns:
+            Список (content_hash, date, author_username, price, found_at),
+            отсортированный по found_at
         """
-        # Умная проверка дубликатов (если есть content_hash)
-        if item.content_hash:
-            is_duplicate = await self.check_duplicate_smart(
-                content_hash=item.content_hash,
-                work_date=item.date,
-                task_id=item.task_id,
-                hours_window=24
-            )
+        async with self._pool.reader() as db:
+            async with db.execute("""
+                SELECT content_hash, date, author_username, price, found_at
+                FROM found_items
+                WHERE task_id = ? AND found_at > ?
+                ORDER BY found_at
+            """, (task_id, self._window_threshold(hours_window))) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+
+    async def add_found_item_deduplicated(
+        self,
+        item: FoundItem,
+        hours_window: int = 24,
+        check_author: bool = True,
+        urgent: bool = True
+    ) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Дедупликация и вставка объявления одной транзакцией
+
+        Оба уровня дедупликации и INSERT выполняются на соединении-писателе
+        внутри одной транзакции (BEGIN IMMEDIATE), поэтому два чата, одновременно
+        прислав один и тот же кросс-пост, не смогут оба пройти проверки.
+        Операция идёт через очередь write-behind: вставки параллельных задач
+        коммитятся одной групповой транзакцией, результат возвращается после
+        коммита. urgent=False — результат сразу после выполнения, коммит вместе
+        с последующими вставками (разбор истории); уведомлять о таком объявлении
+        можно только после flush().
+
+        Порядок проверок:
+        1. author + дата работы + цена (если check_author и есть author_username)
+        2. content_hash + дата работы (если есть content_hash)
+        3. message_link (UNIQUE(task_id, message_link))
 
-            if is_duplicate:
-                logger.debug(
-                    f"Умная дедупликация: объявление пропущено "
-                    f"(hash={item.content_hash[:8]}..., дата={item.date})"
-                )
-                return None
+        Returns:
+            (item_id, None) — объявление добавлено
+            (None, reason)  — дубликат, reason: "author" | "content" | "message_link"
+        """
+        time_threshold = self._window_threshold(hours_window)
+
+        async def dedup_and_insert(db) -> Tuple[Optional[int], Optional[str]]:
+            if check_author and item.author_username:
+                if await self._is_author_duplicate(
+                    db, item.author_username, item.date, item.price,
+                    item.task_id, time_threshold
+                ):
+                    return None, "author"
+
+            if item.content_hash:
+                if await self._is_content_duplicate(
+                    db, item.content_hash, item.date, item.task_id, time_threshold
+                ):
+                    logger.debug(
+                        f"Умная дедупликация: объявление пропущено "
+                        f"(hash={item.content_hash[:8]}..., дата={item.date})"
+                    )
+                    return None, "content"
 
-        # Добавляем в БД
-        async with aiosqlite.connect(self.db_path) as db:
             try:
                 cursor = await db.execute("""
                     INSERT INTO found_items
@@ -548,28 +763,38 @@ class DBService:
                     item.message_text, item.message_link, item.chat_name, item.message_date,
                     item.found_at, item.notified, item.content_hash, item.topic_id, item.topic_name
                 ))
-                await db.commit()
-                logger.info(f"Добавлено объявление: {item.message_link}")
-                return cursor.lastrowid
             except aiosqlite.IntegrityError:
                 logger.debug(f"Дубликат по message_link пропущен: {item.message_link}")
-                return None
+                return None, "message_link"
+
+            logger.info(f"Добавлено объявление: {item.message_link}")
+            return cursor.lastrowid, None
+
+        return await self._pool.submit(dedup_and_insert, urgent=urgent)
+
+    async def add_found_item(self, item: FoundItem) -> Optional[int]:
+        """
+        Добавить найденное объявление (с умной дедупликацией)
+
+        Проверяет:
+        1. message_link (UNIQUE constraint) - защита от повторной обработки
+        2. content_hash + дата работы + временное окно 24ч - умная дедупликация
+        """
+        item_id, _ = await self.add_found_item_deduplicated(item, check_author=False)
+        return item_id
 
     async def get_found_items(self, task_id: str, limit: int = 50) -> List[FoundItem]:
         """Получить список найденных объявлений"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._pool.reader() as db:
             async with db.execute(
-                "SELECT * FROM found_items WHERE task_id = ? ORDER BY found_at DESC LIMIT ?",
-                (task_id, limit)
+                FOUND_ITEMS_BY_TASK_SQL, (task_id, limit)
             ) as cursor:
                 rows = await cursor.fetchall()
                 return [FoundItem(**dict(row)) for row in rows]
 
     async def get_found_item_by_id(self, item_id: int) -> Optional[FoundItem]:
         """Получить объявление по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._pool.reader() as db:
             async with db.execute(
                 "SELECT * FROM found_items WHERE id = ?", (item_id,)
             ) as cursor:
@@ -578,32 +803,89 @@ class DBService:
                     return FoundItem(**dict(row))
                 return None
 
+    async def get_existing_found_item_ids(self, item_ids: List[int]) -> Set[int]:
+        """Какие из объявлений есть в БД (закоммичены) — перед отложенным уведомлением"""
+        if not item_ids:
+            return set()
+        placeholders = ",".join("?" * len(item_ids))
+        async with self._pool.reader() as db:
+            async with db.execute(
+                f"SELECT id FROM found_items WHERE id IN ({placeholders})", tuple(item_ids)
+            ) as cursor:
+                return {row[0] for row in await cursor.fetchall()}
+
     async def mark_as_notified(self, item_id: int):
-        """Отметить объявление как отправленное"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """
+        Отметить объявление как отправленное
+
+        Write-behind: UPDATE ставится в очередь и коммитится вместе со следующей
+        вставкой (или не позже flush_interval), не дожидаясь диска.
+        """
+        async def mark(db):
             await db.execute(
                 "UPDATE found_items SET notified = 1 WHERE id = ?", (item_id,)
             )
-            await db.commit()
+
+        self._pool.submit_nowait(mark)
 
     async def count_items(self, task_id: str) -> int:
         """Подсчитать количество найденных объявлений"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.reader() as db:
             async with db.execute(
-                "SELECT COUNT(*) FROM found_items WHERE task_id = ?", (task_id,)
+                COUNT_ITEMS_SQL, (task_id,)
             ) as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else 0
 
     async def count_notified_items(self, task_id: str) -> int:
         """Подсчитать количество отправленных уведомлений (notified=1)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.reader() as db:
             async with db.execute(
-                "SELECT COUNT(*) FROM found_items WHERE task_id = ? AND notified = 1", (task_id,)
+                COUNT_NOTIFIED_ITEMS_SQL, (task_id,)
             ) as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else 0
 
+    # ========== Отметки прогресса по чатам ==========
+
+    async def save_watermark(
+        self,
+        task_id: str,
+        chat_id: int,
+        chat_name: str,
+        msg_id: int,
+        msg_date: Optional[str]
+    ):
+        """
+        Сдвинуть отметку задачи в чате (только вперёд)
+
+        Write-behind: UPSERT уходит в очередь после INSERT объявления этого же
+        сообщения, поэтому отметка не коммитится раньше результата обработки.
+        """
+        async def save(db):
+            await db.execute("""
+                INSERT INTO chat_watermarks
+                    (task_id, chat_id, chat_name, last_msg_id, last_msg_date, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(task_id, chat_id) DO UPDATE SET
+                    chat_name = excluded.chat_name,
+                    last_msg_id = excluded.last_msg_id,
+                    last_msg_date = excluded.last_msg_date,
+                    updated_at = excluded.updated_at
+                WHERE excluded.last_msg_id > chat_watermarks.last_msg_id
+            """, (task_id, chat_id, chat_name, msg_id, msg_date, datetime.utcnow().isoformat()))
+
+        self._pool.submit_nowait(save)
+
+    async def get_watermarks(self, task_id: str) -> Dict[int, Tuple[int, Optional[str]]]:
+        """Отметки задачи: {chat_id: (last_msg_id, last_msg_date)}"""
+        async with self._pool.reader() as db:
+            async with db.execute(
+                "SELECT chat_id, last_msg_id, last_msg_date FROM chat_watermarks WHERE task_id = ?",
+                (task_id,)
+            ) as cursor:
+                return {row[0]: (row[1], row[2]) for row in await cursor.fetchall()}
+
     # ========== Методы для работы с черным списком ==========
 
     async def add_blacklist_record(self, record: BlacklistRecord) -> Optional[int]:
@@ -612,7 +894,7 @@ class DBService:
 
         Если запись с таким telegram_user_id уже есть — обновляем её.
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             try:
                 cursor = await db.execute("""
                     INSERT INTO blacklist_cache
@@ -631,7 +913,6 @@ class DBService:
                     record.phone, record.role, record.message_link,
                     record.message_id, record.parsed_at
                 ))
-                await db.commit()
                 return cursor.lastrowid
             except Exception as e:
                 logger.error(f"Ошибка добавления записи в blacklist_cache: {e}")
@@ -647,8 +928,7 @@ class DBService:
         Returns:
             BlacklistRecord если найден, иначе None
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._pool.reader() as db:
             async with db.execute(
                 "SELECT * FROM blacklist_cache WHERE telegram_user_id = ?",
                 (telegram_user_id,)
@@ -660,9 +940,8 @@ class DBService:
 
     async def clear_blacklist_cache(self):
         """Очистить кеш черного списка"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             await db.execute("DELETE FROM blacklist_cache")
-            await db.commit()
             logger.info("Кеш черного списка очищен")
 
     async def get_blacklist_stats(self) -> dict:
@@ -672,7 +951,7 @@ class DBService:
         Returns:
             Словарь с количеством записей и датой последнего обновления
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.reader() as db:
             # Общее количество записей
             async with db.execute("SELECT COUNT(*) FROM blacklist_cache") as cursor:
                 row = await cursor.fetchone()
@@ -709,7 +988,7 @@ class DBService:
         Returns:
             author_id (Telegram User ID) или None
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.reader() as db:
             async with db.execute(
                 "SELECT author_id FROM found_items WHERE id = ?", (item_id,)
             ) as cursor:
@@ -730,7 +1009,7 @@ class DBService:
         Returns:
             blacklist_session_path или None
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.reader() as db:
             async with db.execute("""
                 SELECT t.blacklist_session_path
                 FROM found_items fi
@@ -742,6 +1021,150 @@ class DBService:
                     return row[0]
                 return None
 
+    # ========== Локальный индекс черного списка ==========
+
+    async def get_blacklist_sync_marks(self) -> Dict[Tuple[str, int], int]:
+        """Отметки синхронизации индекса ЧС: {(chat_username, topic_id): last_msg_id}"""
+        async with self._pool.reader() as db:
+            async with db.execute(
+                "SELECT chat_username, topic_id, last_msg_id FROM blacklist_sync"
+            ) as cursor:
+                return {(row[0], row[1]): row[2] for row in await cursor.fetchall()}
+
+    async def save_blacklist_messages(
+        self,
+        chat_username: str,
+        topic_id: int,
+        messages: List[tuple],
+        last_msg_id: int
+    ) -> None:
+        """
+        Записать новые сообщения чата ЧС в индекс и сдвинуть отметку (одна транзакция)
+
+        Args:
+            messages: [(message_id, message_date ISO, text, {(kind, value), ...}, fts_body, fts_phones)]
+            last_msg_id: самый новый прочитанный message_id (включая сообщения без текста)
+        """
+        synced_at = datetime.utcnow().isoformat()
+        keys = [(chat_username, topic_id, message[0]) for message in messages]
+
+        async def save(db):
+            # Повторно прочитанное сообщение заменяется вместе со строкой FTS
+            await db.executemany("""
+                DELETE FROM blacklist_fts WHERE rowid IN (
+                    SELECT rowid FROM blacklist_messages
+                    WHERE chat_username = ? AND topic_id = ? AND message_id = ?
+                )
+            """, keys)
+            await db.executemany("""
+                INSERT OR REPLACE INTO blacklist_messages
+                (chat_username, topic_id, message_id, message_date, message_text)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (chat_username, topic_id, message_id, message_date, text)
+                for message_id, message_date, text, *_ in messages
+            ])
+            await db.executemany("""
+                INSERT INTO blacklist_fts (rowid, body, phones)
+                SELECT rowid, ?, ? FROM blacklist_messages
+                WHERE chat_username = ? AND topic_id = ? AND message_id = ?
+            """, [
+                (body, phones, chat_username, topic_id, message_id)
+                for message_id, _, _, _, body, phones in messages
+            ])
+            await db.executemany("""
+                INSERT OR IGNORE INTO blacklist_terms
+                (kind, value, chat_username, topic_id, message_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (kind, value, chat_username, topic_id, message_id)
+                for message_id, _, _, terms, *_ in messages
+                for kind, value in terms
+            ])
+            await db.execute("""
+                INSERT INTO blacklist_sync (chat_username, topic_id, last_msg_id, synced_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(chat_username, topic_id) DO UPDATE SET
+                    last_msg_id = MAX(blacklist_sync.last_msg_id, excluded.last_msg_id),
+                    synced_at = excluded.synced_at
+            """, (chat_username, topic_id, last_msg_id, synced_at))
+
+        await self._pool.submit(save)
+
+    async def find_blacklist_term(self, kind: str, value: str, since: str) -> List[dict]:
+        """Сообщения индекса ЧС с термином kind=value не старше since (новые первыми)"""
+        async with self._pool.reader() as db:
+            async with db.execute(BLACKLIST_TERM_SQL, (kind, value, since)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def search_blacklist_fts(
+        self,
+        query: str,
+        since: str,
+        chats: Optional[List[Tuple[str, int]]] = None,
+        limit: int = 20,
+        newest_first: bool = False
+    ) -> List[dict]:
+        """
+        Полнотекстовый поиск по сообщениям индекса ЧС
+
+        Args:
+            query: выражение FTS5 MATCH по столбцам body / phones
+            since: только сообщения не старше (ISO)
+            chats: только эти (chat_username, topic_id); None — все
+            newest_first: сортировка по дате вместо релевантности (bm25)
+
+        Returns:
+            Строки сообщений с полем rank (меньше — релевантнее)
+        """
+        params: list = [query, since]
+        chats_sql = ""
+        if chats is not None:
+            if not chats:
+                return []
+            chats_sql = " AND (m.chat_username, m.topic_id) IN (VALUES {})".format(
+                ", ".join(["(?, ?)"] * len(chats))
+            )
+            params.extend(value for chat in chats for value in chat)
+        sql = BLACKLIST_FTS_SQL.format(
+            chats=chats_sql, order="m.message_date DESC" if newest_first else "rank"
+        )
+        async with self._pool.reader() as db:
+            async with db.execute(sql, (*params, limit)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def count_blacklist_messages(self, since: Optional[str] = None) -> int:
+        """Количество сообщений в индексе ЧС (не старше since)"""
+        async with self._pool.reader() as db:
+            async with db.execute(
+                "SELECT COUNT(*) FROM blacklist_messages WHERE message_date >= ?",
+                (since or "",)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else 0
+
+    async def prune_blacklist_index(self, before: str) -> int:
+        """Удалить из индекса ЧС сообщения старше before"""
+        async def prune(db):
+            await db.execute("""
+                DELETE FROM blacklist_fts WHERE rowid IN (
+                    SELECT rowid FROM blacklist_messages WHERE message_date < ?
+                )
+            """, (before,))
+            await db.execute("""
+                DELETE FROM blacklist_terms
+                WHERE (chat_username, topic_id, message_id) IN (
+                    SELECT chat_username, topic_id, message_id
+                    FROM blacklist_messages WHERE message_date < ?
+                )
+            """, (before,))
+            cursor = await db.execute(
+                "DELETE FROM blacklist_messages WHERE message_date < ?", (before,)
+            )
+            return cursor.rowcount
+
+        return await self._pool.submit(prune)
+
     # ========== Методы для управления чатами черного списка ==========
 
     async def get_blacklist_chats(self, active_only: bool = True) -> List[dict]:
@@ -754,8 +1177,7 @@ class DBService:
         Returns:
             Список словарей с chat_username, topic_id, topic_name
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._pool.reader() as db:
             if active_only:
                 query = "SELECT chat_username, topic_id, topic_name FROM blacklist_chats WHERE is_active = 1"
             else:
@@ -771,7 +1193,7 @@ class DBService:
         chats — список dict с ключами: chat_username, topic_id (опц.), topic_name (опц.)
         Возвращает количество добавленных чатов.
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             await db.execute("DELETE FROM blacklist_chats")
             count = 0
             for entry in chats:
@@ -785,7 +1207,6 @@ class DBService:
                     VALUES (?, datetime('now'), 1, ?, ?)
                 """, (chat_username, topic_id, topic_name))
                 count += 1
-            await db.commit()
             logger.info(f"Синхронизировано чатов ЧС: {count}")
             return count
 
@@ -813,13 +1234,12 @@ class DBService:
         if not chat_username.startswith("@"):
             chat_username = f"@{chat_username}"
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             try:
                 await db.execute("""
                     INSERT OR IGNORE INTO blacklist_chats (chat_username, chat_title, added_at, is_active, topic_id, topic_name)
                     VALUES (?, ?, datetime('now'), 1, ?, ?)
                 """, (chat_username, chat_title, topic_id, topic_name))
-                await db.commit()
                 topic_info = f" (топик: {topic_name})" if topic_name else ""
                 logger.info(f"Добавлен чат ЧС: {chat_username}{topic_info}")
                 return True
@@ -833,7 +1253,6 @@ class DBService:
                     await db.execute("""
                         UPDATE blacklist_chats SET is_active = 1 WHERE chat_username = ? AND topic_id IS NULL
                     """, (chat_username,))
-                await db.commit()
                 logger.info(f"Чат ЧС активирован: {chat_username}")
                 return True
 
@@ -851,7 +1270,7 @@ class DBService:
         if not chat_username.startswith("@"):
             chat_username = f"@{chat_username}"
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             if topic_id is not None:
                 cursor = await db.execute("""
                     UPDATE blacklist_chats SET is_active = 0 WHERE chat_username = ? AND topic_id = ?
@@ -860,7 +1279,6 @@ class DBService:
                 cursor = await db.execute("""
                     UPDATE blacklist_chats SET is_active = 0 WHERE chat_username = ? AND topic_id IS NULL
                 """, (chat_username,))
-            await db.commit()
 
             if cursor.rowcount > 0:
                 logger.info(f"Чат ЧС деактивирован: {chat_username}")
@@ -874,8 +1292,7 @@ class DBService:
         Returns:
             Список словарей с информацией о чатах
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._pool.reader() as db:
             async with db.execute("""
                 SELECT chat_username, chat_title, added_at, is_active, topic_id, topic_name
                 FROM blacklist_chats
@@ -904,7 +1321,7 @@ class DBService:
         # Временная граница (записи старше этой даты удаляем)
         threshold = (datetime.utcnow() - timedelta(days=days)).isoformat()
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.writer() as db:
             # 1. Очистка found_items
             cursor = await db.execute(
                 "DELETE FROM found_items WHERE found_at < ?",
@@ -919,6 +1336,11 @@ class DBService:
             )
             deleted_tasks = cursor_tasks.rowcount
 
+            # Отметки удалённых задач больше не нужны
+            await db.execute(
+                "DELETE FROM chat_watermarks WHERE task_id NOT IN (SELECT task_id FROM tasks)"
+            )
+
             # 3. Очистка старого кэша черного списка
             cursor_bl = await db.execute(
                 "DELETE FROM blacklist_cache WHERE parsed_at < ?",
@@ -926,8 +1348,6 @@ class DBService:
             )
             deleted_bl = cursor_bl.rowcount
 
-            await db.commit()
-
             if deleted_items > 0 or deleted_tasks > 0 or deleted_bl > 0:
                 logger.info(
                     f"Auto-cleanup (> {days} дней): удалено {deleted_items} объявлений, "
@@ -945,7 +1365,7 @@ class DBService:
         Returns:
             Словарь с количеством записей по таблицам
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._pool.reader() as db:
             stats = {}
 
             # Количество задач
@@ -963,6 +1383,11 @@ class DBService:
                 row = await cursor.fetchone()
                 stats['blacklist_cache_count'] = row[0] if row else 0
 
+            # Сообщений в локальном индексе ЧС
+            async with db.execute("SELECT COUNT(*) FROM blacklist_messages") as cursor:
+                row = await cursor.fetchone()
+                stats['blacklist_index_count'] = row[0] if row else 0
+
             # Самая старая запись в found_items
             async with db.execute(
                 "SELECT MIN(found_at) FROM found_items"
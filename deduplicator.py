@@ -5,6 +5,8 @@
 Уровень 2: Author-based (защита от кросс-постов + изменение цены)
 """
 import hashlib
+import time
+from collections import deque
 from typing import Optional
 
 
@@ -116,3 +118,154 @@ class Deduplicator:
 
         # Если дата работы НОВАЯ - не дубликат (это обновление объявления)
         return False
+
+
+class DedupWindow:
+    """
+    In-memory индекс недавних объявлений одной задачи (скользящее окно)
+
+    Держит те же ключи, что проверяет SQLite, но только за последние N часов:
+      - content_hashes: {content_hash: {work_date: ts}} — УРОВЕНЬ 1,
+        формат совместим с Deduplicator.is_duplicate(existing_hashes=...)
+      - author_keys:    {author_key: ts}                 — УРОВЕНЬ 2
+
+    Записи лежат в очереди в порядке времени добавления, поэтому истечение
+    окна — это снятие записей с головы очереди (амортизированно O(1)).
+    Ключ удаляется, только если его не добавляли повторно позже.
+
+    Прогревается из found_items при старте задачи (warm), после чего
+    process_message отбрасывает дубликаты без обращения к диску.
+    """
+
+    def __init__(self, hours_window: int = 24):
+        self.window_seconds = hours_window * 3600
+        self.content_hashes: dict = {}
+        self.author_keys: dict = {}
+        # (ts, content_hash, work_date, author_key) в порядке ts
+        self._entries: deque = deque()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Удалить записи старше окна"""
+        threshold = (now if now is not None else time.time()) - self.window_seconds
+        entries = self._entries
+        while entries and entries[0][0] <= threshold:
+            ts, content_hash, work_date, author_key = entries.popleft()
+
+            if content_hash is not None:
+                dates = self.content_hashes.get(content_hash)
+                if dates is not None and dates.get(work_date) == ts:
+                    del dates[work_date]
+                    if not dates:
+                        del self.content_hashes[content_hash]
+
+            if author_key is not None and self.author_keys.get(author_key) == ts:
+                del self.author_keys[author_key]
+
+    def add(
+        self,
+        content_hash: Optional[str],
+        work_date: str,
+        author_username: Optional[str],
+        price: Optional[int],
+        ts: Optional[float] = None
+    ) -> None:
+        """Запомнить принятое объявление"""
+        ts = ts if ts is not None else time.time()
+        author_key = (
+            Deduplicator.create_author_key(author_username, work_date, price)
+            if author_username else None
+        )
+
+        if content_hash is not None:
+            self.content_hashes.setdefault(content_hash, {})[work_date] = ts
+        if author_key is not None:
+            self.author_keys[author_key] = ts
+        self._entries.append((ts, content_hash, work_date, author_key))
+
+    def is_author_duplicate(
+        self,
+        author_username: Optional[str],
+        work_date: str,
+        price: Optional[int]
+    ) -> bool:
+        """УРОВЕНЬ 2: автор + дата работы + цена уже встречались в окне"""
+        if not author_username:
+            return False
+        key = Deduplicator.create_author_key(author_username, work_date, price)
+        return key in self.author_keys
+
+    def is_content_duplicate(self, content_hash: Optional[str], work_date: str) -> bool:
+        """УРОВЕНЬ 1: тот же content_hash с той же датой работы в окне"""
+        if not content_hash:
+            return False
+        return Deduplicator.is_duplicate(content_hash, work_date, self.content_hashes)
+
+
+class RecentMessageIds:
+    """
+    Недавно обработанные message_id по чатам (защита от двойной обработки
+    одного сообщения real-time handler'ом и polling fallback'ом)
+
+    message_id внутри чата растут, а повторно приходят только свежие сообщения,
+    поэтому на чат хранится кольцевой битмап последних `window` id:
+    бит слота (message_id % window) — обработано ли сообщение.
+    Когда приходит id новее максимального, слоты, выпавшие из окна, очищаются
+    по одному — забываются только самые старые id, а не всё разом.
+
+    Проверка и отметка — O(1); память — window/8 байт на чат
+    (4096 id = 512 байт вместо ~100 байт на каждую строку "chat_id:msg_id").
+    Сообщения старше окна считаются новыми: их отсекает дедупликация в БД.
+    """
+
+    def __init__(self, window: int = 4096):
+        # Окно кратно 8: слот = бит в bytearray
+        self.window = max(8, (window + 7) // 8 * 8)
+        # chat_id → [максимальный message_id, битмап окна]
+        self._chats: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def __contains__(self, key: tuple) -> bool:
+        chat_id, message_id = key
+        state = self._chats.get(chat_id)
+        if state is None:
+            return False
+        high, bits = state
+        if message_id > high or message_id <= high - self.window:
+            return False
+        slot = message_id % self.window
+        return bool(bits[slot >> 3] & (1 << (slot & 7)))
+
+    def add(self, chat_id: int, message_id: int) -> bool:
+        """Отметить сообщение обработанным; False — оно уже было отмечено"""
+        window = self.window
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = [message_id, bytearray(window // 8)]
+        high, bits = state
+
+        if message_id > high:
+            # Окно сдвигается: слоты id high+1..message_id освобождаются
+            if message_id - high >= window:
+                bits = state[1] = bytearray(window // 8)
+            else:
+                for old_id in range(high + 1, message_id + 1):
+                    slot = old_id % window
+                    bits[slot >> 3] &= ~(1 << (slot & 7))
+            state[0] = message_id
+        elif message_id <= high - window:
+            return True  # Старше окна — не помним
+
+        slot = message_id % window
+        mask = 1 << (slot & 7)
+        if bits[slot >> 3] & mask:
+            return False
+        bits[slot >> 3] |= mask
+        return True
+
+    def memory_bytes(self) -> int:
+        return len(self._chats) * self.window // 8
@@ -9,13 +9,27 @@
   2. Станции метро  — одного города → определён; двух → коллизия → улицы
   3. Названия улиц  — одного города → определён; двух → коллизия → нет сигнала
 
-Поиск — по токенам нормализованного текста, не по подстроке (O(1) dict lookup).
-Кеш   — LRU in-memory, 15 000 записей, ключ = нормализованный текст, значение = маска.
+Поиск — по токенам нормализованного текста, не по подстроке: все три словаря
+собраны в один токенный trie, совпадения всех уровней находятся за один
+проход слева направо без построения n-грамм.
+Кеш   — LRU in-memory с лимитом по памяти (4 МБ), ключ = blake2b исходного
+        текста (16 байт), проверяется до нормализации.
+
+Снимок — нормализованные словари и trie сохраняются в data/geo/geo_index.bin
+(marshal) вместе с хешем исходных .txt и кода модуля. При старте снимок
+читается через mmap; пересобирается, только если хеш не совпал.
+Собрать заранее (например, в Docker-образе): python geo_filter.py
 """
+import hashlib
+import marshal
+import mmap
+import os
 import re
+import sys
+import threading
 from collections import OrderedDict
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Tuple
 
 from loguru import logger
 
@@ -25,53 +39,62 @@ SPB: int = 2
 
 _DATA_DIR = Path(__file__).parent / "data" / "geo"
 
+# Исходные словари: (файл, город, уровень)
+_SOURCES: tuple = (
+    ('moscow_aliases.txt', MOSCOW, 'alias'),
+    ('spb_aliases.txt',    SPB,    'alias'),
+    ('metro_moscow.txt',   MOSCOW, 'metro'),
+    ('metro_spb.txt',      SPB,    'metro'),
+    ('streets_moscow.txt', MOSCOW, 'street'),
+    ('streets_spb.txt',    SPB,    'street'),
+)
+
+_SNAPSHOT_NAME  = 'geo_index.bin'
+_SNAPSHOT_MAGIC = b'GEOIDX01'
+_DIGEST_SIZE    = 32
+_HEADER_SIZE    = len(_SNAPSHOT_MAGIC) + _DIGEST_SIZE
+
 # --------------------------------------------------------------------------- #
 # Нормализация                                                                  #
 # --------------------------------------------------------------------------- #
 
-_RE_CITY_PREFIX = re.compile(r'\bг\.?\s+')          # «г.» / «г » перед словом
-_RE_HYPHEN      = re.compile(r'(\w)-(\w)')           # дефис между символами
-_RE_SPECIAL     = re.compile(r'[^\w\s]')             # спецсимволы (не буква/цифра/пробел)
-_RE_SPACES      = re.compile(r'\s+')                 # серия пробелов
-
-# Аббревиатуры и типы улиц.
-# Порядок важен: сначала раскрываем сокращения, затем удаляем полные слова типов.
-_ABBR: tuple = (
-    # --- раскрытие сокращений ---
-    (re.compile(r'\bпр-кт\b'),   'проспект'),
-    (re.compile(r'\bпросп\b'),   'проспект'),
-    (re.compile(r'\bбул\b'),     'бульвар'),
-    (re.compile(r'\bнаб\b'),     'набережная'),
-    (re.compile(r'\bш\b'),       'шоссе'),
-    (re.compile(r'\bпр\b'),      'проспект'),
-    # --- удаление (сокращения) ---
-    (re.compile(r'\bул\b'),      ''),
-    # --- удаление (полные слова типов улиц) ---
-    (re.compile(r'\bулица\b'),       ''),
-    (re.compile(r'\bпроспект\b'),    ''),
-    (re.compile(r'\bбульвар\b'),     ''),
-    (re.compile(r'\bнабережная\b'),  ''),
-    (re.compile(r'\bшоссе\b'),       ''),
-    (re.compile(r'\bпереулок\b'),    ''),
-    (re.compile(r'\bтупик\b'),       ''),
-    (re.compile(r'\bплощадь\b'),     ''),
-    (re.compile(r'\bаллея\b'),       ''),
-    (re.compile(r'\bпроезд\b'),      ''),
-    (re.compile(r'\bпросека\b'),     ''),
-)
+# Токен — серия символов \w; всё остальное (пробелы, точки, дефисы,
+# спецсимволы) только разделяет токены.
+_RE_TOKEN        = re.compile(r'\w+')
+# То же, но с захватом «.» / пробела после токена — для префикса «г.»
+_RE_TOKEN_SUFFIX = re.compile(r'(\w+)(\.?\s)?')
+
+# Префикс города: «г.» / «г » перед словом отбрасывается
+_CITY_PREFIX = 'г'
+
+# Аббревиатуры и типы улиц — отбрасываются как целые токены.
+# Сокращения (пр, просп, бул, наб, ш) раньше раскрывались в полные слова,
+# которые следующим шагом удалялись, поэтому итог для них тот же.
+_DROP_TOKENS: frozenset = frozenset((
+    # --- сокращения ---
+    'пр', 'просп', 'бул', 'наб', 'ш', 'ул',
+    # --- полные слова типов улиц ---
+    'улица', 'проспект', 'бульвар', 'набережная', 'шоссе', 'переулок',
+    'тупик', 'площадь', 'аллея', 'проезд', 'просека',
+))
 
 
 def _normalize(text: str) -> str:
-    """Привести текст к единому виду для словарного поиска."""
-    text = text.lower()
-    text = text.replace('ё', 'е')
-    text = _RE_CITY_PREFIX.sub('', text)      # г. Красногорск → красногорск
-    text = text.replace('.', ' ')             # м. → м, пр. → пр
-    text = _RE_HYPHEN.sub(r'\1 \2', text)     # санкт-петербург → санкт петербург
-    for pattern, replacement in _ABBR:
-        text = pattern.sub(replacement, text)
-    text = _RE_SPECIAL.sub(' ', text)
-    return _RE_SPACES.sub(' ', text).strip()
+    """Привести текст к единому виду для словарного поиска.
+
+    Один проход токенизатора: нижний регистр, ё→е, токены (серии \\w) через пробел
+    без префикса «г.» и типов улиц. «пр-кт», «санкт-петербург», «м.» сами
+    распадаются на токены, так как дефис и точка — разделители.
+    """
+    text = text.lower().replace('ё', 'е')
+    tokens = _RE_TOKEN.findall(text)
+    if _CITY_PREFIX in tokens:
+        # Редкий случай — повторный проход с захватом того, что идёт после «г»
+        tokens = [
+            m[1] for m in _RE_TOKEN_SUFFIX.finditer(text)
+            if not (m[2] and m[1] == _CITY_PREFIX)    # г. Красногорск → красногорск
+        ]
+    return ' '.join([t for t in tokens if t not in _DROP_TOKENS])
 
 
 # --------------------------------------------------------------------------- #
@@ -101,22 +124,215 @@ def _load_dict(path: Path, city_mask: int, target: dict) -> None:
 # Сканирование                                                                  #
 # --------------------------------------------------------------------------- #
 
-def _scan(tokens: list, lookup: dict, max_n: int) -> int:
-    """Пройти по токенам, генерируя n-граммы длиной 1..max_n.
+# Маски уровней упакованы в одно число: по 2 бита (МСК | СПб) на уровень
+_ALIAS_SHIFT  = 0
+_METRO_SHIFT  = 2
+_STREET_SHIFT = 4
+_BOTH = MOSCOW | SPB
+
+# Ключ маски в узле trie (токены после split() не бывают пустыми)
+_TERMINAL = ''
 
-    Возвращает накопленную битовую маску (0 / 1 / 2 / 3).
-    Останавливается досрочно, если обе стороны уже найдены.
+
+def _build_index(levels: tuple) -> dict:
+    """Собрать токенный trie из словарей уровней.
+
+    levels: ((lookup, shift), ...) — lookup {нормализованная фраза: маска}.
+    Узел — dict {токен: дочерний узел}; в _TERMINAL — упакованная маска
+    всех уровней, где фраза, заканчивающаяся в этом узле, есть в словаре.
     """
+    root: dict = {}
+    for lookup, shift in levels:
+        for phrase, mask in lookup.items():
+            node = root
+            for token in phrase.split():
+                node = node.setdefault(token, {})
+            node[_TERMINAL] = node.get(_TERMINAL, 0) | (mask << shift)
+    return root
+
+
+def _scan_index(tokens: list, root: dict, stop: int) -> int:
+    """Найти все словарные фразы в токенах за один проход слева направо.
+
+    От каждой позиции спускаемся по trie, пока есть продолжение (глубина
+    ограничена самой длинной фразой). Возвращает OR упакованных масок;
+    останавливается досрочно, когда набраны все биты stop.
+    """
+    packed = 0
     n = len(tokens)
-    mask = 0
-    for size in range(1, min(max_n, n) + 1):
-        for i in range(n - size + 1):
-            hit = lookup.get(' '.join(tokens[i:i + size]), 0)
+    for i in range(n):
+        node = root.get(tokens[i])
+        j = i + 1
+        while node is not None:
+            hit = node.get(_TERMINAL)
             if hit:
-                mask |= hit
-                if mask == (MOSCOW | SPB):
-                    return mask
-    return mask
+                packed |= hit
+                if packed & stop == stop:
+                    return packed
+            if j == n:
+                break
+            node = node.get(tokens[j])
+            j += 1
+    return packed
+
+
+# --------------------------------------------------------------------------- #
+# Снимок словарей                                                               #
+# --------------------------------------------------------------------------- #
+
+def _sources_digest(data_dir: Path) -> bytes:
+    """SHA-256 исходных словарей и кода модуля (нормализация влияет на ключи)."""
+    h = hashlib.sha256(_SNAPSHOT_MAGIC)
+    h.update(marshal.version.to_bytes(4, 'little'))
+    h.update(Path(__file__).read_bytes())
+    for name, _, _ in _SOURCES:
+        path = data_dir / name
+        h.update(name.encode())
+        h.update(path.read_bytes() if path.exists() else b'\x00missing')
+    return h.digest()
+
+
+def _build_dicts(data_dir: Path) -> tuple:
+    """Прочитать и нормализовать исходные .txt: (alias, metro, street, index)."""
+    levels = {'alias': {}, 'metro': {}, 'street': {}}
+    for name, city_mask, level in _SOURCES:
+        _load_dict(data_dir / name, city_mask, levels[level])
+    index = _build_index((
+        (levels['alias'],  _ALIAS_SHIFT),
+        (levels['metro'],  _METRO_SHIFT),
+        (levels['street'], _STREET_SHIFT),
+    ))
+    return levels['alias'], levels['metro'], levels['street'], index
+
+
+def _load_snapshot(path: Path, digest: bytes):
+    """Прочитать снимок через mmap; None — если его нет, он устарел или повреждён."""
+    try:
+        with path.open('rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:_HEADER_SIZE] != _SNAPSHOT_MAGIC + digest:
+                logger.info(f"geo: снимок {path.name} устарел — пересобираем")
+                return None
+            with memoryview(mm) as view:
+                data = marshal.loads(view[_HEADER_SIZE:])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, TypeError) as e:
+        logger.warning(f"geo: не удалось прочитать снимок {path}: {e}")
+        return None
+    if not isinstance(data, tuple) or len(data) != 4:
+        logger.warning(f"geo: снимок {path} имеет неожиданный формат")
+        return None
+    return data
+
+
+def _write_snapshot(path: Path, digest: bytes, data: tuple) -> None:
+    """Атомарно записать снимок (tmp + rename); ошибка записи не критична."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open('wb') as fh:
+            fh.write(_SNAPSHOT_MAGIC + digest)
+            fh.write(marshal.dumps(data))
+        os.replace(tmp, path)
+        logger.debug(f"geo: снимок записан: {path}")
+    except OSError as e:
+        logger.warning(f"geo: не удалось записать снимок {path}: {e}")
+        tmp.unlink(missing_ok=True)
+
+
+def _load_or_build(data_dir: Path) -> Tuple[tuple, bool]:
+    """Словари и trie из снимка, а при несовпадении хеша — из исходников.
+
+    Возвращает (данные, загружено_из_снимка).
+    """
+    digest = _sources_digest(data_dir)
+    snapshot = data_dir / _SNAPSHOT_NAME
+    data = _load_snapshot(snapshot, digest)
+    if data is not None:
+        return data, True
+    data = _build_dicts(data_dir)
+    _write_snapshot(snapshot, digest, data)
+    return data, False
+
+
+# --------------------------------------------------------------------------- #
+# Кеш результатов                                                               #
+# --------------------------------------------------------------------------- #
+
+class GeoCache:
+    """LRU-кеш (mask, level) по дайджесту исходного текста.
+
+    Ключ — blake2b(text, 16 байт): кросс-посты находятся без нормализации,
+    а кеш не держит в памяти тексты сообщений. Значения — общие кортежи
+    из небольшого набора, поэтому размер записи фиксирован и лимит по памяти
+    сводится к лимиту числа записей. Потокобезопасен (потоки parse_pool).
+    """
+
+    _DIGEST_SIZE = 16
+    # Ключ bytes(16) + узел OrderedDict (замерено tracemalloc, с запасом)
+    _ENTRY_BYTES = sys.getsizeof(bytes(_DIGEST_SIZE)) + 80
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.max_size = max(1, max_bytes // self._ENTRY_BYTES)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+        # Интернирование результатов: одинаковые (mask, level) — один объект
+        self._results: Dict[Tuple[int, str], Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(
+            text.encode('utf-8', 'surrogatepass'), digest_size=self._DIGEST_SIZE
+        ).digest()
+
+    def get(self, key: bytes):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: bytes, result: Tuple[int, str]) -> Tuple[int, str]:
+        with self._lock:
+            result = self._results.setdefault(result, result)
+            if key not in self._entries and len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = result
+            return result
+
+    def memory_bytes(self) -> int:
+        """Фактический объём: таблица OrderedDict + ключи (значения общие)."""
+        return sys.getsizeof(self._entries) + len(self._entries) * sys.getsizeof(bytes(self._DIGEST_SIZE))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'memory_bytes': self.memory_bytes(),
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
 
 
 # --------------------------------------------------------------------------- #
@@ -129,30 +345,21 @@ class GeoFilter:
     Публичный API:
         should_take_for_moscow(text: str) -> bool
         should_take_for_spb(text: str)    -> bool
+        cache_stats() -> dict
     """
 
-    _CACHE_SIZE: int = 15_000
+    def __init__(self, data_dir: Path = _DATA_DIR, cache_max_bytes: int = 4 * 1024 * 1024) -> None:
+        data, from_snapshot = _load_or_build(data_dir)
+        self._alias_dict:  dict = data[0]
+        self._metro_dict:  dict = data[1]
+        self._street_dict: dict = data[2]
+        self._index:       dict = data[3]
 
-    def __init__(self, data_dir: Path = _DATA_DIR) -> None:
-        self._alias_dict:  dict = {}
-        self._metro_dict:  dict = {}
-        self._street_dict: dict = {}
-
-        _load_dict(data_dir / 'moscow_aliases.txt', MOSCOW, self._alias_dict)
-        _load_dict(data_dir / 'spb_aliases.txt',    SPB,    self._alias_dict)
-        _load_dict(data_dir / 'metro_moscow.txt',   MOSCOW, self._metro_dict)
-        _load_dict(data_dir / 'metro_spb.txt',      SPB,    self._metro_dict)
-        _load_dict(data_dir / 'streets_moscow.txt', MOSCOW, self._street_dict)
-        _load_dict(data_dir / 'streets_spb.txt',    SPB,    self._street_dict)
-
-        self._max_alias_n:  int = max((len(k.split()) for k in self._alias_dict),  default=1)
-        self._max_metro_n:  int = max((len(k.split()) for k in self._metro_dict),  default=1)
-        self._max_street_n: int = max((len(k.split()) for k in self._street_dict), default=1)
-
-        self._cache: OrderedDict = OrderedDict()
+        self._cache = GeoCache(cache_max_bytes)
 
         logger.info(
-            f"geo: словари загружены — алиасов={len(self._alias_dict)}, "
+            f"geo: словари загружены ({'снимок' if from_snapshot else 'исходники'}) — "
+            f"алиасов={len(self._alias_dict)}, "
             f"метро={len(self._metro_dict)}, улиц={len(self._street_dict)}"
         )
 
@@ -170,20 +377,24 @@ class GeoFilter:
             logger.debug('geo: no_signal')
             return 0, 'none'
 
-        # Уровень 1: явный город (early exit — метро и улицы не проверяются)
-        alias_mask = _scan(tokens, self._alias_dict, self._max_alias_n)
+        # Один проход по trie собирает маски всех трёх уровней;
+        # коллизия алиасов однозначно решает результат — дальше не сканируем
+        packed = _scan_index(tokens, self._index, _BOTH << _ALIAS_SHIFT)
+
+        # Уровень 1: явный город (приоритет — метро и улицы не учитываются)
+        alias_mask = (packed >> _ALIAS_SHIFT) & _BOTH
         if alias_mask:
             return alias_mask, 'explicit'
 
         # Уровень 2: метро
-        metro_mask = _scan(tokens, self._metro_dict, self._max_metro_n)
+        metro_mask = (packed >> _METRO_SHIFT) & _BOTH
         if metro_mask in (MOSCOW, SPB):
             return metro_mask, 'metro'
         if metro_mask == (MOSCOW | SPB):
             logger.debug('geo: conflict_metro')
 
         # Уровень 3: улицы (проверяем при metro_mask == 0 или коллизии)
-        street_mask = _scan(tokens, self._street_dict, self._max_street_n)
+        street_mask = (packed >> _STREET_SHIFT) & _BOTH
         if street_mask in (MOSCOW, SPB):
             return street_mask, 'street'
         if street_mask == (MOSCOW | SPB):
@@ -193,17 +404,20 @@ class GeoFilter:
         return 0, 'none'
 
     def _get_mask(self, text: str) -> Tuple[int, str]:
-        """Вернуть (mask, level) с LRU-кешированием."""
-        norm = _normalize(text)
-        if norm in self._cache:
-            self._cache.move_to_end(norm)
-            return self._cache[norm]
-        result = self._detect(norm)
-        if len(self._cache) >= self._CACHE_SIZE:
-            self._cache.popitem(last=False)
-        self._cache[norm] = result
+        """Вернуть (mask, level) с LRU-кешированием (нормализация — только при промахе)."""
+        key = self._cache.key(text)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._cache.put(key, self._detect(_normalize(text)))
         return result
 
+    def cache_stats(self) -> Dict:
+        """Метрики кеша: размер, hit rate, вытеснения, занятая память."""
+        return self._cache.stats()
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
     # ------------------------------------------------------------------ #
 
     def should_take_for_moscow(self, text: str) -> bool:
@@ -229,5 +443,14 @@ class GeoFilter:
         return True
 
 
-# Синглтон: словари загружаются один раз при первом импорте модуля
-geo_filter = GeoFilter()
+# Синглтон: словари загружаются один раз при первом импорте модуля.
+# При запуске скриптом не создаётся — словари собирает __main__ (один раз)
+if __name__ != '__main__':
+    geo_filter = GeoFilter()
+
+
+if __name__ == '__main__':
+    # Пересобрать снимок словарей: python geo_filter.py
+    _digest = _sources_digest(_DATA_DIR)
+    _write_snapshot(_DATA_DIR / _SNAPSHOT_NAME, _digest, _build_dicts(_DATA_DIR))
+    print(f"geo: снимок {_DATA_DIR / _SNAPSHOT_NAME} собран")
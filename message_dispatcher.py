@@ -0,0 +1,134 @@
+"""
+Центральный диспетчер сообщений: один поток updates на клиент, много задач-подписчиков
+
+Раньше каждая задача вешала свой MessageHandler и заново извлекала данные
+из того же сообщения. Теперь на общем клиенте сессии один handler:
+  - MessageExtractor.extract (через extraction_cache) и гео-детекция
+    выполняются один раз на сообщение
+  - результат (ParsedMessage) раздаётся всем задачам, подписанным на чат
+  - на каждую задачу остаются только дешёвые шаги: топики, ItemFilter, дедупликация
+"""
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+from pyrogram import filters
+from pyrogram.handlers import MessageHandler as PyrogramMessageHandler
+from pyrogram.types import Message
+
+from message_extractor import extraction_cache
+from geo_filter import geo_filter
+
+
+class ParsedMessage:
+    """Результат разбора текста сообщения, общий для всех задач-подписчиков.
+
+    Гео-решение вычисляется лениво и не больше одного раза на город:
+    задачи с city_filter='ALL' или с меткой города у чата его не запрашивают.
+    """
+
+    __slots__ = ('text', 'date', 'extracted', '_geo')
+
+    def __init__(self, text: Optional[str], message_date: datetime):
+        self.text = (text or "").replace('\x00', '')
+        self.date = message_date
+        # Через кэш: кросс-посты и перечитанные polling'ом сообщения не разбираются повторно
+        self.extracted: Optional[Dict] = extraction_cache.extract(self.text, message_date)
+        self._geo: Dict[str, bool] = {}
+
+    @classmethod
+    def from_parts(
+        cls, text: str, message_date: datetime, extracted: Optional[Dict], geo: Dict[str, bool]
+    ) -> 'ParsedMessage':
+        """Собрать результат, посчитанный вне event loop (parse_pool), без повторного разбора."""
+        parsed = cls.__new__(cls)
+        parsed.text = text
+        parsed.date = message_date
+        parsed.extracted = extracted
+        parsed._geo = dict(geo)
+        return parsed
+
+    def takes_city(self, city: str) -> bool:
+        """Брать ли сообщение для задачи с фильтром города 'МСК' / 'СПБ'."""
+        if city not in self._geo:
+            if city == 'МСК':
+                self._geo[city] = geo_filter.should_take_for_moscow(self.text)
+            elif city == 'СПБ':
+                self._geo[city] = geo_filter.should_take_for_spb(self.text)
+            else:
+                self._geo[city] = True
+        return self._geo[city]
+
+
+def chat_display_name(message: Message) -> str:
+    """Имя чата в формате задач: '@username' или название/ID."""
+    if message.chat.username:
+        return f"@{message.chat.username}"
+    return message.chat.title or str(message.chat.id)
+
+
+class MessageDispatcher:
+    """Один Pyrogram handler на клиент, раздающий сообщения подписчикам по chat_id.
+
+    Подписчик — корутина handler(message, chat_name, parsed).
+    """
+
+    def __init__(self):
+        # chat_id → список подписчиков (в порядке подписки)
+        self._subscribers: Dict[int, List[Callable]] = {}
+        # Фильтр читает актуальные подписки, поэтому handler регистрируется один раз
+        self.handler = PyrogramMessageHandler(
+            self._on_message,
+            filters=filters.create(
+                lambda _, __, message: bool(message.chat) and message.chat.id in self._subscribers
+            ),
+        )
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, chat_ids: List[int], handler: Callable) -> None:
+        """Подписать handler на сообщения из chat_ids."""
+        for chat_id in chat_ids:
+            subscribers = self._subscribers.setdefault(chat_id, [])
+            if handler not in subscribers:
+                subscribers.append(handler)
+
+    def unsubscribe(self, handler: Callable) -> None:
+        """Отписать handler от всех чатов."""
+        for chat_id in list(self._subscribers):
+            subscribers = self._subscribers[chat_id]
+            if handler in subscribers:
+                subscribers.remove(handler)
+            if not subscribers:
+                del self._subscribers[chat_id]
+
+    async def dispatch(self, message: Message) -> None:
+        """Разобрать сообщение один раз и передать всем подписчикам его чата."""
+        subscribers = self._subscribers.get(message.chat.id)
+        if not subscribers:
+            return
+
+        # Пропускаем сервисные сообщения
+        if not message.text:
+            logger.debug(f"[REALTIME] Пропускаем сообщение без текста (service message)")
+            return
+
+        chat_name = chat_display_name(message)
+        logger.info(
+            f"[REALTIME] Новое сообщение из {chat_name} "
+            f"(подписчиков: {len(subscribers)}): {message.text[:50]}..."
+        )
+
+        parsed = ParsedMessage(message.text, message.date)
+        results = await asyncio.gather(
+            *(handler(message, chat_name, parsed) for handler in list(subscribers)),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"[REALTIME] Ошибка подписчика при обработке {chat_name}: {result}")
+
+    async def _on_message(self, client, message: Message):
+        await self.dispatch(message)
@@ -1,11 +1,22 @@
+import hashlib
 import re
-from typing import Optional, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime, timedelta
 from loguru import logger
 
 
 class MessageExtractor:
-    """Извлечение структурированных данных из текста"""
+    """Извлечение структурированных данных из текста
+
+    Все паттерны компилируются один раз при импорте (см. ниже класса),
+    ключевые слова объединены в alternation-регулярки. extract() приводит
+    текст к нижнему регистру и находит серии цифр один раз, после чего
+    паттерны, начинающиеся с цифры, проверяются только в этих позициях.
+    Публичные detect_type / extract_* сохранены для обратной совместимости.
+    """
 
     EMPLOYER_KEYWORDS = [
         "требуется", "требуются", "вакансия", "ищем", "набираем",
@@ -58,16 +69,14 @@ class MessageExtractor:
 
     @staticmethod
     def detect_type(text: str) -> Optional[str]:
-        text = text.lower()
-
-        for k in MessageExtractor.EMPLOYER_KEYWORDS:
-            if k in text:
-                return "employer"
-
-        for k in MessageExtractor.WORKER_KEYWORDS:
-            if k in text:
-                return "worker"
+        return MessageExtractor._detect_type(text.lower())
 
+    @staticmethod
+    def _detect_type(text: str) -> Optional[str]:
+        if _EMPLOYER_RE.search(text):
+            return "employer"
+        if _WORKER_RE.search(text):
+            return "worker"
         return None
 
     @staticmethod
@@ -80,24 +89,34 @@ class MessageExtractor:
     @staticmethod
     def extract_date(text: str, message_date: datetime) -> Optional[str]:
         text = text.lower()
+        return MessageExtractor._extract_date(text, message_date, _digit_runs(text))
 
-        if "послезавтра" in text:
-            return (message_date + timedelta(days=2)).date().isoformat()
+    @staticmethod
+    def _extract_date(text: str, message_date: datetime, runs: List[Tuple[int, int]]) -> Optional[str]:
         if "завтра" in text:
+            # "послезавтра" содержит "завтра" — проверяем его первым
+            if "послезавтра" in text:
+                return (message_date + timedelta(days=2)).date().isoformat()
             return (message_date + timedelta(days=1)).date().isoformat()
         if "сегодня" in text:
             return message_date.date().isoformat()
 
-        for word, num in MessageExtractor.WEEKDAYS.items():
-            if re.search(r'\b' + re.escape(word) + r'\b', text):
-                return MessageExtractor._nearest_weekday(num, message_date).date().isoformat()
+        # Приоритет — порядок WEEKDAYS, а не позиция в тексте
+        words = _WEEKDAY_HINT_RE.search(text) and _WEEKDAY_RE.findall(text)
+        if words:
+            word = min(words, key=_WEEKDAY_ORDER.__getitem__)
+            num = MessageExtractor.WEEKDAYS[word]
+            return MessageExtractor._nearest_weekday(num, message_date).date().isoformat()
 
-        abbr = re.search(r'\b(пн|вт|ср|чт|пт|сб|вс)\b', text)
+        abbr = _WEEKDAY_ABBR_RE.search(text)
         if abbr:
             num = MessageExtractor.WEEKDAY_ABBR[abbr.group(1)]
             return MessageExtractor._nearest_weekday(num, message_date).date().isoformat()
 
-        m = re.search(r'(\d{1,2})[-\s]?(?:го|числа)', text)
+        if not runs:
+            return None
+
+        m = ("го" in text or "числа" in text) and _search_runs(_DAY_NUMBER_RE, 2, text, runs)
         if m:
             day = int(m.group(1))
             month = message_date.month
@@ -112,7 +131,7 @@ class MessageExtractor:
             except ValueError:
                 pass
 
-        m = re.search(r'(\d{1,2})[./](\d{1,2})', text)
+        m = ("." in text or "/" in text) and _search_runs(_DAY_MONTH_NUMERIC_RE, 2, text, runs)
         if m:
             day, month = map(int, m.groups())
             year = message_date.year
@@ -124,7 +143,7 @@ class MessageExtractor:
             except ValueError:
                 pass
 
-        m = re.search(r'(\d{1,2})\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)', text)
+        m = _MONTH_HINT_RE.search(text) and _search_runs(_DAY_MONTH_NAME_RE, 2, text, runs)
         if m:
             day = int(m.group(1))
             month = MessageExtractor.MONTHS[m.group(2)]
@@ -139,14 +158,26 @@ class MessageExtractor:
     @staticmethod
     def extract_price(text: str, msg_type: Optional[str]) -> Optional[int]:
         text = text.lower()
+        return MessageExtractor._extract_price(text, msg_type, _digit_runs(text))
+
+    @staticmethod
+    def _extract_price(text: str, msg_type: Optional[str], runs: List[Tuple[int, int]]) -> Optional[int]:
+        # Все паттерны цены требуют цифр
+        if not runs:
+            return None
+
         prices = []
 
-        for pattern in MessageExtractor.PRICE_PATTERNS:
-            for m in re.finditer(pattern, text):
+        for cues, pattern, anchor in _PRICE_SCAN:
+            if cues is not None and not cues.search(text):
+                continue
+            matches = pattern.finditer(text) if anchor is None else _iter_runs(pattern, anchor, text, runs)
+            for m in matches:
                 try:
                     val = m.group(1).replace(",", ".")
                     price = float(val)
-                    if "к" in m.group(0) or "тыс" in m.group(0):
+                    matched = m.group(0)
+                    if "к" in matched or "тыс" in matched:
                         price *= 1000
                     prices.append(int(price))
                 except (ValueError, IndexError):
@@ -160,9 +191,19 @@ class MessageExtractor:
     @staticmethod
     def extract_shk(text: str) -> Optional[str]:
         text = text.lower()
+        return MessageExtractor._extract_shk(text, _digit_runs(text))
+
+    @staticmethod
+    def _extract_shk(text: str, runs: List[Tuple[int, int]]) -> Optional[str]:
+        # Все паттерны ШК содержат "шк" — без него не запускаем ни один
+        if "шк" not in text:
+            return None
 
-        for pattern in MessageExtractor.SHK_PATTERNS:
-            m = re.search(pattern, text)
+        for pattern, anchor in _SHK_SCAN:
+            if anchor is None:
+                m = pattern.search(text)
+            else:
+                m = _search_runs(pattern, anchor, text, runs)
             if m:
                 if m.lastindex and m.lastindex >= 2:
                     return f"{m.group(1)}-{m.group(2)}"
@@ -172,24 +213,31 @@ class MessageExtractor:
 
     @staticmethod
     def has_worker_intent(text: str) -> bool:
-        return bool(re.search(r'выйду|ищу|устроюсь|свободен|готов', text.lower()))
+        return bool(_WORKER_INTENT_RE.search(text.lower()))
 
     @staticmethod
     def extract(text: str, message_date: datetime) -> Optional[Dict]:
-        msg_type = MessageExtractor.detect_type(text)
+        # Один lower() и один поиск серий цифр на все шаги извлечения
+        return MessageExtractor._extract(text.lower(), message_date)
 
-        date = MessageExtractor.extract_date(text, message_date)
-        shk = MessageExtractor.extract_shk(text)
+    @staticmethod
+    def _extract(lower: str, message_date: datetime) -> Optional[Dict]:
+        """extract() по тексту, уже приведённому к нижнему регистру"""
+        runs = _digit_runs(lower)
+        msg_type = MessageExtractor._detect_type(lower)
+
+        date = MessageExtractor._extract_date(lower, message_date, runs)
+        shk = MessageExtractor._extract_shk(lower, runs)
 
         if not date:
             date = message_date.date().isoformat()
 
         # Нормализуем тип ДО извлечения цены — влияет на выбор min/max
         effective_type = msg_type
-        if effective_type is None and MessageExtractor.has_worker_intent(text):
+        if effective_type is None and _WORKER_INTENT_RE.search(lower):
             effective_type = "worker"
 
-        price = MessageExtractor.extract_price(text, effective_type)
+        price = MessageExtractor._extract_price(lower, effective_type, runs)
 
         # Финальная нормализация типа
         if msg_type is None:
@@ -200,7 +248,7 @@ class MessageExtractor:
                 # Нет ни keyword, ни intent — чаты специализированные, дефолт employer
                 msg_type = "employer"
             else:
-                logger.debug(f"Цена и тип не найдены: {text[:50]}")
+                logger.debug(f"Цена и тип не найдены: {lower[:50]}")
                 return None
 
         return {
@@ -209,4 +257,189 @@ class MessageExtractor:
             "date": date,
             "shk": shk,
             "location": None
-        }
\ No newline at end of file
+        }
+
+
+# --------------------------------------------------------------------------- #
+# Предкомпилированные паттерны (один раз при импорте)                          #
+# --------------------------------------------------------------------------- #
+
+def _keywords_re(keywords) -> "re.Pattern":
+    """Alternation по ключевым словам (длинные первыми) — один проход по тексту."""
+    return re.compile('|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)))
+
+
+_EMPLOYER_RE = _keywords_re(MessageExtractor.EMPLOYER_KEYWORDS)
+_WORKER_RE = _keywords_re(MessageExtractor.WORKER_KEYWORDS)
+_WORKER_INTENT_RE = re.compile(r'выйду|ищу|устроюсь|свободен|готов')
+
+_WEEKDAY_RE = re.compile(
+    r'\b(' + '|'.join(re.escape(w) for w in MessageExtractor.WEEKDAYS) + r')\b'
+)
+# Дешёвая предпроверка без \b: полный паттерн запускается, только если слово есть
+_WEEKDAY_HINT_RE = _keywords_re(MessageExtractor.WEEKDAYS)
+_WEEKDAY_ORDER = {word: i for i, word in enumerate(MessageExtractor.WEEKDAYS)}
+# ≡ \b(пн|вт|...)\b; граница слева проверяется lookbehind'ом после совпадения,
+# чтобы движок re мог быстро пропускать позиции по первой букве
+_WEEKDAY_ABBR_RE = re.compile(r'(пн|вт|ср|чт|пт|сб|вс)(?<=\b..)\b')
+_DAY_NUMBER_RE = re.compile(r'(\d{1,2})[-\s]?(?:го|числа)')
+_DAY_MONTH_NUMERIC_RE = re.compile(r'(\d{1,2})[./](\d{1,2})')
+_DAY_MONTH_NAME_RE = re.compile(
+    r'(\d{1,2})\s+(' + '|'.join(MessageExtractor.MONTHS) + r')'
+)
+_MONTH_HINT_RE = _keywords_re(MessageExtractor.MONTHS)
+
+_DIGIT_RUN_RE = re.compile(r'\d+')
+
+# Где внутри серии цифр может начаться совпадение паттерна (anchor):
+#   None — паттерн начинается не с цифры, обычный поиск по всему тексту
+#   0    — только с начала серии: \d+ без верхней границы (если с начала
+#          серии совпадения нет, из её середины его тоже нет) или \b\d
+#   k    — паттерн (\d{n,k})<не цифра>: группа обязана закончиться вместе
+#          с серией, самая левая возможная позиция — за k цифр до её конца
+_RUN_START = 0
+
+# Для каждого паттерна цены — подстроки, без которых он не может совпасть
+# (поиск литералов вместо прогона полной регулярки по тексту)
+_PRICE_SCAN = tuple(
+    (_keywords_re(cues) if cues else None, re.compile(p), anchor)
+    for p, cues, anchor in zip(
+        MessageExtractor.PRICE_PATTERNS,
+        (('к',), ('тыс',), ('₽', 'руб', 'р'), ('ставка', 'зп', 'оплата'), ()),
+        (_RUN_START, _RUN_START, 5, None, _RUN_START),
+    )
+)
+_SHK_SCAN = tuple(
+    (re.compile(p), anchor)
+    for p, anchor in zip(MessageExtractor.SHK_PATTERNS, (4, None, 4, None, None, None))
+)
+
+
+def _digit_runs(text: str) -> List[Tuple[int, int]]:
+    """Серии цифр текста: [(start, end)]"""
+    return [m.span() for m in _DIGIT_RUN_RE.finditer(text)]
+
+
+def _iter_runs(pattern: "re.Pattern", anchor: int, text: str, runs: List[Tuple[int, int]]) -> list:
+    """То же, что list(pattern.finditer(text)), но попытки только в сериях цифр."""
+    found = []
+    last_end = 0
+    match = pattern.match
+    for start, end in runs:
+        if anchor == _RUN_START:
+            if start < last_end:
+                continue
+            pos = start
+        else:
+            pos = end - anchor
+            if pos < start:
+                pos = start
+            if pos < last_end:
+                if last_end >= end:
+                    continue
+                pos = last_end
+        m = match(text, pos)
+        if m:
+            last_end = m.end()
+            found.append(m)
+    return found
+
+
+def _search_runs(pattern: "re.Pattern", anchor: int, text: str, runs: List[Tuple[int, int]]):
+    """То же, что pattern.search(text), но попытки только в сериях цифр."""
+    match = pattern.match
+    for start, end in runs:
+        pos = end - anchor if anchor else start
+        if pos < start:
+            pos = start
+        m = match(text, pos)
+        if m:
+            return m
+    return None
+
+
+# --------------------------------------------------------------------------- #
+# Кэш результатов извлечения                                                    #
+# --------------------------------------------------------------------------- #
+
+class ExtractionCache:
+    """LRU/TTL-кэш перед MessageExtractor.extract.
+
+    Кросс-посты копируются между чатами, а polling перечитывает сообщения,
+    уже обработанные real-time handler'ом, — одинаковый текст разбирается
+    один раз в сутки, а не на каждый чат и задачу.
+
+    Ключ: (blake2b нормализованного текста, день message_date). Результат
+    extract() зависит от даты только через день ("завтра", дни недели,
+    перенос числа на следующий месяц/год). Нормализация — lower() и strip():
+    extract() и так работает по тексту в нижнем регистре, а крайние пробелы
+    не влияют ни на один паттерн.
+
+    Потокобезопасен (потоки parse_pool в режиме thread): OrderedDict и счётчики
+    под блокировкой, сам разбор — вне её.
+
+    Публичный API:
+        extract(text, message_date) -> Optional[Dict]
+        stats() -> dict (hits / misses / size)
+    """
+
+    def __init__(self, max_size: int = 20_000, ttl_seconds: float = 24 * 3600) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # key → (expires_at, result)
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def extract(self, text: str, message_date: datetime) -> Optional[Dict]:
+        normalized = text.lower().strip()
+        key = (
+            hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest(),
+            message_date.date(),
+        )
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    # Копия: вызывающий код может дописывать поля в результат
+                    return dict(result) if result is not None else None
+                del self._cache[key]
+            self.misses += 1
+
+        # Разбор — без блокировки: одинаковый текст в двух потоках разберётся дважды
+        result = MessageExtractor._extract(normalized, message_date)
+        with self._lock:
+            if key not in self._cache and len(self._cache) >= self.max_size:
+                self._cache.popitem(last=False)
+            self._cache[key] = (now + self.ttl_seconds, result)
+        return dict(result) if result is not None else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._cache),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Синглтон: общий кэш для диспетчера, истории и polling всех задач
+extraction_cache = ExtractionCache()
@@ -69,6 +69,7 @@ async def migrate():
     # Используем DBService для создания таблиц с новой схемой
     db = DBService()
     await db.init_db()
+    await db.close()
 
     print("   ✅ База данных обновлена")
     print()
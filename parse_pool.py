@@ -0,0 +1,109 @@
+"""
+Пул разбора сообщений для парсинга истории
+
+parse_history на backfill за 14 дней гонит тысячи сообщений через
+process_message на event loop FastAPI/Pyrogram. Чисто CPU-часть —
+MessageExtractor.extract и гео-детекция — при включённом пуле выполняется
+пачками вне event loop:
+
+  off     — разбор на event loop, по одному сообщению (как раньше)
+  thread  — ThreadPoolExecutor: regex из `re` держит GIL, поэтому прироста
+            скорости нет, но event loop получает управление каждые
+            sys.getswitchinterval() (5 мс) — /health и real-time не ждут пачку
+  process — ProcessPoolExecutor (spawn): разбор реально параллелен;
+            в воркеры уходят только (текст, дата), обратно — dict и гео-решения
+
+Пачка разбирается целиком и возвращается в исходном порядке; дальше
+process_message (топики, ItemFilter, дедупликация, БД) идёт на event loop.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from config import config
+from message_dispatcher import ParsedMessage
+
+MODES = ('off', 'thread', 'process')
+
+
+def _parse_chunk(items: List[Tuple[str, datetime]], cities: Tuple[str, ...]) -> List[tuple]:
+    """Разобрать пачку в воркере: [(text, extracted, {город: брать?})] в том же порядке."""
+    results = []
+    for text, message_date in items:
+        parsed = ParsedMessage(text, message_date)
+        geo = {city: parsed.takes_city(city) for city in cities}
+        results.append((parsed.text, parsed.extracted, geo))
+    return results
+
+
+class ParsePool:
+    """Ленивый executor для разбора пачек сообщений истории.
+
+    Публичный API:
+        enabled -> bool
+        parse_many(messages, cities) -> List[ParsedMessage]
+        shutdown()
+    """
+
+    def __init__(self, mode: str = 'off', workers: int = 2, chunk_size: int = 200) -> None:
+        if mode not in MODES:
+            logger.warning(f"PARSE_POOL={mode!r} не поддерживается ({', '.join(MODES)}) — пул выключен")
+            mode = 'off'
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self._executor: Optional[Executor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == 'process':
+                # spawn: fork процесса с потоками Pyrogram/aiosqlite небезопасен
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='parse'
+                )
+            logger.info(f"Пул разбора истории запущен: {self.mode}, воркеров={self.workers}")
+        return self._executor
+
+    async def parse_many(self, messages: list, cities: Iterable[str] = ()) -> List[ParsedMessage]:
+        """Разобрать сообщения Pyrogram пачкой; результат — в порядке messages.
+
+        cities — города ('МСК' / 'СПБ'), для которых гео-решение считается
+        заранее в воркере (ParsedMessage.takes_city потом отвечает из кэша).
+        """
+        cities = tuple(cities)
+        if not self.enabled:
+            return [ParsedMessage(m.text, m.date) for m in messages]
+
+        items = [(m.text, m.date) for m in messages]
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self._get_executor(), _parse_chunk, items, cities)
+        return [
+            ParsedMessage.from_parts(text, message.date, extracted, geo)
+            for message, (text, extracted, geo) in zip(messages, results)
+        ]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальный пул (один на процесс, общий для всех задач)
+parse_pool = ParsePool(
+    mode=config.PARSE_POOL,
+    workers=config.PARSE_POOL_WORKERS,
+    chunk_size=config.PARSE_POOL_CHUNK,
+)
@@ -3,14 +3,217 @@
 """
 import asyncio
 import sqlite3
-from pyrogram import Client, filters
+import time
+from pyrogram import Client
+from pyrogram.errors import FloodWait
 from pyrogram.types import Message
 from pyrogram.raw.functions.channels import GetForumTopics
 from pyrogram.raw.types import InputPeerChannel
 from datetime import datetime, timedelta
-from typing import List, Callable, Dict
+from typing import List, Callable, Dict, Optional, Tuple
 from loguru import logger
 
+from config import config
+from message_dispatcher import MessageDispatcher
+from parse_pool import parse_pool
+from poll_scheduler import PollScheduler
+
+
+# Сколько раз повторяем запрос после FloodWait, прежде чем сдаться
+_FLOOD_RETRIES = 5
+
+# Polling: первая страница — по PollScheduler.limit (от _POLL_LIMIT); если все
+# сообщения новее отметки — дочитываем страницами до неё
+_POLL_LIMIT = 5
+_POLL_CATCHUP_PAGE = 100
+
+# Как часто проверяем соединение клиента (сек)
+_CONNECTION_CHECK = 30.0
+
+
+class FloodGate:
+    """Общая пауза FloodWait для всех запросов одного клиента.
+
+    Telegram ограничивает аккаунт целиком, поэтому FloodWait, полученный
+    одной корутиной (например, историей одного чата), приостанавливает
+    запросы всех задач и чатов на этом клиенте, а не только её саму.
+    """
+
+    def __init__(self):
+        self._until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        until = time.monotonic() + seconds
+        if until > self._until:
+            self._until = until
+            logger.warning(f"FloodWait: запросы клиента приостановлены на {seconds}с")
+
+    async def wait(self) -> None:
+        delay = self._until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ClientRegistry:
+    """Реестр Pyrogram-клиентов по пути сессии.
+
+    Одна сессия = один подключённый клиент на весь процесс: несколько задач
+    (например, worker и employer одного пользователя) делят его вместо
+    отдельных MTProto-соединений и борьбы за SQLite-файл сессии.
+
+    Клиент запускается при первом acquire() и останавливается, когда его
+    отпускает последняя задача. Real-time сообщения клиента принимает один
+    MessageDispatcher, задачи подписываются на него своими чатами.
+    Прочие handlers регистрируются каждый в своей группе диспетчера Pyrogram:
+    внутри группы вызывается только первый подходящий handler.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+
+    def _entry(self, session_name: str) -> dict:
+        entry = self._entries.get(session_name)
+        if entry is None:
+            entry = {
+                'client': None,
+                'refs': 0,
+                'handlers': {},      # handler → group
+                'next_group': 0,
+                'dispatcher': None,
+                'flood_gate': FloodGate(),
+                'reconnects': 0,
+                'lock': asyncio.Lock(),
+            }
+            self._entries[session_name] = entry
+        return entry
+
+    async def _start_client(self, session_name: str, api_id: int, api_hash: str) -> Client:
+        """Запустить клиент Pyrogram.
+
+        Если SQLite-файл сессии заблокирован (например, предыдущим процессом),
+        повторяем попытку с экспоненциальным backoff (до 5 попыток, итого ~60 сек).
+        """
+        # ВАЖНО: НЕ указываем workdir, так как session_name содержит ПОЛНЫЙ путь
+        # (например: /shared/sessions/338908929_parser)
+        # Pyrogram сам добавит .session расширение
+        max_attempts = 5
+        for attempt in range(1, max_attempts + 1):
+            client = Client(
+                name=session_name,
+                api_id=api_id,
+                api_hash=api_hash,
+                # workdir НЕ УКАЗЫВАЕМ - используется полный путь из name
+            )
+            try:
+                await client.start()
+                logger.info(f"Pyrogram клиент запущен (сессия: {session_name})")
+                return client
+            except sqlite3.OperationalError as e:
+                if "database is locked" not in str(e) or attempt == max_attempts:
+                    raise
+                wait = 2 ** attempt  # 2, 4, 8, 16, 32 сек
+                logger.warning(
+                    f"Сессия {session_name!r} заблокирована, "
+                    f"повтор через {wait}с (попытка {attempt}/{max_attempts})"
+                )
+                await asyncio.sleep(wait)
+
+    async def acquire(self, session_name: str, api_id: int, api_hash: str) -> Client:
+        """Получить (и при необходимости запустить) общий клиент сессии."""
+        while True:
+            entry = self._entry(session_name)
+            async with entry['lock']:
+                if self._entries.get(session_name) is not entry:
+                    # Пока ждали lock, release() остановил клиент и убрал запись
+                    continue
+                if entry['client'] is None:
+                    entry['client'] = await self._start_client(session_name, api_id, api_hash)
+                    entry['dispatcher'] = MessageDispatcher()
+                    self.add_handler(session_name, entry['dispatcher'].handler)
+                entry['refs'] += 1
+                if entry['refs'] > 1:
+                    logger.info(
+                        f"Pyrogram клиент сессии {session_name!r} переиспользован "
+                        f"(задач на клиенте: {entry['refs']})"
+                    )
+                return entry['client']
+
+    async def release(self, session_name: str):
+        """Отпустить клиент; останавливается, когда не осталось задач."""
+        entry = self._entries.get(session_name)
+        if entry is None:
+            return
+        async with entry['lock']:
+            entry['refs'] -= 1
+            if entry['refs'] > 0:
+                return
+            # Останавливаем под lock: acquire(), ждущий эту запись, не получит
+            # останавливаемый клиент, а возьмёт новую запись
+            client, entry['client'] = entry['client'], None
+            if self._entries.get(session_name) is entry:
+                del self._entries[session_name]
+            if client:
+                try:
+                    await client.stop()
+                except ConnectionError:
+                    pass  # клиент уже отключён
+                logger.info(f"Pyrogram клиент остановлен (сессия: {session_name})")
+
+    def dispatcher(self, session_name: str) -> MessageDispatcher:
+        """Диспетчер real-time сообщений общего клиента сессии."""
+        return self._entries[session_name]['dispatcher']
+
+    def flood_gate(self, session_name: str) -> FloodGate:
+        """Общая пауза FloodWait клиента сессии."""
+        return self._entries[session_name]['flood_gate']
+
+    def reconnects(self, session_name: str) -> int:
+        """Сколько раз клиент сессии переподключался (задачи сверяют со своим счётчиком)."""
+        return self._entry(session_name)['reconnects']
+
+    def add_handler(self, session_name: str, handler) -> None:
+        """Зарегистрировать handler задачи в собственной группе диспетчера."""
+        entry = self._entries[session_name]
+        group = entry['next_group']
+        entry['next_group'] += 1
+        entry['handlers'][handler] = group
+        entry['client'].add_handler(handler, group)
+
+    def remove_handler(self, session_name: str, handler) -> None:
+        """Снять handler задачи (клиент продолжает работать для остальных)."""
+        entry = self._entries.get(session_name)
+        if entry is None or handler not in entry['handlers']:
+            return
+        group = entry['handlers'].pop(handler)
+        if entry['client'] and entry['client'].is_connected:
+            entry['client'].remove_handler(handler, group)
+
+    async def reconnect(self, session_name: str):
+        """Переподключить общий клиент (один раз, даже если потерю заметили несколько задач).
+
+        client.stop() очищает группы диспетчера, поэтому handlers всех задач
+        регистрируются заново в тех же группах.
+        """
+        entry = self._entries[session_name]
+        async with entry['lock']:
+            client = entry['client']
+            if client.is_connected:
+                return  # уже переподключён другой задачей
+            try:
+                await client.stop()
+            except ConnectionError:
+                pass
+            await asyncio.sleep(2)  # Небольшая пауза
+            await client.start()
+            for handler, group in entry['handlers'].items():
+                client.add_handler(handler, group)
+            entry['reconnects'] += 1
+            logger.info(f"✅ Переподключение сессии {session_name!r} успешно!")
+
+
+# Глобальный реестр клиентов (одна сессия = один клиент)
+client_registry = ClientRegistry()
+
 
 class TelegramParser:
     """Класс для парсинга Telegram чатов"""
@@ -26,43 +229,52 @@ class TelegramParser:
         self.session_name = session_name
         self.client: Client = None
         self.message_handler: Callable = None
+        # Пауза FloodWait общего клиента (заменяется общей в start)
+        self.flood_gate = FloodGate()
+        # Подписки этой задачи на диспетчере общего клиента (снимаются в stop)
+        self._subscriptions: list = []
+        # Переподключения общего клиента, уже обработанные этой задачей
+        self._reconnects = 0
+        # Расписание polling fallback по чатам задачи
+        self.poll_scheduler = PollScheduler(
+            min_interval=config.POLL_MIN_INTERVAL,
+            max_interval=config.POLL_MAX_INTERVAL,
+            min_limit=_POLL_LIMIT,
+            max_limit=_POLL_CATCHUP_PAGE,
+        )
 
     async def start(self):
-        """Запустить клиент Pyrogram.
-
-        Если SQLite-файл сессии заблокирован предыдущей задачей, повторяем
-        попытку с экспоненциальным backoff (до 5 попыток, итого ~60 сек).
+        """Подключиться к общему клиенту сессии (запускается при первой задаче)."""
+        self.client = await client_registry.acquire(
+            self.session_name, self.api_id, self.api_hash
+        )
+        self.flood_gate = client_registry.flood_gate(self.session_name)
+        self._reconnects = client_registry.reconnects(self.session_name)
+
+    async def _call(self, method: Callable, *args, **kwargs):
+        """Вызвать метод клиента с учётом общей паузы FloodWait.
+
+        FloodWait дольше sleep_threshold Pyrogram приходит исключением:
+        ставим паузу на весь клиент и повторяем запрос после неё.
         """
-        # ВАЖНО: НЕ указываем workdir, так как session_name содержит ПОЛНЫЙ путь
-        # (например: /shared/sessions/338908929_parser)
-        # Pyrogram сам добавит .session расширение
-        max_attempts = 5
-        for attempt in range(1, max_attempts + 1):
-            self.client = Client(
-                name=self.session_name,
-                api_id=self.api_id,
-                api_hash=self.api_hash,
-                # workdir НЕ УКАЗЫВАЕМ - используется полный путь из name
-            )
+        for attempt in range(1, _FLOOD_RETRIES + 1):
+            await self.flood_gate.wait()
             try:
-                await self.client.start()
-                logger.info(f"Pyrogram клиент запущен (сессия: {self.session_name})")
-                return
-            except sqlite3.OperationalError as e:
-                if "database is locked" not in str(e) or attempt == max_attempts:
+                return await method(*args, **kwargs)
+            except FloodWait as e:
+                if attempt == _FLOOD_RETRIES:
                     raise
-                wait = 2 ** attempt  # 2, 4, 8, 16, 32 сек
-                logger.warning(
-                    f"Сессия {self.session_name!r} заблокирована, "
-                    f"повтор через {wait}с (попытка {attempt}/{max_attempts})"
-                )
-                await asyncio.sleep(wait)
+                self.flood_gate.pause(e.value)
 
     async def stop(self):
-        """Остановить клиент"""
+        """Отписаться от диспетчера и отпустить общий клиент"""
         if self.client:
-            await self.client.stop()
-            logger.info("Pyrogram клиент остановлен")
+            dispatcher = client_registry.dispatcher(self.session_name)
+            for handler in self._subscriptions:
+                dispatcher.unsubscribe(handler)
+            self._subscriptions.clear()
+            await client_registry.release(self.session_name)
+            self.client = None
 
     async def get_forum_topics(self, chat_username: str) -> Dict[int, str]:
         """
@@ -80,7 +292,7 @@ class TelegramParser:
 
         try:
             # Получаем информацию о чате
-            chat = await self.client.get_chat(chat_username)
+            chat = await self._call(self.client.get_chat, chat_username)
             chat_id = chat.id
 
             logger.info(f"🔍 Получение топиков в {chat_username}")
@@ -101,7 +313,8 @@ class TelegramParser:
             logger.info(f"   ✅ Peer type: {type(peer).__name__}")
 
             # Вызываем raw API: GetForumTopics
-            result = await self.client.invoke(
+            result = await self._call(
+                self.client.invoke,
                 GetForumTopics(
                     channel=peer,
                     offset_date=0,
@@ -144,7 +357,11 @@ class TelegramParser:
         self,
         chat_username: str,
         days: int,
-        handler: Callable
+        handler: Callable,
+        cities: Tuple[str, ...] = (),
+        min_ids: Optional[Dict[int, int]] = None,
+        resume_days: int = 0,
+        stop_event: Optional[asyncio.Event] = None
     ) -> int:
         """
         Парсинг истории чата
@@ -152,10 +369,21 @@ class TelegramParser:
         Args:
             chat_username: имя чата (например, @pvz_workers)
             days: количество дней истории для парсинга
-            handler: функция обработчик для каждого сообщения
+            handler: функция обработчик для каждого сообщения; при включённом
+                parse_pool вызывается как handler(message, chat_name, parsed)
+            cities: города, для которых гео-решение считается в parse_pool
+            min_ids: сохранённые отметки {chat_id: последний обработанный msg_id};
+                если для чата есть отметка, история читается только до неё
+            resume_days: предел давности при продолжении с отметки (вместо days,
+                если больше)
+            stop_event: остановка задачи — чтение прерывается на следующем
+                сообщении, необработанная пачка parse_pool отбрасывается
 
         Returns:
             Количество обработанных сообщений
+
+        Raises:
+            Ошибки Telegram (после логирования) — история чата не дочитана
         """
         if not self.client:
             logger.error("Клиент не запущен")
@@ -163,35 +391,83 @@ class TelegramParser:
 
         try:
             # Получаем информацию о чате
-            chat = await self.client.get_chat(chat_username)
+            chat = await self._call(self.client.get_chat, chat_username)
             chat_id = chat.id
-            logger.info(f"Начинаем парсинг истории чата {chat_username} за {days} дней")
+            min_id = (min_ids or {}).get(chat_id, 0)
+            if min_id:
+                days = max(days, resume_days)
+                logger.info(
+                    f"Продолжаем историю чата {chat_username} с msg_id>{min_id} "
+                    f"(не старше {days} дней)"
+                )
+            else:
+                logger.info(f"Начинаем парсинг истории чата {chat_username} за {days} дней")
 
             # Определяем временную границу
             time_limit = datetime.now() - timedelta(days=days)
 
             messages_count = 0
-
-            # Итерируемся по истории сообщений
-            async for message in self.client.get_chat_history(chat_id):
-                # Проверяем дату
-                if message.date < time_limit:
+            # Пачка для parse_pool: разбор вне event loop, обработка — по порядку
+            chunk = []
+
+            def stopped() -> bool:
+                return stop_event is not None and stop_event.is_set()
+
+            async def flush_chunk():
+                parsed_list = await parse_pool.parse_many(chunk, cities)
+                for chunk_message, parsed in zip(chunk, parsed_list):
+                    if stopped():
+                        break
+                    await handler(chunk_message, chat_username, parsed)
+                chunk.clear()
+
+            # Итерируемся по истории сообщений. FloodWait посреди истории:
+            # пауза на весь клиент, затем продолжаем с последнего полученного id
+            offset_id = 0
+            for attempt in range(1, _FLOOD_RETRIES + 1):
+                await self.flood_gate.wait()
+                try:
+                    async for message in self.client.get_chat_history(chat_id, offset_id=offset_id):
+                        offset_id = message.id
+
+                        # Дошли до сохранённой отметки или до границы по дате
+                        if message.id <= min_id or message.date < time_limit or stopped():
+                            break
+
+                        # Пропускаем сервисные сообщения
+                        if not message.text:
+                            continue
+
+                        messages_count += 1
+                        if not parse_pool.enabled:
+                            # Вызываем обработчик
+                            await handler(message, chat_username)
+                            continue
+
+                        chunk.append(message)
+                        if len(chunk) >= parse_pool.chunk_size:
+                            await flush_chunk()
                     break
-
-                # Пропускаем сервисные сообщения
-                if not message.text:
-                    continue
-
-                # Вызываем обработчик
-                await handler(message, chat_username)
-                messages_count += 1
-
+                except FloodWait as e:
+                    if attempt == _FLOOD_RETRIES:
+                        raise
+                    logger.warning(
+                        f"FloodWait {e.value}с на истории {chat_username}, "
+                        f"продолжим с msg_id={offset_id}"
+                    )
+                    self.flood_gate.pause(e.value)
+
+            if chunk and not stopped():
+                await flush_chunk()
+
+            if stopped():
+                logger.info(f"История {chat_username} прервана остановкой задачи")
             logger.info(f"Обработано {messages_count} сообщений из истории {chat_username}")
             return messages_count
 
         except Exception as e:
             logger.error(f"Ошибка парсинга истории чата {chat_username}: {e}")
-            return 0
+            raise
 
     async def setup_realtime_handler(
         self,
@@ -199,17 +475,18 @@ class TelegramParser:
         handler: Callable
     ):
         """
-        Настроить обработчик для новых сообщений (real-time)
+        Подписаться на новые сообщения чатов (real-time) через общий диспетчер
 
         Args:
             chat_usernames: список имен чатов для мониторинга
-            handler: функция обработчик для новых сообщений
+            handler: корутина handler(message, chat_name, parsed) — получает
+                уже разобранное сообщение (message_dispatcher.ParsedMessage)
         """
         if not self.client:
             logger.error("Клиент не запущен")
             return
 
-        logger.info(f"[REALTIME] Регистрация handlers для чатов: {chat_usernames}")
+        logger.info(f"[REALTIME] Подписка на чаты: {chat_usernames}")
 
         # Резолвим числовые chat_id — надёжнее чем username строки
         chat_ids = []
@@ -217,6 +494,7 @@ class TelegramParser:
             try:
                 chat = await self.client.get_chat(username)
                 chat_ids.append(chat.id)
+                self.poll_scheduler.bind(username, chat.id)
                 logger.info(f"[REALTIME] Resolved {username} -> chat_id={chat.id}")
             except Exception as e:
                 logger.error(f"[REALTIME] Не удалось резолвить {username}: {e}")
@@ -225,34 +503,14 @@ class TelegramParser:
             logger.error("[REALTIME] Не удалось резолвить ни один чат!")
             return
 
-        # Создаем фильтр по числовым ID (надёжнее чем username строки)
-        chat_filter = filters.chat(chat_ids)
-
-        # Основной обработчик для отфильтрованных сообщений
-        async def message_handler(client, message: Message):
-            logger.info(f"✉️ [REALTIME] Получено новое сообщение в чате: {message.chat.username or message.chat.title}")
-
-            # Пропускаем сервисные сообщения
-            if not message.text:
-                logger.debug(f"[REALTIME] Пропускаем сообщение без текста (service message)")
-                return
-
-            # Определяем имя чата
-            chat_username = None
-            if message.chat.username:
-                chat_username = f"@{message.chat.username}"
-            else:
-                chat_username = message.chat.title or str(message.chat.id)
-
-            logger.info(f"[REALTIME] Обрабатываем новое сообщение из {chat_username}: {message.text[:50]}...")
+        async def realtime_handler(message, chat_name, parsed=None):
+            # Real-time доходит — polling этого чата может идти реже
+            self.poll_scheduler.note_realtime(message.chat.id)
+            await handler(message, chat_name, parsed)
 
-            # Вызываем обработчик
-            await handler(message, chat_username)
-
-        # Регистрируем handler через add_handler
-        from pyrogram.handlers import MessageHandler as PyrogramMessageHandler
-
-        self.client.add_handler(PyrogramMessageHandler(message_handler, filters=chat_filter))
+        # Один handler на клиент: извлечение выполняется один раз для всех подписчиков
+        client_registry.dispatcher(self.session_name).subscribe(chat_ids, realtime_handler)
+        self._subscriptions.append(realtime_handler)
         logger.info(f"✅ Настроен real-time мониторинг чатов: {', '.join(chat_usernames)}")
 
     async def poll_new_messages(
@@ -260,47 +518,162 @@ class TelegramParser:
         chat_usernames: List[str],
         last_seen_msg_id: Dict[int, int],
         handler: Callable
-    ):
+    ) -> int:
         """
         Polling fallback — проверяем новые сообщения через get_chat_history.
-        Вызывается каждые 30 сек для компенсации ненадёжности MTProto updates.
+        Чаты опрашиваются параллельно (не больше POLL_CONCURRENCY одновременно);
+        результат каждого опроса перестраивает расписание poll_scheduler.
 
         Args:
             chat_usernames: список чатов для проверки (строки для get_chat_history)
             last_seen_msg_id: словарь {числовой chat_id: last_message_id}
             handler: функция обработчик сообщений
+
+        Returns:
+            Сколько сообщений найдено polling'ом, но не получено через real-time
         """
-        for chat_username in chat_usernames:
-            try:
-                # Собираем новые сообщения со снимком last_id ДО обработки,
-                # чтобы handler не мутировал last_seen_msg_id в процессе итерации
-                new_messages = []
-                snapshot_last_id = 0
+        return await self._poll_chats(chat_usernames, last_seen_msg_id, handler)
 
-                async for msg in self.client.get_chat_history(chat_username, limit=5):
-                    if not msg.text:
-                        continue
+    async def catch_up_after_reconnect(
+        self,
+        chat_usernames: List[str],
+        last_seen_msg_id: Dict[int, int],
+        handler: Callable,
+        down_since: datetime,
+        down_seconds: float
+    ) -> int:
+        """
+        Дочитать сообщения, пришедшие, пока клиент был отключён.
+
+        Окно разрыва по каждому чату: от last_seen_msg_id (отметка, сохранённая
+        process_message) до текущего сообщения; для чатов без отметки — от
+        down_since. Выборка ограничена RECONNECT_GAP_MAX_MESSAGES на чат.
+
+        Args:
+            down_since: время последней проверки, когда клиент был подключён
+            down_seconds: длительность разрыва (оценка сверху)
+
+        Returns:
+            Сколько сообщений восстановлено
+        """
+        logger.info(
+            f"[GAP] Догоняем {len(chat_usernames)} чатов после разрыва "
+            f"~{down_seconds:.0f} сек (с {down_since:%H:%M:%S})"
+        )
+        recovered = await self._poll_chats(
+            chat_usernames, last_seen_msg_id, handler, since=down_since
+        )
+        self.poll_scheduler.note_reconnect(down_seconds, recovered)
+        logger.info(f"[GAP] Восстановлено сообщений после разрыва: {recovered}")
+        return recovered
+
+    async def _poll_chats(
+        self,
+        chat_usernames: List[str],
+        last_seen_msg_id: Dict[int, int],
+        handler: Callable,
+        since: Optional[datetime] = None
+    ) -> int:
+        semaphore = asyncio.Semaphore(max(1, config.POLL_CONCURRENCY))
+
+        async def poll(chat_username: str) -> int:
+            async with semaphore:
+                return await self._poll_chat(chat_username, last_seen_msg_id, handler, since)
+
+        results = await asyncio.gather(*(poll(chat) for chat in chat_usernames))
+        return sum(results)
+
+    async def _poll_chat(
+        self,
+        chat_username: str,
+        last_seen_msg_id: Dict[int, int],
+        handler: Callable,
+        since: Optional[datetime] = None
+    ) -> int:
+        """Опросить один чат: дочитать до отметки и обработать новые oldest-first.
+
+        since задаёт режим догона после разрыва: чат без отметки читается
+        до сообщений старше since, а не только последняя страница.
+        """
+        gap = since is not None
+        try:
+            # Собираем новые сообщения со снимком last_id ДО обработки,
+            # чтобы handler не мутировал last_seen_msg_id в процессе итерации
+            new_messages = []
+            snapshot_last_id = None
+            newest_id = 0
+            offset_id = 0
+            scanned = 0
+            limit = _POLL_CATCHUP_PAGE if gap else self.poll_scheduler.limit(chat_username)
+
+            while True:
+                page = 0
+                reached = False
+                async for msg in self.client.get_chat_history(
+                    chat_username, limit=limit, offset_id=offset_id
+                ):
+                    page += 1
+                    offset_id = msg.id
                     # Снимок берём один раз из первого сообщения (у всех один chat.id)
-                    if not snapshot_last_id and not new_messages:
+                    if snapshot_last_id is None:
                         snapshot_last_id = last_seen_msg_id.get(msg.chat.id, 0)
-                    if msg.id > snapshot_last_id:
-                        new_messages.append(msg)
-                    else:
+                        newest_id = msg.id
+                        self.poll_scheduler.bind(chat_username, msg.chat.id)
+                    if msg.id <= snapshot_last_id:
+                        reached = True
                         break  # Более старые тоже уже обработаны
+                    if gap and not snapshot_last_id and msg.date and msg.date < since:
+                        reached = True
+                        break  # Отметки нет — окно разрыва начинается с since
+                    if msg.text:
+                        new_messages.append(msg)
 
-                # Обрабатываем oldest-first для корректного порядка
-                for msg in reversed(new_messages):
-                    chat_name = chat_username
-                    if msg.chat.username:
-                        chat_name = f"@{msg.chat.username}"
-
+                scanned += page
+                # Без отметки (чат ещё не обрабатывался) — только последние сообщения;
+                # с отметкой (или после разрыва) — дочитываем страницами, ничего не пропуская
+                if reached or page < limit or not (snapshot_last_id or gap):
+                    break
+                if gap and scanned >= config.RECONNECT_GAP_MAX_MESSAGES:
+                    logger.warning(
+                        f"[GAP] {chat_username}: разрыв длиннее {scanned} сообщений, "
+                        f"более старые не догоняем"
+                    )
+                    break
+                limit = _POLL_CATCHUP_PAGE
+
+            # Обрабатываем oldest-first для корректного порядка
+            recovered = 0
+            for msg in reversed(new_messages):
+                chat_name = chat_username
+                if msg.chat.username:
+                    chat_name = f"@{msg.chat.username}"
+
+                # Новее отметки на момент обработки — real-time его не доставил
+                if (snapshot_last_id or gap) and msg.id > last_seen_msg_id.get(msg.chat.id, 0):
+                    recovered += 1
+                    logger.info(f"[POLLING] Пропущено real-time, найдено polling: {chat_username} msg_id={msg.id}")
+                else:
                     logger.debug(f"[POLLING] Новое сообщение в {chat_username}: msg_id={msg.id}")
-                    await handler(msg, chat_name)
+                await handler(msg, chat_name)
 
-            except Exception as e:
-                if "AUTH_KEY_UNREGISTERED" in str(e) or "AUTH_KEY_INVALID" in str(e):
-                    raise
-                logger.warning(f"[POLLING] Ошибка для {chat_username}: {e}")
+            if gap:
+                self.poll_scheduler.record_gap(chat_username, recovered)
+                logger.info(
+                    f"[GAP] {chat_username}: после msg_id={snapshot_last_id or '—'} "
+                    f"(с {since:%H:%M:%S}) восстановлено {recovered}"
+                )
+            else:
+                self.poll_scheduler.record_poll(chat_username, newest_id, len(new_messages), recovered)
+            return recovered
+
+        except Exception as e:
+            if "AUTH_KEY_UNREGISTERED" in str(e) or "AUTH_KEY_INVALID" in str(e):
+                raise
+            logger.warning(f"[POLLING] Ошибка для {chat_username}: {e}")
+            if not gap:
+                # Следующая попытка — по расписанию, а не на каждом такте
+                self.poll_scheduler.record_poll(chat_username, 0, 0, 0)
+            return 0
 
     async def run_until_stopped(
         self,
@@ -334,42 +707,62 @@ class TelegramParser:
             logger.info("✅ Pyrogram client подключён и готов получать updates")
             logger.info("🔄 Real-time мониторинг активен, ожидание сигнала остановки...")
 
-            # Цикл с проверкой соединения каждые 30 секунд
+            polling = bool(chat_usernames and last_seen_msg_id is not None and message_handler)
+            # Последняя проверка, когда клиент был подключён: начало окна разрыва
+            connected_at = datetime.now()
+            connected_mono = time.monotonic()
+
+            # Цикл: соединение проверяем раз в _CONNECTION_CHECK секунд,
+            # чаты опрашиваем по расписанию poll_scheduler
             while not stop_event.is_set():
+                timeout = _CONNECTION_CHECK
+                if polling:
+                    timeout = min(timeout, self.poll_scheduler.seconds_until_due(chat_usernames))
                 try:
-                    # Ждём 30 секунд или пока не придёт сигнал остановки
-                    await asyncio.wait_for(stop_event.wait(), timeout=30.0)
+                    # Ждём до ближайшего опроса или пока не придёт сигнал остановки
+                    await asyncio.wait_for(stop_event.wait(), timeout=max(timeout, 0.1))
                     # Если stop_event сработал - выходим
                     break
                 except asyncio.TimeoutError:
-                    # Таймаут - проверяем соединение
-                    if not self.client.is_connected:
-                        logger.warning("⚠️  Соединение потеряно! Попытка переподключения...")
-                        try:
-                            # Пробуем переподключиться
-                            await self.client.stop()
-                            await asyncio.sleep(2)  # Небольшая пауза
-                            await self.client.start()
-                            logger.info("✅ Переподключение успешно!")
-
-                            # Перезагружаем диалоги в кэш
-                            logger.info("Перезагрузка диалогов в кэш...")
-                            async for dialog in self.client.get_dialogs(limit=100):
-                                pass
-                            logger.info("Диалоги перезагружены")
-                        except Exception as reconnect_error:
-                            logger.error(f"❌ Ошибка переподключения: {reconnect_error}")
-                            # Ждём перед следующей попыткой
-                            await asyncio.sleep(10)
-                    else:
-                        # Соединение в порядке
-                        logger.debug("✓ Соединение активно")
-
-                        # Polling fallback — проверяем не пропустили ли сообщения
-                        if chat_usernames and last_seen_msg_id is not None and message_handler:
-                            await self.poll_new_messages(
-                                chat_usernames, last_seen_msg_id, message_handler
-                            )
+                    pass
+
+                # Таймаут - проверяем соединение
+                if not self.client.is_connected:
+                    logger.warning("⚠️  Соединение потеряно! Попытка переподключения...")
+                    try:
+                        # Переподключаем общий клиент сессии (handlers всех задач восстанавливаются)
+                        await client_registry.reconnect(self.session_name)
+
+                        # Перезагружаем диалоги в кэш
+                        logger.info("Перезагрузка диалогов в кэш...")
+                        async for dialog in self.client.get_dialogs(limit=100):
+                            pass
+                        logger.info("Диалоги перезагружены")
+                    except Exception as reconnect_error:
+                        logger.error(f"❌ Ошибка переподключения: {reconnect_error}")
+                        # Ждём перед следующей попыткой
+                        await asyncio.sleep(10)
+                        continue
+
+                # Клиент переподключён (этой или другой задачей сессии) —
+                # до возврата в live-режим дочитываем окно разрыва
+                reconnects = client_registry.reconnects(self.session_name)
+                if reconnects != self._reconnects:
+                    self._reconnects = reconnects
+                    if polling:
+                        await self.catch_up_after_reconnect(
+                            chat_usernames, last_seen_msg_id, message_handler,
+                            down_since=connected_at,
+                            down_seconds=time.monotonic() - connected_mono
+                        )
+                connected_at = datetime.now()
+                connected_mono = time.monotonic()
+
+                # Polling fallback — проверяем не пропустили ли сообщения
+                if polling:
+                    due = self.poll_scheduler.due(chat_usernames)
+                    if due:
+                        await self.poll_new_messages(due, last_seen_msg_id, message_handler)
 
             logger.info("Получен сигнал остановки парсера")
 
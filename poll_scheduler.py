@@ -0,0 +1,201 @@
+"""
+Адаптивное расписание polling fallback по чатам
+
+Раньше run_until_stopped раз в 30 сек читал по 5 последних сообщений каждого
+чата: в активном чате за 30 сек появляется больше 5 сообщений, а тихие чаты
+опрашивались впустую. Теперь у каждого чата свои интервал и размер страницы:
+
+  - скорость чата (сообщений/сек) — EWMA по приросту message_id между опросами
+  - polling нашёл сообщения, которых не было в real-time, или чат пишет,
+    а real-time по нему молчит, — интервал сокращается
+  - real-time доходит или новых сообщений нет — интервал растёт до максимума
+  - страница рассчитана на ожидаемое число сообщений за интервал (с запасом);
+    если и её не хватило, parser дочитывает страницами до отметки
+
+После переподключения клиента parser догоняет окно разрыва по каждому чату;
+его итоги (длительность разрывов, восстановленные сообщения) учитываются здесь же.
+
+Метрики (stats) показывают, сколько сообщений polling поймал за real-time.
+"""
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Стартовый интервал — прежний фиксированный
+_INITIAL_INTERVAL = 30.0
+# Вес нового замера скорости в EWMA
+_RATE_ALPHA = 0.3
+# Во сколько раз меняется интервал за опрос
+_BACKOFF = 1.5
+_TIGHTEN = 0.5
+# Сколько сообщений чата без единого real-time update считаем обрывом updates
+_STALL_MESSAGES = 3
+# Запас страницы относительно ожидаемого числа сообщений за интервал
+_PAGE_HEADROOM = 1.5
+
+
+class ChatPollState:
+    """Состояние опроса одного чата."""
+
+    __slots__ = (
+        'interval', 'limit', 'next_due', 'rate', 'newest_id', 'last_poll',
+        'last_realtime', 'polls', 'messages', 'recovered', 'realtime', 'gap_recovered',
+    )
+
+    def __init__(self, interval: float, limit: int, now: float) -> None:
+        self.interval = interval
+        self.limit = limit
+        self.next_due = now + interval
+        self.rate = 0.0                  # сообщений/сек (EWMA)
+        self.newest_id = 0               # самый новый message_id на прошлом опросе
+        self.last_poll: Optional[float] = None
+        self.last_realtime: Optional[float] = None
+        self.polls = 0
+        self.messages = 0                # новых сообщений, найденных polling'ом
+        self.recovered = 0               # из них не дошли через real-time
+        self.realtime = 0                # сообщений, пришедших через real-time
+        self.gap_recovered = 0           # восстановлено после переподключений
+
+
+class PollScheduler:
+    """Интервалы и размеры страниц polling fallback по чатам.
+
+    Публичный API:
+        bind(chat, chat_id)                   — связать имя чата с числовым id
+        note_realtime(chat_id)                — сообщение пришло через real-time
+        due(chats) -> List[str]               — чаты, которые пора опросить
+        seconds_until_due(chats) -> float
+        limit(chat) -> int                    — размер первой страницы опроса
+        record_poll(chat, newest_id, found, recovered)
+        record_gap(chat, recovered)           — итог догона чата после разрыва
+        note_reconnect(seconds, recovered)    — итог переподключения по всем чатам
+        stats() -> dict
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 5.0,
+        max_interval: float = 120.0,
+        min_limit: int = 5,
+        max_limit: int = 100,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_interval = max(0.1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self._clock = clock
+        self._chats: Dict[str, ChatPollState] = {}
+        self._names: Dict[int, str] = {}
+        self._reconnects = {
+            'count': 0,
+            'last_disconnect_seconds': None,
+            'total_disconnect_seconds': 0.0,
+            'recovered': 0,
+        }
+
+    def _state(self, chat: str) -> ChatPollState:
+        state = self._chats.get(chat)
+        if state is None:
+            interval = min(max(_INITIAL_INTERVAL, self.min_interval), self.max_interval)
+            state = ChatPollState(interval, self.min_limit, self._clock())
+            self._chats[chat] = state
+        return state
+
+    def bind(self, chat: str, chat_id: int) -> None:
+        self._names[chat_id] = chat
+        self._state(chat)
+
+    def note_realtime(self, chat_id: int) -> None:
+        chat = self._names.get(chat_id)
+        if chat is not None:
+            state = self._state(chat)
+            state.last_realtime = self._clock()
+            state.realtime += 1
+
+    def due(self, chats: Iterable[str]) -> List[str]:
+        now = self._clock()
+        return [chat for chat in chats if self._state(chat).next_due <= now]
+
+    def seconds_until_due(self, chats: Iterable[str]) -> float:
+        now = self._clock()
+        return max(0.0, min(
+            (self._state(chat).next_due - now for chat in chats), default=self.max_interval
+        ))
+
+    def limit(self, chat: str) -> int:
+        return self._state(chat).limit
+
+    def record_poll(self, chat: str, newest_id: int, found: int, recovered: int) -> None:
+        """Учесть результат опроса и пересчитать интервал и страницу чата.
+
+        newest_id — самый новый message_id чата (0, если история пуста);
+        found — новых сообщений за отметкой; recovered — из них пропущенных real-time.
+        """
+        state = self._state(chat)
+        now = self._clock()
+
+        if state.last_poll is not None and state.newest_id and newest_id >= state.newest_id:
+            elapsed = now - state.last_poll
+            if elapsed > 0:
+                sample = (newest_id - state.newest_id) / elapsed
+                state.rate += _RATE_ALPHA * (sample - state.rate)
+        if newest_id:
+            state.newest_id = newest_id
+            state.last_poll = now
+        state.polls += 1
+        state.messages += found
+        state.recovered += recovered
+
+        # Чат пишет, а real-time молчит дольше нескольких сообщений — похоже на обрыв updates
+        stalled = state.rate > 0 and (
+            state.last_realtime is None
+            or now - state.last_realtime > max(state.interval, _STALL_MESSAGES / state.rate)
+        )
+        if recovered or stalled:
+            # Real-time теряет сообщения этого чата — опрашиваем чаще
+            interval = state.interval * _TIGHTEN
+        else:
+            # Пропусков нет (или чат молчит) — polling нужен реже
+            interval = state.interval * _BACKOFF
+        if state.rate > 0:
+            # Страница максимального размера должна покрывать интервал
+            interval = min(interval, self.max_limit / (state.rate * _PAGE_HEADROOM))
+        state.interval = min(max(interval, self.min_interval), self.max_interval)
+
+        expected = state.rate * state.interval * _PAGE_HEADROOM
+        state.limit = min(max(math.ceil(expected), self.min_limit), self.max_limit)
+        state.next_due = now + state.interval
+
+    def record_gap(self, chat: str, recovered: int) -> None:
+        self._state(chat).gap_recovered += recovered
+
+    def note_reconnect(self, seconds: float, recovered: int) -> None:
+        reconnects = self._reconnects
+        reconnects['count'] += 1
+        reconnects['last_disconnect_seconds'] = round(seconds, 1)
+        reconnects['total_disconnect_seconds'] = round(
+            reconnects['total_disconnect_seconds'] + seconds, 1
+        )
+        reconnects['recovered'] += recovered
+
+    def stats(self) -> dict:
+        """Метрики по чатам и итог: сколько сообщений polling поймал за real-time."""
+        chats = {
+            chat: {
+                'interval': round(state.interval, 1),
+                'limit': state.limit,
+                'rate_per_min': round(state.rate * 60, 2),
+                'polls': state.polls,
+                'messages': state.messages,
+                'recovered': state.recovered,
+                'realtime': state.realtime,
+                'gap_recovered': state.gap_recovered,
+            }
+            for chat, state in self._chats.items()
+        }
+        return {
+            'recovered': sum(s.recovered for s in self._chats.values()),
+            'reconnects': dict(self._reconnects),
+            'chats': chats,
+        }
@@ -31,11 +31,14 @@ class StateManager:
                 'status': 'pending',
                 'stop_event': stop_event,
                 'asyncio_task': None,
+                'poll_scheduler': None,
                 'stats': {
                     'total_messages_scanned': 0,
                     'items_found': 0,
                     'notifications_sent': 0,
-                    'last_update': datetime.utcnow().isoformat() + 'Z'
+                    'last_update': datetime.utcnow().isoformat() + 'Z',
+                    # Прогресс загрузки истории по чатам: chat → {status, messages, seconds}
+                    'chats': {}
                 }
             }
 
@@ -48,6 +51,12 @@ class StateManager:
             if task_id in self._tasks:
                 self._tasks[task_id]['asyncio_task'] = asyncio_task
 
+    def set_poll_scheduler(self, task_id: str, poll_scheduler):
+        """Сохранить расписание polling задачи (метрики отдаются в статусе)"""
+        with self._lock:
+            if task_id in self._tasks:
+                self._tasks[task_id]['poll_scheduler'] = poll_scheduler
+
     def get_task(self, task_id: str) -> Optional[Dict]:
         """Получить информацию о задаче"""
         with self._lock:
@@ -77,12 +86,40 @@ class StateManager:
                 stats['notifications_sent'] += notifications_sent
                 stats['last_update'] = datetime.utcnow().isoformat() + 'Z'
 
+    def update_chat_progress(
+        self,
+        task_id: str,
+        chat: str,
+        status: Optional[str] = None,
+        messages: int = 0,
+        seconds: Optional[float] = None
+    ):
+        """Обновить прогресс загрузки истории чата.
+
+        status: 'topics' → 'history' → 'done' | 'failed' | 'stopped'
+        """
+        with self._lock:
+            if task_id in self._tasks:
+                chats = self._tasks[task_id]['stats']['chats']
+                progress = chats.setdefault(
+                    chat, {'status': 'pending', 'messages': 0, 'seconds': None}
+                )
+                if status:
+                    progress['status'] = status
+                if seconds is not None:
+                    progress['seconds'] = round(seconds, 1)
+                progress['messages'] += messages
+
     def get_stats(self, task_id: str) -> Optional[Dict]:
         """Получить статистику задачи"""
         with self._lock:
             task = self._tasks.get(task_id)
             if task:
-                return task['stats'].copy()
+                stats = task['stats'].copy()
+                stats['chats'] = {chat: dict(p) for chat, p in stats['chats'].items()}
+                scheduler = task['poll_scheduler']
+                stats['polling'] = scheduler.stats() if scheduler else {}
+                return stats
             return None
 
     def stop_task(self, task_id: str):
@@ -2,20 +2,25 @@
 Фоновые задачи мониторинга
 """
 import asyncio
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 from typing import List, Dict, Set, Optional
 from loguru import logger
 
 from config import config
 from parser import TelegramParser
-from message_extractor import MessageExtractor
 from filters import ItemFilter
-from geo_filter import geo_filter
+from message_dispatcher import ParsedMessage
 from db_service import DBService
 from tg_notifier import TelegramNotifier
 from state_manager import state_manager
 from models_db import FoundItem
-from deduplicator import Deduplicator
+from deduplicator import Deduplicator, DedupWindow, RecentMessageIds
+
+# История: вставки коммитятся группой, уведомления уходят пачкой после коммита —
+# не реже раза в HISTORY_NOTIFY_INTERVAL секунд или при HISTORY_NOTIFY_BATCH объявлениях
+HISTORY_NOTIFY_INTERVAL = 1.0
+HISTORY_NOTIFY_BATCH = 50
 
 
 class MonitoringTask:
@@ -32,7 +37,8 @@ class MonitoringTask:
         api_hash: str,
         notification_chat_id: int,
         parse_history_days: int,
-        session_path: str = None
+        session_path: str = None,
+        db_service: Optional[DBService] = None
     ):
         self.task_id = task_id
         self.user_id = user_id
@@ -111,7 +117,10 @@ class MonitoringTask:
         self.city_filter = filters_dict.get('city_filter', 'ALL')
 
         # Сервисы
-        self.db = DBService(db_path=config.DB_PATH)
+        # Общий DBService из api.py (один пул соединений на процесс);
+        # собственный создаём только при запуске задачи вне API
+        self._owns_db = db_service is None
+        self.db = db_service or DBService(db_path=config.DB_PATH)
         self.parser = None
         # Используем общий BOT_TOKEN из конфига для всех уведомлений
         self.notifier = TelegramNotifier(config.BOT_TOKEN, notification_chat_id)
@@ -119,39 +128,51 @@ class MonitoringTask:
         # Кэш топиков: {chat_username: {topic_id: topic_name}}
         self.topics_cache = {}
 
-        # Дедупликация: трекинг обработанных сообщений по chat_id:msg_id
-        self.processed_messages: Set[str] = set()
+        # In-memory окно дедупликации (24ч): отсекает дубликаты без обращения к БД
+        self.dedup_window = DedupWindow(hours_window=24)
+
+        # Дедупликация: недавние обработанные message_id по чатам (кольцевое окно на чат)
+        self.processed_messages = RecentMessageIds(window=config.PROCESSED_WINDOW)
         # Последний обработанный message_id для каждого чата (ключ = числовой chat.id)
         self.last_seen_msg_id: Dict[int, int] = {}
+        # Отметки из БД на момент старта: с них продолжается история после рестарта
+        self.resume_msg_id: Dict[int, int] = {}
 
         # Событие остановки
         self.stop_event = state_manager.create_task(task_id, mode)
 
-    async def process_message(self, message, chat_name: str):
+    async def process_message(
+        self,
+        message,
+        chat_name: str,
+        parsed: Optional[ParsedMessage] = None,
+        persist_mark: bool = True,
+        deferred: Optional[list] = None
+    ):
         """
         Обработать сообщение из Telegram
 
         Args:
             message: объект сообщения Pyrogram
             chat_name: имя чата
+            parsed: результат разбора от MessageDispatcher (общий для всех задач);
+                None — сообщение разбирается здесь (история, polling)
+            persist_mark: сохранить отметку чата в БД после обработки; история
+                (newest-first) сохраняет её сама, когда чат дочитан целиком
+            deferred: список для отложенных уведомлений (история) — вставка без
+                ожидания коммита, уведомление отправит _notify_deferred() после flush
         """
+        advanced = False
         try:
             # Дедупликация по message_id + chat_id (защита от двойной обработки
             # одного сообщения real-time handler'ом И polling fallback'ом)
-            msg_key = f"{message.chat.id}:{message.id}"
-            if msg_key in self.processed_messages:
+            if not self.processed_messages.add(message.chat.id, message.id):
                 return  # Уже обработано
-            self.processed_messages.add(msg_key)
-
-            # Ограничиваем рост set (polling проверяет только 5 последних сообщений,
-            # поэтому старые msg_key безопасно удалять)
-            if len(self.processed_messages) > 10000:
-                self.processed_messages.clear()
 
             # Обновляем last_seen_msg_id для polling fallback (ключ = числовой chat.id)
-            self.last_seen_msg_id[message.chat.id] = max(
-                message.id, self.last_seen_msg_id.get(message.chat.id, 0)
-            )
+            if message.id > self.last_seen_msg_id.get(message.chat.id, 0):
+                self.last_seen_msg_id[message.chat.id] = message.id
+                advanced = True
 
             # Фильтр по топику: если чат указан как "@chat/topic_id" — пропускаем
             # сообщения из других топиков этого форума.
@@ -177,11 +198,13 @@ class MonitoringTask:
             # Обновляем счетчик обработанных сообщений
             state_manager.update_stats(self.task_id, messages_scanned=1)
 
-            # Извлекаем данные
-            message_text = (message.text or "").replace('\x00', '')
+            # Извлекаем данные (real-time: уже извлечены диспетчером один раз на все задачи)
+            if parsed is None:
+                parsed = ParsedMessage(message.text, message.date)
+            message_text = parsed.text
             message_date = message.date
 
-            extracted = MessageExtractor.extract(message_text, message_date)
+            extracted = parsed.extracted
 
             if not extracted:
                 logger.debug(f"[FILTER] Сообщение из {chat_name} НЕ распознано (нет даты/цены/типа)")
@@ -234,12 +257,9 @@ class MonitoringTask:
 
             if not skip_geo:
                 # Топик/чат без тега — текстовый гео-фильтр обязателен
-                if self.city_filter == 'МСК':
-                    if not geo_filter.should_take_for_moscow(message_text):
-                        return
-                elif self.city_filter == 'СПБ':
-                    if not geo_filter.should_take_for_spb(message_text):
-                        return
+                # (результат кэшируется в parsed — один расчёт на все задачи)
+                if self.city_filter != 'ALL' and not parsed.takes_city(self.city_filter):
+                    return
 
             # Применяем фильтры
             if not self.item_filter.matches(extracted):
@@ -315,29 +335,22 @@ class MonitoringTask:
                 message_text=message_text
             )
 
-            # Уровень 2: Author-based (защита от кросс-постов)
-            # Проверяем: автор + дата + цена (если автор меняет цену → новое уведомление!)
-            if author_username:
-                is_author_duplicate = await self.db.check_duplicate_by_author(
-                    author_username=author_username,
-                    work_date=extracted['date'],
-                    price=extracted['price'],
-                    task_id=self.task_id,
-                    hours_window=24
+            # Быстрая проверка обоих уровней по in-memory окну (без диска)
+            self.dedup_window.expire()
+            if self.dedup_window.is_author_duplicate(author_username, extracted['date'], extracted['price']):
+                logger.debug(
+                    f"Пропущен дубликат по автору (окно): {author_username}, "
+                    f"дата={extracted['date']}, цена={extracted['price']}"
                 )
-
-                if is_author_duplicate:
-                    logger.debug(
-                        f"Пропущен дубликат по автору: {author_username}, "
-                        f"дата={extracted['date']}, цена={extracted['price']}"
-                    )
-                    state_manager.update_stats(self.task_id, messages_scanned=1)
-                    return  # Пропускаем дубликат
-                else:
-                    logger.debug(
-                        f"Новое объявление от автора: {author_username}, "
-                        f"дата={extracted['date']}, цена={extracted['price']}"
-                    )
+                state_manager.update_stats(self.task_id, messages_scanned=1)
+                return
+            if self.dedup_window.is_content_duplicate(content_hash, extracted['date']):
+                logger.debug(
+                    f"Умная дедупликация (окно): объявление пропущено "
+                    f"(hash={content_hash[:8]}..., дата={extracted['date']})"
+                )
+                state_manager.update_stats(self.task_id, messages_scanned=1)
+                return
 
             # Создаем объект для БД
             found_item = FoundItem(
@@ -365,10 +378,27 @@ class MonitoringTask:
                 topic_name=topic_name  # Название топика (МСК - Ozon, СПБ - WB и т.д.)
             )
 
-            # Сохраняем в БД (с дедупликацией)
-            item_id = await self.db.add_found_item(found_item)
+            # Уровень 2: Author-based (защита от кросс-постов)
+            # Автор + дата + цена (если автор меняет цену → новое уведомление!).
+            # Оба уровня и INSERT — одна транзакция: одновременные кросс-посты
+            # из разных чатов не могут оба пройти проверки.
+            item_id, duplicate_reason = await self.db.add_found_item_deduplicated(
+                found_item, hours_window=24, urgent=deferred is None
+            )
+
+            if duplicate_reason == "author":
+                logger.debug(
+                    f"Пропущен дубликат по автору: {author_username}, "
+                    f"дата={extracted['date']}, цена={extracted['price']}"
+                )
+                state_manager.update_stats(self.task_id, messages_scanned=1)
+                return  # Пропускаем дубликат
 
             if item_id:
+                self.dedup_window.add(
+                    content_hash, extracted['date'], author_username, extracted['price']
+                )
+
                 # Обновляем статистику
                 state_manager.update_stats(self.task_id, items_found=1)
 
@@ -390,15 +420,156 @@ class MonitoringTask:
                     'message_text': message_text
                 }
 
-                sent = await self.notifier.send_notification(notification_data, item_id, self.mode)
-
-                if sent:
-                    await self.db.mark_as_notified(item_id)
-                    state_manager.update_stats(self.task_id, notifications_sent=1)
-                    logger.info(f"Найдено и отправлено новое объявление: {message_link}")
+                if deferred is not None:
+                    deferred.append((notification_data, item_id, message_link))
+                else:
+                    await self._send_notification(notification_data, item_id, message_link)
 
         except Exception as e:
             logger.error(f"Ошибка обработки сообщения: {e}")
+            # Сообщение не обработано — отметку не двигаем
+            advanced = False
+        finally:
+            # Отметка пишется после объявления (та же очередь write-behind)
+            if advanced and persist_mark:
+                await self._save_watermark(message, chat_name)
+
+    async def _send_notification(self, notification_data: dict, item_id: int, message_link: str):
+        sent = await self.notifier.send_notification(notification_data, item_id, self.mode)
+
+        if sent:
+            await self.db.mark_as_notified(item_id)
+            state_manager.update_stats(self.task_id, notifications_sent=1)
+            logger.info(f"Найдено и отправлено новое объявление: {message_link}")
+
+    async def _notify_deferred(self, deferred: list):
+        """Отправить отложенные уведомления истории — только о закоммиченных объявлениях."""
+        if not deferred:
+            return
+        batch = list(deferred)
+        deferred.clear()
+        try:
+            await self.db.flush()
+            committed = await self.db.get_existing_found_item_ids([item_id for _, item_id, _ in batch])
+        except Exception as e:
+            logger.error(f"Не удалось записать объявления истории задачи {self.task_id}: {e}")
+            return
+        for notification_data, item_id, message_link in batch:
+            if item_id not in committed:
+                logger.error(f"Объявление не записано в БД, уведомление пропущено: {message_link}")
+                continue
+            try:
+                await self._send_notification(notification_data, item_id, message_link)
+            except Exception as e:
+                logger.error(f"Ошибка отправки уведомления {message_link}: {e}")
+
+    async def _save_watermark(self, message, chat_name: str):
+        try:
+            await self.db.save_watermark(
+                self.task_id, message.chat.id, chat_name, message.id,
+                message.date.isoformat() if message.date else None
+            )
+        except Exception as e:
+            logger.error(f"Не удалось сохранить отметку {chat_name} для задачи {self.task_id}: {e}")
+
+    async def _load_watermarks(self):
+        """Загрузить отметки задачи: история и polling продолжатся с них."""
+        marks = await self.db.get_watermarks(self.task_id)
+        self.resume_msg_id = {chat_id: msg_id for chat_id, (msg_id, _) in marks.items()}
+        for chat_id, msg_id in self.resume_msg_id.items():
+            self.last_seen_msg_id[chat_id] = max(msg_id, self.last_seen_msg_id.get(chat_id, 0))
+        if marks:
+            logger.info(f"Задача {self.task_id}: загружены отметки для {len(marks)} чатов")
+
+    async def _backfill_chat(self, chat: str, semaphore: asyncio.Semaphore):
+        """Загрузить топики и историю одного чата (под общим лимитом параллельности)."""
+        async with semaphore:
+            if self.stop_event.is_set():
+                return
+            started = time.monotonic()
+            state_manager.update_chat_progress(self.task_id, chat, status='topics')
+            try:
+                # Загружаем топики чата (если это форум) до его истории
+                topics = await self.parser.get_forum_topics(chat)
+                if topics:
+                    self.topics_cache[chat] = topics
+                    logger.info(f"Загружено {len(topics)} топиков для {chat}")
+                else:
+                    logger.debug(f"Чат {chat} не является форумом или топики недоступны")
+
+                state_manager.update_chat_progress(self.task_id, chat, status='history')
+
+                # История идёт от новых к старым: отметку сохраняем одну —
+                # самое новое сообщение, и только когда чат дочитан без ошибок
+                newest = None
+                # Вставки истории не ждут коммита каждая: уведомления копятся
+                # и уходят после группового коммита
+                deferred: list = []
+                deferred_since = 0.0
+
+                async def handler(message, chat_name, parsed=None):
+                    nonlocal newest, deferred_since
+                    state_manager.update_chat_progress(self.task_id, chat, messages=1)
+                    if newest is None or message.id > newest.id:
+                        newest = message
+                    if not deferred:
+                        deferred_since = time.monotonic()
+                    await self.process_message(
+                        message, chat_name, parsed, persist_mark=False, deferred=deferred
+                    )
+                    if deferred and (
+                        len(deferred) >= HISTORY_NOTIFY_BATCH
+                        or time.monotonic() - deferred_since >= HISTORY_NOTIFY_INTERVAL
+                    ):
+                        await self._notify_deferred(deferred)
+
+                try:
+                    await self.parser.parse_history(
+                        chat_username=chat,
+                        days=self.parse_history_days,
+                        handler=handler,
+                        cities=self._history_geo_cities(chat),
+                        min_ids=self.resume_msg_id,
+                        resume_days=config.RESUME_MAX_DAYS,
+                        stop_event=self.stop_event
+                    )
+                finally:
+                    await self._notify_deferred(deferred)
+                if self.stop_event.is_set():
+                    # Чат не дочитан: без отметки следующий запуск прочитает его заново
+                    state_manager.update_chat_progress(
+                        self.task_id, chat, status='stopped', seconds=time.monotonic() - started
+                    )
+                    return
+                if newest is not None:
+                    await self._save_watermark(newest, chat)
+            except Exception as e:
+                if "AUTH_KEY_UNREGISTERED" in str(e) or "AUTH_KEY_INVALID" in str(e):
+                    raise
+                logger.error(f"Ошибка загрузки истории {chat} для задачи {self.task_id}: {e}")
+                state_manager.update_chat_progress(
+                    self.task_id, chat, status='failed', seconds=time.monotonic() - started
+                )
+                return
+            state_manager.update_chat_progress(
+                self.task_id, chat, status='done', seconds=time.monotonic() - started
+            )
+
+    def _history_geo_cities(self, chat: str) -> tuple:
+        """Города, для которых parse_pool заранее считает гео-решение по тексту."""
+        if self.city_filter == 'ALL' or chat in self.chat_city_override:
+            return ()
+        return (self.city_filter,)
+
+    async def _warm_dedup_window(self):
+        """Заполнить DedupWindow объявлениями задачи за последние 24 часа"""
+        rows = await self.db.get_recent_dedup_keys(self.task_id, hours_window=24)
+        for content_hash, work_date, author_username, price, found_at in rows:
+            ts = datetime.fromisoformat(found_at).replace(tzinfo=timezone.utc).timestamp()
+            self.dedup_window.add(content_hash, work_date, author_username, price, ts=ts)
+        self.dedup_window.expire()
+        if rows:
+            logger.info(f"Окно дедупликации прогрето: {len(self.dedup_window)} объявлений за 24ч")
 
     async def run_async(self):
         """
@@ -409,12 +580,19 @@ class MonitoringTask:
             # Инициализируем БД
             await self.db.init_db()
 
+            # Прогреваем окно дедупликации из found_items (задача могла быть восстановлена)
+            await self._warm_dedup_window()
+
+            # Отметки обработанных сообщений по чатам (задача могла быть восстановлена)
+            await self._load_watermarks()
+
             # Создаем парсер (сессия из запроса или из конфига)
             self.parser = TelegramParser(
                 api_id=self.api_id,
                 api_hash=self.api_hash,
                 session_name=self.session_path
             )
+            state_manager.set_poll_scheduler(self.task_id, self.parser.poll_scheduler)
 
             # Запускаем клиент
             await self.parser.start()
@@ -422,27 +600,16 @@ class MonitoringTask:
             # Обновляем статус
             state_manager.update_status(self.task_id, "running")
 
-            # Загружаем топики для каждого чата (если это форум)
-            logger.info(f"Загружаем список топиков для чатов...")
-            for chat in self.chats:
-                topics = await self.parser.get_forum_topics(chat)
-                if topics:
-                    self.topics_cache[chat] = topics
-                    logger.info(f"Загружено {len(topics)} топиков для {chat}")
-                else:
-                    logger.debug(f"Чат {chat} не является форумом или топики недоступны")
-
-            # Парсим историю
-            logger.info(f"Начинаем парсинг истории для задачи {self.task_id}")
+            # Топики и история — параллельно по чатам (не больше HISTORY_CONCURRENCY
+            # одновременно): выход в real-time определяет самый медленный чат
+            logger.info(
+                f"Начинаем загрузку топиков и парсинг истории для задачи {self.task_id} "
+                f"({len(self.chats)} чатов, параллельно до {config.HISTORY_CONCURRENCY})"
+            )
             for chat in self.chats:
-                if self.stop_event.is_set():
-                    break
-
-                await self.parser.parse_history(
-                    chat_username=chat,
-                    days=self.parse_history_days,
-                    handler=self.process_message
-                )
+                state_manager.update_chat_progress(self.task_id, chat)
+            semaphore = asyncio.Semaphore(max(1, config.HISTORY_CONCURRENCY))
+            await asyncio.gather(*(self._backfill_chat(chat, semaphore) for chat in self.chats))
 
             # Настраиваем real-time мониторинг
             if not self.stop_event.is_set():
@@ -484,6 +651,15 @@ class MonitoringTask:
             if self.parser:
                 await self.parser.stop()
 
+            # Дописываем отложенные записи задачи (notified) до выхода
+            try:
+                if self._owns_db:
+                    await self.db.close()
+                else:
+                    await self.db.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи очереди БД для задачи {self.task_id}: {e}")
+
             # Обновляем статус: "stopped" только если не было специфической ошибки
             current = state_manager.get_task(self.task_id)
             if current and current.get("status") not in ("auth_error", "failed"):
@@ -501,7 +677,8 @@ def start_monitoring_task(
     api_hash: str,
     notification_chat_id: int,
     parse_history_days: int,
-    session_path: str = None
+    session_path: str = None,
+    db_service: Optional[DBService] = None
 ):
     """
     Запустить задачу мониторинга как asyncio.Task на event loop FastAPI.
@@ -521,6 +698,7 @@ def start_monitoring_task(
         notification_chat_id: ID чата для уведомлений (общий бот из config.BOT_TOKEN)
         parse_history_days: количество дней истории
         session_path: путь к Pyrogram сессии (из запроса ParserHub)
+        db_service: общий DBService (пул соединений); None — задача создаст свой
     """
     task = MonitoringTask(
         task_id=task_id,
@@ -532,7 +710,8 @@ def start_monitoring_task(
         api_hash=api_hash,
         notification_chat_id=notification_chat_id,
         parse_history_days=parse_history_days,
-        session_path=session_path
+        session_path=session_path,
+        db_service=db_service
     )
 
     # Запускаем как asyncio Task на текущем event loop (FastAPI/uvicorn)
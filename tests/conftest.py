@@ -0,0 +1,64 @@
+"""Общие фикстуры тестов MonitoringTask.
+
+Токен бота подставляется в config на время теста (monkeypatch), а не через
+os.environ: config читает окружение один раз при импорте, и результат
+зависел бы от того, какой тестовый файл импортировал его первым.
+"""
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import config
+
+# Фильтры задачи без ограничений (сообщения в этих тестах не разбираются)
+FILTERS = {
+    'date_from': None, 'date_to': None, 'min_price': None, 'max_price': None,
+    'shk_filter': 'любое',
+}
+
+
+@pytest.fixture
+def bot_token(monkeypatch):
+    """Валидный по формату токен для TelegramNotifier (Bot() проверяет его при создании)."""
+    monkeypatch.setattr(config, 'BOT_TOKEN', '123456:test')
+    return config.BOT_TOKEN
+
+
+@pytest.fixture
+def make_task(bot_token):
+    """Фабрика MonitoringTask (режим worker); задачи убираются из state_manager после теста."""
+    from state_manager import state_manager
+    from tasks import MonitoringTask
+
+    created = []
+
+    def factory(task_id, chats=('@chat',), filters=None, db=None, parse_history_days=0):
+        task = MonitoringTask(
+            task_id=task_id, user_id=1, mode='worker', chats=list(chats),
+            filters_dict=filters or FILTERS, api_id=1, api_hash='x',
+            notification_chat_id=1, parse_history_days=parse_history_days, db_service=db,
+        )
+        created.append(task_id)
+        return task
+
+    yield factory
+    for task_id in created:
+        state_manager.remove_task(task_id)
+
+
+@pytest.fixture
+def make_message():
+    """Фабрика сообщений Pyrogram (SimpleNamespace) для process_message."""
+
+    def factory(message_id, chat, text='', date=None):
+        return SimpleNamespace(
+            id=message_id, chat=chat, text=text, date=date or datetime.now(),
+            from_user=None, reply_to_top_message_id=None, reply_to_message_id=None,
+        )
+
+    return factory
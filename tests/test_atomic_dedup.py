@@ -0,0 +1,109 @@
+"""Тесты атомарной дедупликации + вставки (DBService.add_found_item_deduplicated).
+
+Запуск:
+    pytest tests/test_atomic_dedup.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from db_service import DBService
+from deduplicator import Deduplicator
+from models_db import FoundItem
+
+
+def _item(link: str, author="ivan", price=3000, date="2026-02-05", text="Выйду 5 февраля, 3000") -> FoundItem:
+    return FoundItem(
+        id=None,
+        task_id="task-1",
+        mode="worker",
+        author_username=author,
+        author_full_name="Иван",
+        author_id=1,
+        date=date,
+        price=price,
+        shk=None,
+        location=None,
+        city=None,
+        metro_station=None,
+        district=None,
+        message_text=text,
+        message_link=link,
+        chat_name="@chat",
+        message_date=datetime.utcnow().isoformat(),
+        found_at=datetime.utcnow().isoformat(),
+        content_hash=Deduplicator.create_content_hash(author, price, None, text),
+    )
+
+
+def _run(tmp_path, scenario):
+    async def run():
+        db = DBService(str(tmp_path / "workers.db"))
+        await db.init_db()
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+    return asyncio.run(run())
+
+
+class TestAddFoundItemDeduplicated:
+
+    def test_new_item_inserted(self, tmp_path):
+        async def scenario(db):
+            return await db.add_found_item_deduplicated(_item("https://t.me/a/1"))
+
+        item_id, reason = _run(tmp_path, scenario)
+        assert item_id is not None
+        assert reason is None
+
+    def test_author_duplicate(self, tmp_path):
+        async def scenario(db):
+            await db.add_found_item_deduplicated(_item("https://t.me/a/1"))
+            return await db.add_found_item_deduplicated(
+                _item("https://t.me/b/1", text="другой текст, 3000")
+            )
+
+        assert _run(tmp_path, scenario) == (None, "author")
+
+    def test_content_duplicate_without_author(self, tmp_path):
+        async def scenario(db):
+            await db.add_found_item_deduplicated(_item("https://t.me/a/1", author=None))
+            return await db.add_found_item_deduplicated(_item("https://t.me/b/1", author=None))
+
+        assert _run(tmp_path, scenario) == (None, "content")
+
+    def test_message_link_duplicate(self, tmp_path):
+        async def scenario(db):
+            await db.add_found_item_deduplicated(_item("https://t.me/a/1"))
+            return await db.add_found_item_deduplicated(
+                _item("https://t.me/a/1", author="petr", price=2500, text="иное")
+            )
+
+        assert _run(tmp_path, scenario) == (None, "message_link")
+
+    def test_price_change_is_new_item(self, tmp_path):
+        async def scenario(db):
+            await db.add_found_item_deduplicated(_item("https://t.me/a/1"))
+            return await db.add_found_item_deduplicated(
+                _item("https://t.me/b/1", price=2500, text="Выйду 5 февраля, 2500")
+            )
+
+        item_id, reason = _run(tmp_path, scenario)
+        assert item_id is not None
+        assert reason is None
+
+    def test_concurrent_cross_posts_insert_once(self, tmp_path):
+        async def scenario(db):
+            results = await asyncio.gather(*(
+                db.add_found_item_deduplicated(_item(f"https://t.me/chat{i}/1"))
+                for i in range(10)
+            ))
+            return results, await db.count_items("task-1")
+
+        results, total = _run(tmp_path, scenario)
+        assert total == 1
+        assert sum(1 for item_id, _ in results if item_id) == 1
@@ -0,0 +1,45 @@
+"""Проверка, что набор бенчмарков (benchmarks/bench_pipeline.py) запускается и ловит регрессии.
+
+Запуск:
+    pytest tests/test_benchmarks.py -v
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import bench_pipeline as bench
+
+
+def test_stages_report_throughput_and_latency(bot_token):
+    corpus = bench.load_corpus()[:50]
+    for stage, (func, _) in bench.STAGES.items():
+        result = func(corpus, 1)
+        assert result['messages'] > 0, stage
+        assert result['msgs_per_sec'] > 0, stage
+        assert result['p50_us'] <= result['p99_us'], stage
+
+
+def test_check_regressions():
+    baseline = {'extract': {'msgs_per_sec': 1000.0}}
+    assert bench.check_regressions({'extract': {'msgs_per_sec': 800.0}}, baseline, 0.3) == []
+    regressions = bench.check_regressions({'extract': {'msgs_per_sec': 600.0}}, baseline, 0.3)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('extract:')
+    # Этап без эталона не проверяется
+    assert bench.check_regressions({'geo_spb': {'msgs_per_sec': 1.0}}, baseline, 0.3) == []
+
+
+def test_stage_gated_on_best_of_repeats(monkeypatch):
+    speeds = iter([500.0, 1200.0, 700.0])
+
+    def noisy(corpus, rounds):
+        return {'messages': 1, 'msgs_per_sec': next(speeds), 'p50_us': 1.0, 'p99_us': 1.0}
+
+    monkeypatch.setitem(bench.STAGES, 'process_message', (noisy, 1))
+    result = bench.run_stage('process_message', [], 1, repeat=3)
+    assert result['msgs_per_sec'] == 1200.0
+    # Один медленный замер (шум SQLite/диска) не даёт ложной регрессии
+    baseline = {'process_message': {'msgs_per_sec': 1000.0}}
+    assert bench.check_regressions({'process_message': result}, baseline, 0.3) == []
+
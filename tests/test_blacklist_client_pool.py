@@ -0,0 +1,201 @@
+"""Тесты пула тёплых клиентов ЧС (blacklist_service.BlacklistClientPool).
+
+Запуск:
+    pytest tests/test_blacklist_client_pool.py -v
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from pyrogram.errors import FloodWait
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import blacklist_service as blacklist_module
+from blacklist_service import BlacklistClientPool
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    """Pyrogram Client: считает запуски, остановки и проверки get_me()."""
+
+    instances = []
+
+    def __init__(self, name, api_id, api_hash):
+        self.name = name
+        self.is_connected = False
+        self.starts = self.stops = self.pings = 0
+        self.healthy = True
+        FakeClient.instances.append(self)
+
+    async def start(self):
+        self.starts += 1
+        # Клиенты той же сессии, ещё не отключившиеся к моменту запуска
+        self.overlapped = [c for c in FakeClient.instances
+                           if c is not self and c.name == self.name and c.is_connected]
+        self.is_connected = True
+
+    async def stop(self):
+        self.stops += 1
+        # Остановка Pyrogram не мгновенная: даём другим задачам вклиниться
+        await asyncio.sleep(0.01)
+        self.is_connected = False
+
+    async def get_me(self):
+        self.pings += 1
+        if not self.healthy:
+            raise ConnectionError("connection lost")
+        return object()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeClient.instances = []
+    monkeypatch.setattr(blacklist_module, 'Client', FakeClient)
+    clock = FakeClock()
+    return BlacklistClientPool(1, 'x', idle_timeout=600, health_interval=60, clock=clock), clock
+
+
+async def _use(pool, session_name, body=None):
+    async with pool.session(session_name) as client:
+        if body:
+            await body(client)
+        return client
+
+
+class TestBlacklistClientPool:
+
+    def test_client_is_reused(self, pool):
+        pool, clock = pool
+
+        async def run():
+            first = await _use(pool, 'bl')
+            clock.now += 30
+            second = await _use(pool, 'bl')
+            await pool.close()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first is second
+        assert (first.starts, first.pings, first.stops) == (1, 0, 1)
+
+    def test_requests_of_one_session_are_serialized(self, pool):
+        pool, _ = pool
+        active = {'bl': 0, 'other': 0}
+        peak = {'bl': 0, 'other': 0}
+
+        async def body(client):
+            active[client.name] += 1
+            peak[client.name] = max(peak[client.name], active[client.name])
+            await asyncio.sleep(0.01)
+            active[client.name] -= 1
+
+        async def run():
+            await asyncio.gather(*(_use(pool, name, body) for name in ('bl', 'bl', 'bl', 'other')))
+            await pool.close()
+
+        asyncio.run(run())
+        assert peak == {'bl': 1, 'other': 1}
+        # Параллельные запросы одной сессии не запускают второй клиент
+        assert len(FakeClient.instances) == 2
+
+    def test_health_check_after_pause(self, pool):
+        pool, clock = pool
+
+        async def run():
+            client = await _use(pool, 'bl')
+            clock.now += 120
+            assert await _use(pool, 'bl') is client
+            assert client.pings == 1
+            # Соединение пропало — клиент перезапускается
+            clock.now += 120
+            client.healthy = False
+            replaced = await _use(pool, 'bl')
+            await pool.close()
+            return client, replaced
+
+        client, replaced = asyncio.run(run())
+        assert replaced is not client
+        assert client.stops == 1
+
+    def test_disconnected_client_restarted(self, pool):
+        pool, _ = pool
+
+        async def run():
+            client = await _use(pool, 'bl')
+            client.is_connected = False
+            return client, await _use(pool, 'bl')
+
+        client, replaced = asyncio.run(run())
+        assert replaced is not client
+        assert pool.stats()['bl']['starts'] == 2
+
+    def test_failed_request_checks_client_next_time(self, pool):
+        pool, _ = pool
+
+        async def fail(exc):
+            async def body(client):
+                raise exc
+            with pytest.raises(type(exc)):
+                await _use(pool, 'bl', body)
+
+        async def run():
+            await fail(FloodWait(value=5))
+            client = await _use(pool, 'bl')
+            pings_after_rpc_error = client.pings
+            await fail(TimeoutError())
+            await _use(pool, 'bl')
+            return pings_after_rpc_error, client.pings
+
+        # Ошибка Telegram (RPCError) не повод проверять соединение, таймаут — повод
+        assert asyncio.run(run()) == (0, 1)
+
+    def test_idle_clients_stopped(self, pool):
+        pool, clock = pool
+
+        async def run():
+            idle = await _use(pool, 'idle')
+            clock.now += 500
+            fresh = await _use(pool, 'fresh')
+            clock.now += 200
+            stopped = await pool.reap_idle()
+            stats = pool.stats()
+            again = await _use(pool, 'idle')
+            await pool.close()
+            return idle, fresh, again, stopped, stats
+
+        idle, fresh, again, stopped, stats = asyncio.run(run())
+        assert stopped == 1
+        assert (idle.stops, fresh.stops) == (1, 1)
+        assert stats['idle']['connected'] is False
+        assert stats['fresh']['connected'] is True
+        assert again is not idle
+
+    def test_request_during_reap_waits_for_stop(self, pool):
+        pool, clock = pool
+
+        async def run():
+            old = await _use(pool, 'bl')
+            clock.now += 700
+            reaper = asyncio.ensure_future(pool.reap_idle())
+            await asyncio.sleep(0)
+            # Запрос пришёл, пока старый клиент останавливается
+            new = await _use(pool, 'bl')
+            stopped = await reaper
+            await pool.close()
+            return old, new, stopped
+
+        old, new, stopped = asyncio.run(run())
+        assert stopped == 1
+        assert new is not old and old.stops == 1
+        # Новый клиент запущен только после того, как старый отключился
+        assert new.overlapped == []
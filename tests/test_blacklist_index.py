@@ -0,0 +1,554 @@
+"""Тесты локального индекса черного списка (BlacklistService + таблицы blacklist_*).
+
+Запуск:
+    pytest tests/test_blacklist_index.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from pyrogram.errors import FloodWait
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import blacklist_service as blacklist_module
+from blacklist_service import BlacklistService
+from config import config
+from db_service import DBService
+
+NOW = datetime.now().replace(microsecond=0)
+
+POSTS = {
+    '@bl_main': [
+        (1, 400, "Сотрудник. ФИО: Старый Иван\nНик: @old_guy\nID: 111"),
+        (2, 10, "Работодатель, не платит.\nФИО: Петров Пётр Петрович\nНик: @petrov_p\nID: 222"),
+        (3, 5, "Сотрудник, не вышел на смену. Ник: @ivan_k ID: 333 ФИО: Козлов Иван"),
+        (4, 1, None),  # фото без подписи
+    ],
+    '@bl_other': [
+        (10, 3, "ID 444 — @petrov_p кинул на деньги"),
+    ],
+}
+
+
+def _message(chat, message_id, days_ago, text):
+    return SimpleNamespace(
+        id=message_id, chat=chat, text=text, caption=None,
+        date=NOW - timedelta(days=days_ago),
+    )
+
+
+class FakeBlacklistClient:
+    """Pyrogram Client по словарю POSTS; считает прочитанные сообщения."""
+
+    def __init__(self, posts, users=None):
+        self.posts = posts
+        self.users = users or {}
+        self.read = 0
+        self.started = 0
+        self.is_connected = False
+
+    async def start(self):
+        self.started += 1
+        self.is_connected = True
+
+    async def stop(self):
+        self.is_connected = False
+
+    async def get_chat(self, username):
+        return SimpleNamespace(id=username, username=username.lstrip('@'))
+
+    async def get_chat_history(self, chat_id, offset_id=0):
+        chat = SimpleNamespace(id=chat_id)
+        for message_id, days_ago, text in sorted(self.posts[chat_id], reverse=True):
+            if offset_id and message_id >= offset_id:
+                continue
+            self.read += 1
+            yield _message(chat, message_id, days_ago, text)
+
+    async def get_users(self, username):
+        if username not in self.users:
+            raise ValueError("USERNAME_NOT_OCCUPIED")
+        return SimpleNamespace(id=self.users[username])
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'BLACKLIST_INDEX', True)
+    monkeypatch.setattr(config, 'BLACKLIST_INDEX_DAYS', 365)
+    posts = {chat: list(items) for chat, items in POSTS.items()}
+    client = FakeBlacklistClient(posts, users={'ivan_k': 333, 'nobody': 999})
+    monkeypatch.setattr(blacklist_module, 'Client', lambda **kwargs: client)
+
+    db = DBService(str(tmp_path / "bl.db"))
+    bl = BlacklistService(api_id=1, api_hash='x', session_name='bl', db_service=db)
+    bl.client = client
+
+    async def setup():
+        await db.init_db()
+        await db.sync_blacklist_chats([{'chat_username': '@bl_main'}, {'chat_username': '@bl_other'}])
+
+    asyncio.run(setup())
+    yield bl
+
+    async def teardown():
+        await db.close()
+    asyncio.run(teardown())
+
+
+def _search(bl, **kwargs):
+    async def run():
+        try:
+            return await bl.search_in_blacklist(**kwargs)
+        finally:
+            await bl.db.flush()
+    return asyncio.run(run())
+
+
+class TestIndexTerms:
+
+    def test_terms(self):
+        terms = BlacklistService._index_terms("Ник: @Petrov_P ID: 222\nФИО: Пётр Петров")
+        assert terms == {('id', '222'), ('username', '@petrov_p')}
+
+    def test_fts_fields_normalized(self):
+        row = BlacklistService._index_row(1, "2026-01-01", "ФИО: Пётр ПЕТРОВ\nТел: +7 (999) 123-45-67\nID: 5551234567")
+        assert row[4].startswith("фио: петр петров")
+        # User ID из 10 цифр телефоном не считается
+        assert row[5] == "9991234567"
+
+    def test_queries(self):
+        assert BlacklistService._fio_query("Козл Ив.") == 'body : ("козл"* AND "ив"*)'
+        assert BlacklistService._fio_query("И. 1") is None
+        assert BlacklistService._phone_query("8 999 123-45-67") == 'phones : "9991234567"'
+        assert BlacklistService._phone_query("123-45") is None
+
+    def test_fio_words_normalized(self):
+        assert BlacklistService._fio_words("Пётр  ПЕТРОВ И.") == ['петр', 'петров']
+
+
+class TestIndexedSearch:
+
+    def test_username_match(self, service):
+        result = _search(service, username="petrov_p")
+        assert result["found"] is True
+        assert result["match_type"] == "username"
+        # Самое новое сообщение с этим ником
+        assert result["message_link"] == "https://t.me/bl_other/10"
+        assert result["chat"] == "@bl_other"
+
+    def test_user_id_resolved_from_username(self, service):
+        result = _search(service, username="@nobody", user_id=None, fio=None)
+        assert result["found"] is False
+        assert result["steps_done"] == ["по никнейму", "по User ID"]
+
+        service.client.users['ivan_new'] = 333
+        result = _search(service, username="ivan_new")
+        assert result["found"] is True
+        assert (result["match_type"], result["match_value"]) == ("user_id", 333)
+        assert result["message_id"] == 3
+        assert result["extracted_info"]["user_id"] == 333
+
+    def test_known_user_id_needs_no_username(self, service):
+        result = _search(service, user_id=444)
+        assert result["found"] is True
+        assert result["chat"] == "@bl_other"
+
+    def test_fio_all_words_any_order(self, service):
+        result = _search(service, fio="Иван Козлов")
+        assert result["found"] is True
+        assert result["match_type"] == "fio"
+        assert result["message_id"] == 3
+        assert _search(service, fio="Иван Петров")["found"] is False
+
+    def test_older_than_days_not_found(self, service):
+        assert _search(service, username="old_guy", days=365)["found"] is False
+        # В индекс сообщение старше BLACKLIST_INDEX_DAYS и не попадало
+        assert _search(service, username="old_guy", days=1000)["found"] is False
+
+    def test_inactive_chat_skipped(self, service):
+        _search(service, username="petrov_p")
+
+        async def deactivate():
+            await service.db.remove_blacklist_chat('@bl_other')
+        asyncio.run(deactivate())
+
+        result = _search(service, username="petrov_p")
+        assert result["chat"] == "@bl_main"
+
+
+class TestFullTextSearch:
+
+    def test_fio_prefix_and_yo(self, service):
+        service.client.posts['@bl_other'].append(
+            (11, 2, "Пётр Петровский, тел. 8-999-123-45-67, не вышел")
+        )
+        _search(service, username="petrov_p")
+
+        result = asyncio.run(service.search_index(fio="петр петров"))
+        assert result["count"] == 2
+        assert {r["message_id"] for r in result["results"]} == {2, 11}
+        assert all(r["match_type"] == "fio" for r in result["results"])
+
+        result = asyncio.run(service.search_index(fio="Козл Ив"))
+        assert [r["message_id"] for r in result["results"]] == [3]
+
+    def test_phone(self, service):
+        service.client.posts['@bl_main'].append((5, 1, "Тел: +7 (999) 123-45-67 — кидала"))
+        _search(service, username="petrov_p")
+
+        result = asyncio.run(service.search_index(phone="89991234567"))
+        assert [r["message_link"] for r in result["results"]] == ["https://t.me/bl_main/5"]
+        assert asyncio.run(service.search_index(phone="9991234500"))["found"] is False
+
+    def test_errors_and_inactive_chats(self, service):
+        _search(service, username="petrov_p")
+        assert "error" in asyncio.run(service.search_index())
+        assert "error" in asyncio.run(service.search_index(phone="12345"))
+
+        async def deactivate():
+            await service.db.remove_blacklist_chat('@bl_main')
+        asyncio.run(deactivate())
+        assert asyncio.run(service.search_index(fio="Козлов"))["found"] is False
+
+    def test_replaced_and_pruned_messages_leave_fts(self, service):
+        _search(service, username="petrov_p")
+
+        async def run():
+            db = service.db
+            row = BlacklistService._index_row(3, NOW.isoformat(), "Сидоров Семён")
+            await db.save_blacklist_messages('@bl_main', 0, [row], 4)
+            replaced = await db.search_blacklist_fts(BlacklistService._fio_query("Козлов"), "")
+            await db.prune_blacklist_index((NOW + timedelta(days=1)).isoformat())
+            pruned = await db.search_blacklist_fts(BlacklistService._fio_query("Сидоров"), "")
+            return replaced, pruned
+
+        assert asyncio.run(run()) == ([], [])
+
+
+class FakeForumClient(FakeBlacklistClient):
+    """Топик форума через raw GetReplies (newest-first, с учётом min_id)."""
+
+    def __init__(self, replies):
+        super().__init__({})
+        self.replies = replies
+        self.min_ids = []
+
+    async def resolve_peer(self, chat_id):
+        return chat_id
+
+    async def invoke(self, query):
+        self.min_ids.append(query.min_id)
+        messages = [
+            SimpleNamespace(id=i, date=int((NOW - timedelta(days=d)).timestamp()), message=text)
+            for i, d, text in sorted(self.replies, reverse=True)
+            if i > query.min_id and (not query.offset_id or i < query.offset_id)
+        ]
+        return SimpleNamespace(messages=messages[:query.limit])
+
+
+class TestTopicSync:
+
+    def test_topic_entry_synced_with_min_id(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, 'BLACKLIST_INDEX', True)
+        client = FakeForumClient([(50, 2, "Ник: @topic_guy ID: 777"), (40, 3, "просто текст")])
+        monkeypatch.setattr(blacklist_module, 'Client', lambda **kwargs: client)
+
+        async def run():
+            db = DBService(str(tmp_path / "forum.db"))
+            await db.init_db()
+            await db.sync_blacklist_chats([{'chat_username': '@forum', 'topic_id': 9}])
+            bl = BlacklistService(api_id=1, api_hash='x', session_name='bl', db_service=db)
+            first = await bl.search_in_blacklist(user_id=777)
+            client.replies.append((60, 0, "ID: 888"))
+            await bl.sync_index(client, await db.get_blacklist_chats(), force=True)
+            second = await bl.search_in_blacklist(user_id=888)
+            await db.close()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first["message_link"] == "https://t.me/forum/9/50"
+        assert second["message_link"] == "https://t.me/forum/9/60"
+        assert client.min_ids == [0, 50]
+
+
+class TestSync:
+
+    def test_repeated_checks_do_not_reread(self, service):
+        _search(service, username="petrov_p")
+        read = service.client.read
+        _search(service, username="ivan_k")
+        _search(service, fio="Козлов")
+        assert service.client.read == read
+        # Клиент ЧС запущен один раз и остаётся подключённым между проверками
+        assert service.client.started == 1
+
+    def test_new_chat_synced_within_interval(self, service):
+        _search(service, username="petrov_p")
+        service.client.posts['@bl_new'] = [(7, 1, "Ник: @newcomer ID: 666")]
+        service.client.read = 0
+
+        async def add_chat():
+            await service.db.sync_blacklist_chats([
+                {'chat_username': '@bl_main'}, {'chat_username': '@bl_other'},
+                {'chat_username': '@bl_new'},
+            ])
+
+        asyncio.run(add_chat())
+        result = _search(service, username="newcomer")
+        assert (result["chat"], result["message_id"]) == ("@bl_new", 7)
+        # Дочитан только новый чат: у остальных интервал синхронизации не истёк
+        assert service.client.read == 1
+
+    def test_incremental_by_message_id(self, service):
+        _search(service, username="petrov_p")
+        service.client.posts['@bl_main'].append((5, 0, "Новый: @fresh_one ID: 555"))
+        service.client.read = 0
+
+        async def sync():
+            chats = await service.db.get_blacklist_chats()
+            added = await service.sync_index(service.client, chats, force=True)
+            await service.db.flush()
+            return added
+
+        assert asyncio.run(sync()) == 1
+        # Прочитано только новое сообщение и по одному до отметки в каждом чате
+        assert service.client.read == 3
+        result = _search(service, username="fresh_one")
+        assert result["message_id"] == 5
+
+    def test_marks_include_messages_without_text(self, service):
+        _search(service, username="petrov_p")
+
+        async def marks():
+            return await service.db.get_blacklist_sync_marks()
+
+        assert asyncio.run(marks()) == {('@bl_main', 0): 4, ('@bl_other', 0): 10}
+
+
+class TestLiveScan:
+    """BLACKLIST_INDEX=false: один проход по истории сразу по всем критериям."""
+
+    @pytest.fixture
+    def live(self, service, monkeypatch):
+        monkeypatch.setattr(config, 'BLACKLIST_INDEX', False)
+        return service
+
+    def test_all_criteria_in_one_pass(self, live):
+        result = _search(live, username="nobody", fio="Козлов Иван")
+        assert result["match_type"] == "fio"
+        assert result["message_id"] == 3
+        # Каждое сообщение за 365 дней прочитано ровно один раз
+        assert live.client.read == 5
+        assert result["messages_checked"] == 4
+
+    def test_username_priority_over_earlier_matches(self, live):
+        live.client.users['petrov_p'] = 444
+        # ФИО встречается в более новом сообщении (3), но ник приоритетнее
+        result = _search(live, username="petrov_p", fio="Козлов")
+        assert (result["match_type"], result["chat"], result["message_id"]) == ("username", "@bl_main", 2)
+        assert result["messages_checked"] == 3
+
+        result = _search(live, username="ivan_k", fio="Петров")
+        assert (result["match_type"], result["message_id"]) == ("username", 3)
+        # Совпадение по самому приоритетному критерию останавливает проход
+        assert result["messages_checked"] == 2
+
+    def test_user_id_before_fio(self, live):
+        live.client.users['ghost'] = 444
+        # ФИО находится в @bl_main раньше, чем ID в @bl_other
+        result = _search(live, username="ghost", fio="Петров Петрович")
+        assert (result["match_type"], result["match_value"]) == ("user_id", 444)
+        assert result["chat"] == "@bl_other"
+
+    def test_not_found_reports_steps(self, live):
+        result = _search(live, username="nobody", fio="Сидоров")
+        assert result["found"] is False
+        assert result["steps_done"] == ["по никнейму", "по User ID", "по ФИО"]
+        assert result["chats_checked"] == ["@bl_main", "@bl_other"]
+        assert live.client.read == 5
+
+    def test_index_without_fts_is_resynced(self, service):
+        _search(service, username="petrov_p")
+
+        async def reopen():
+            db = service.db
+            async with db._pool.writer() as conn:
+                await conn.execute("DROP TABLE blacklist_fts")
+            await db.init_db()
+            return await db.get_blacklist_sync_marks(), await db.count_blacklist_messages()
+
+        assert asyncio.run(reopen()) == ({}, 0)
+
+
+class SlowHistoryClient(FakeBlacklistClient):
+    """История с задержкой на сообщение; считает одновременные проходы."""
+
+    def __init__(self, posts, delay=0.005, flood_once=None):
+        super().__init__(posts)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.offsets = []
+        self.flood_once = set(flood_once or ())
+
+    async def get_chat(self, username):
+        if username == '@broken':
+            raise ValueError("CHANNEL_PRIVATE")
+        return await super().get_chat(username)
+
+    async def get_chat_history(self, chat_id, offset_id=0):
+        self.offsets.append((chat_id, offset_id))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            async for message in super().get_chat_history(chat_id, offset_id=offset_id):
+                await asyncio.sleep(self.delay)
+                if chat_id in self.flood_once and message.id == 7:
+                    self.flood_once.discard(chat_id)
+                    raise FloodWait(value=0)
+                yield message
+        finally:
+            self.active -= 1
+
+
+def _quiet(count, start=1):
+    return [(i, 1, f"Объявление {i}") for i in range(start, start + count)]
+
+
+class TestConcurrentScan:
+
+    def _live(self, tmp_path, monkeypatch, posts, chats, **client_kwargs):
+        monkeypatch.setattr(config, 'BLACKLIST_INDEX', False)
+        monkeypatch.setattr(config, 'BLACKLIST_SCAN_CONCURRENCY', 2)
+        client = SlowHistoryClient(posts, **client_kwargs)
+        monkeypatch.setattr(blacklist_module, 'Client', lambda **kwargs: client)
+
+        async def run(**search):
+            db = DBService(str(tmp_path / "scan.db"))
+            await db.init_db()
+            await db.sync_blacklist_chats([{'chat_username': chat} for chat in chats])
+            bl = BlacklistService(api_id=1, api_hash='x', session_name='bl', db_service=db)
+            try:
+                return await bl.search_in_blacklist(**search)
+            finally:
+                await bl.clients.close()
+                await db.close()
+
+        return client, run
+
+    def test_chats_scanned_concurrently_under_limit(self, tmp_path, monkeypatch):
+        chats = ['@c1', '@c2', '@c3', '@c4']
+        client, run = self._live(tmp_path, monkeypatch, {chat: _quiet(10) for chat in chats}, chats)
+        result = asyncio.run(run(fio="Сидоров"))
+        assert result["found"] is False
+        assert client.max_active == 2
+        assert result["messages_checked"] == 40
+        assert [c["chat"] for c in result["chats"]] == chats
+        assert all(c["status"] == "done" and c["messages_checked"] == 10 for c in result["chats"])
+        assert all(c["seconds"] > 0 for c in result["chats"])
+        # Два потока: общее время меньше суммы времён по чатам
+        assert result["scan_seconds"] < sum(c["seconds"] for c in result["chats"])
+
+    def test_first_confirmed_match_cancels_rest(self, tmp_path, monkeypatch):
+        posts = {
+            '@slow': _quiet(200),
+            '@hit': _quiet(5) + [(6, 0, "Ник: @target")],
+        }
+        client, run = self._live(tmp_path, monkeypatch, posts, ['@slow', '@hit'])
+        result = asyncio.run(run(username="target"))
+        assert (result["chat"], result["match_type"], result["message_id"]) == ("@hit", "username", 6)
+        slow, hit = result["chats"]
+        assert hit["status"] == "found" and hit["messages_checked"] == 1
+        assert slow["status"] == "cancelled"
+        assert slow["messages_checked"] < 200
+
+    def test_lower_priority_match_does_not_cancel(self, tmp_path, monkeypatch):
+        posts = {
+            '@fio': [(3, 0, "Козлов Иван не вышел")],
+            '@nick': _quiet(30) + [(50, 1, "Ник: @ivan_k")],
+        }
+        client, run = self._live(tmp_path, monkeypatch, posts, ['@fio', '@nick'])
+        result = asyncio.run(run(username="ivan_k", fio="Козлов Иван"))
+        assert (result["match_type"], result["chat"]) == ("username", "@nick")
+        assert [c["status"] for c in result["chats"]] == ["done", "found"]
+
+    def test_flood_wait_resumes_from_last_id(self, tmp_path, monkeypatch):
+        client, run = self._live(
+            tmp_path, monkeypatch, {'@c1': _quiet(10)}, ['@c1'], flood_once={'@c1'}
+        )
+        result = asyncio.run(run(fio="Сидоров"))
+        # FloodWait на запросе id 7: продолжаем после последнего полученного (8)
+        assert client.offsets == [('@c1', 0), ('@c1', 8)]
+        assert result["chats"][0]["messages_checked"] == 10
+
+    def test_broken_chat_reported(self, tmp_path, monkeypatch):
+        client, run = self._live(tmp_path, monkeypatch, {'@c1': _quiet(3)}, ['@broken', '@c1'])
+        result = asyncio.run(run(fio="Сидоров"))
+        broken, ok = result["chats"]
+        assert broken["status"] == "error" and "CHANNEL_PRIVATE" in broken["error"]
+        assert ok["status"] == "done"
+        assert result["chats_checked"] == ["@c1"]
+
+
+class ForumScanClient(SlowHistoryClient):
+    """Форум: топик 9 чата @forum через GetReplies с задержкой на страницу."""
+
+    def __init__(self, posts, replies, page_delay=0.02):
+        super().__init__(posts)
+        self.forum = FakeForumClient(replies)
+        self.page_delay = page_delay
+        self.pages = 0
+
+    async def resolve_peer(self, chat_id):
+        return chat_id
+
+    async def invoke(self, query):
+        self.pages += 1
+        await asyncio.sleep(self.page_delay)
+        return await self.forum.invoke(query)
+
+
+class TestForumScan:
+
+    def _live(self, tmp_path, monkeypatch, client, chats):
+        monkeypatch.setattr(config, 'BLACKLIST_INDEX', False)
+        monkeypatch.setattr(config, 'BLACKLIST_SCAN_CONCURRENCY', 2)
+        monkeypatch.setattr(blacklist_module, 'Client', lambda **kwargs: client)
+
+        async def run(**search):
+            db = DBService(str(tmp_path / "forum_scan.db"))
+            await db.init_db()
+            await db.sync_blacklist_chats(chats)
+            bl = BlacklistService(api_id=1, api_hash='x', session_name='bl', db_service=db)
+            try:
+                return await bl.search_in_blacklist(**search)
+            finally:
+                await bl.clients.close()
+                await db.close()
+
+        return run
+
+    def test_topic_read_page_by_page(self, tmp_path, monkeypatch):
+        replies = [(1000, 0, "Ник: @target")] + [(i, 1, f"Объявление {i}") for i in range(1, 400)]
+        client = ForumScanClient({}, replies)
+        run = self._live(tmp_path, monkeypatch, client, [{'chat_username': '@forum', 'topic_id': 9}])
+        result = asyncio.run(run(username="target"))
+        assert result["message_id"] == 1000
+        # Совпадение на первой странице — остальные 3 страницы не запрашиваются
+        assert client.pages == 1
+
+    def test_match_elsewhere_cancels_topic_download(self, tmp_path, monkeypatch):
+        replies = [(i, 1, f"Объявление {i}") for i in range(1, 1001)]
+        client = ForumScanClient({'@hit': _quiet(3) + [(6, 0, "Ник: @target")]}, replies)
+        run = self._live(tmp_path, monkeypatch, client, [
+            {'chat_username': '@forum', 'topic_id': 9}, {'chat_username': '@hit'},
+        ])
+        result = asyncio.run(run(username="target"))
+        assert result["chat"] == "@hit"
+        forum = result["chats"][0]
+        assert forum["status"] == "cancelled"
+        assert client.pages < 10 and forum["messages_checked"] < 1000
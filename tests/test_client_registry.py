@@ -0,0 +1,149 @@
+"""Тесты общего Pyrogram клиента на сессию (parser.ClientRegistry).
+
+Запуск:
+    pytest tests/test_client_registry.py -v
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import parser as parser_module
+from parser import ClientRegistry
+
+# _patch() подменяет asyncio.sleep целиком; для переключения задач в тестах
+_yield = asyncio.sleep
+
+
+class FakeClient:
+    """Минимальная замена pyrogram.Client: старт/стоп и группы handlers."""
+
+    instances = []
+
+    def __init__(self, name, api_id, api_hash):
+        self.name = name
+        self.is_connected = False
+        self.starts = 0
+        self.groups = {}
+        FakeClient.instances.append(self)
+
+    async def start(self):
+        self.starts += 1
+        self.is_connected = True
+
+    async def stop(self):
+        self.is_connected = False
+        # Как Dispatcher.stop() в Pyrogram: группы очищаются
+        self.groups.clear()
+
+    def add_handler(self, handler, group=0):
+        self.groups.setdefault(group, []).append(handler)
+
+    def remove_handler(self, handler, group=0):
+        self.groups[group].remove(handler)
+
+
+def _patch(monkeypatch):
+    FakeClient.instances = []
+    monkeypatch.setattr(parser_module, "Client", FakeClient)
+    monkeypatch.setattr(parser_module.asyncio, "sleep", _no_sleep)
+
+
+async def _no_sleep(_):
+    return None
+
+
+class TestClientRegistry:
+
+    def test_one_client_per_session(self, monkeypatch):
+        _patch(monkeypatch)
+
+        async def run():
+            registry = ClientRegistry()
+            first, second = await asyncio.gather(
+                registry.acquire("/s/user1", 1, "h"),
+                registry.acquire("/s/user1", 1, "h"),
+            )
+            other = await registry.acquire("/s/user2", 1, "h")
+            return first, second, other
+
+        first, second, other = asyncio.run(run())
+        assert first is second
+        assert other is not first
+        assert len(FakeClient.instances) == 2
+
+    def test_client_stopped_after_last_release(self, monkeypatch):
+        _patch(monkeypatch)
+
+        async def run():
+            registry = ClientRegistry()
+            client = await registry.acquire("/s/user1", 1, "h")
+            await registry.acquire("/s/user1", 1, "h")
+            await registry.release("/s/user1")
+            still_connected = client.is_connected
+            await registry.release("/s/user1")
+            return still_connected, client.is_connected
+
+        assert asyncio.run(run()) == (True, False)
+
+    def test_handlers_get_separate_groups(self, monkeypatch):
+        _patch(monkeypatch)
+
+        async def run():
+            registry = ClientRegistry()
+            client = await registry.acquire("/s/user1", 1, "h")
+            registry.add_handler("/s/user1", "worker_handler")
+            registry.add_handler("/s/user1", "employer_handler")
+            groups = {g: list(h) for g, h in client.groups.items()}
+            registry.remove_handler("/s/user1", "worker_handler")
+            return registry.dispatcher("/s/user1"), groups, client.groups
+
+        dispatcher, groups, after_remove = asyncio.run(run())
+        # Группа 0 — общий диспетчер real-time сообщений
+        assert groups == {0: [dispatcher.handler], 1: ["worker_handler"], 2: ["employer_handler"]}
+        assert after_remove == {0: [dispatcher.handler], 1: [], 2: ["employer_handler"]}
+
+    def test_reconnect_restores_handlers_once(self, monkeypatch):
+        _patch(monkeypatch)
+
+        async def run():
+            registry = ClientRegistry()
+            client = await registry.acquire("/s/user1", 1, "h")
+            registry.add_handler("/s/user1", "worker_handler")
+            registry.add_handler("/s/user1", "employer_handler")
+            client.is_connected = False
+            # Обе задачи заметили обрыв одновременно
+            await asyncio.gather(
+                registry.reconnect("/s/user1"),
+                registry.reconnect("/s/user1"),
+            )
+            return registry.dispatcher("/s/user1"), client
+
+        dispatcher, client = asyncio.run(run())
+        assert client.starts == 2
+        assert client.groups == {0: [dispatcher.handler], 1: ["worker_handler"], 2: ["employer_handler"]}
+
+    def test_acquire_during_release_gets_live_client(self, monkeypatch):
+        _patch(monkeypatch)
+
+        async def run():
+            registry = ClientRegistry()
+            old = await registry.acquire("/s/user1", 1, "h")
+            entry = registry._entries["/s/user1"]
+            # Lock записи занят (например, переподключением): release() и acquire()
+            # встают в очередь на одну и ту же запись
+            await entry['lock'].acquire()
+            release = asyncio.create_task(registry.release("/s/user1"))
+            acquire = asyncio.create_task(registry.acquire("/s/user1", 1, "h"))
+            await _yield(0)
+            entry['lock'].release()
+            await release
+            new = await acquire
+            return registry, old, new
+
+        registry, old, new = asyncio.run(run())
+        assert new is not old
+        assert new.is_connected and not old.is_connected
+        assert registry._entries["/s/user1"]["client"] is new
+        assert registry._entries["/s/user1"]["refs"] == 1
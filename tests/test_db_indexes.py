@@ -0,0 +1,102 @@
+"""Регрессионный тест индексов found_items (EXPLAIN QUERY PLAN).
+
+Падает, если какой-либо горячий запрос из db_service перестал идти
+по индексу и откатился к полному сканированию таблицы.
+
+Запуск:
+    pytest tests/test_db_indexes.py -v
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db_service
+from db_service import DBService
+
+
+HOT_QUERIES = {
+    "content_duplicate": (db_service.CONTENT_DUPLICATE_SQL, ("hash", "task", "2026-01-01")),
+    "author_duplicate": (db_service.AUTHOR_DUPLICATE_SQL, ("ivan", "2026-02-05", 3000, 3000, "task", "2026-01-01")),
+    "author_duplicate_no_price": (db_service.AUTHOR_DUPLICATE_SQL, ("ivan", "2026-02-05", None, None, "task", "2026-01-01")),
+    "found_items_by_task": (db_service.FOUND_ITEMS_BY_TASK_SQL, ("task", 50)),
+    "count_items": (db_service.COUNT_ITEMS_SQL, ("task",)),
+    "count_notified_items": (db_service.COUNT_NOTIFIED_ITEMS_SQL, ("task",)),
+}
+
+# Схема found_items до миграций (UNIQUE(message_link), price NOT NULL)
+LEGACY_SCHEMA = """
+    CREATE TABLE found_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id TEXT NOT NULL,
+        mode TEXT NOT NULL,
+        author_username TEXT,
+        author_full_name TEXT,
+        date TEXT NOT NULL,
+        price INTEGER NOT NULL,
+        shk TEXT,
+        location TEXT,
+        message_text TEXT NOT NULL,
+        message_link TEXT NOT NULL,
+        chat_name TEXT NOT NULL,
+        message_date TEXT NOT NULL,
+        found_at TEXT NOT NULL,
+        notified BOOLEAN DEFAULT 0,
+        content_hash TEXT,
+        UNIQUE(message_link)
+    )
+"""
+
+
+def _init(path: str) -> None:
+    async def run():
+        db = DBService(path)
+        await db.init_db()
+        await db.close()
+    asyncio.run(run())
+
+
+def _plan(path: str, sql: str, params: tuple) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    finally:
+        conn.close()
+    return "\n".join(row[3] for row in rows)
+
+
+@pytest.fixture(params=["fresh", "legacy"])
+def db_path(request, tmp_path):
+    path = str(tmp_path / "workers.db")
+    if request.param == "legacy":
+        conn = sqlite3.connect(path)
+        conn.execute(LEGACY_SCHEMA)
+        conn.commit()
+        conn.close()
+    _init(path)
+    return path
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(db_path, name):
+    sql, params = HOT_QUERIES[name]
+    plan = _plan(db_path, sql, params)
+    assert "SCAN found_items" not in plan, f"{name}: полный скан\n{plan}"
+    assert "USING" in plan and "INDEX" in plan, f"{name}: индекс не используется\n{plan}"
+    assert "TEMP B-TREE" not in plan, f"{name}: сортировка во временном B-дереве\n{plan}"
+
+
+def test_dedup_queries_are_covering(db_path):
+    for name in ("content_duplicate", "author_duplicate"):
+        sql, params = HOT_QUERIES[name]
+        assert "COVERING INDEX" in _plan(db_path, sql, params), name
+
+
+def test_blacklist_term_lookup_uses_index(db_path):
+    plan = _plan(db_path, db_service.BLACKLIST_TERM_SQL, ("username", "@ivan", "2026-01-01"))
+    assert "SCAN" not in plan, f"полный скан индекса ЧС\n{plan}"
+    assert "SEARCH t USING PRIMARY KEY" in plan, plan
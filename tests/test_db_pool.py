@@ -0,0 +1,346 @@
+"""Тесты пула соединений SQLite (db_pool.SQLitePool + DBService).
+
+Запуск:
+    pytest tests/test_db_pool.py -v
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from db_pool import SQLitePool
+from db_service import DBService
+from models_db import Task
+
+
+def _task(task_id: str) -> Task:
+    return Task(
+        task_id=task_id,
+        user_id=1,
+        mode="worker",
+        chats="[]",
+        filters="{}",
+        notification_chat_id=1,
+        status="pending",
+        created_at=datetime.utcnow().isoformat(),
+    )
+
+
+class TestSQLitePool:
+
+    def test_wal_and_pragmas_applied(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                async with db.execute("PRAGMA journal_mode") as cur:
+                    mode = (await cur.fetchone())[0]
+                async with db.execute("PRAGMA busy_timeout") as cur:
+                    timeout = (await cur.fetchone())[0]
+            await pool.close()
+            return mode, timeout
+
+        mode, timeout = asyncio.run(run())
+        assert mode == "wal"
+        assert timeout == 5000
+
+    def test_connections_are_reused(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"), readers=1)
+            async with pool.reader() as first:
+                pass
+            async with pool.reader() as second:
+                pass
+            async with pool.writer() as w1:
+                pass
+            async with pool.writer() as w2:
+                pass
+            await pool.close()
+            return first is second, w1 is w2
+
+        same_reader, same_writer = asyncio.run(run())
+        assert same_reader
+        assert same_writer
+
+    def test_reader_is_read_only(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+            try:
+                async with pool.reader() as db:
+                    await db.execute("INSERT INTO t VALUES (1)")
+            finally:
+                await pool.close()
+
+        with pytest.raises(Exception):
+            asyncio.run(run())
+
+    def test_writer_rolls_back_on_error(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+            with pytest.raises(RuntimeError):
+                async with pool.writer() as db:
+                    await db.execute("INSERT INTO t VALUES (1)")
+                    raise RuntimeError("boom")
+            async with pool.reader() as db:
+                async with db.execute("SELECT COUNT(*) FROM t") as cur:
+                    count = (await cur.fetchone())[0]
+            await pool.close()
+            return count
+
+        assert asyncio.run(run()) == 0
+
+
+class TestDBServicePool:
+
+    def test_concurrent_reads_and_writes(self, tmp_path):
+        async def run():
+            db = DBService(str(tmp_path / "workers.db"), read_connections=3)
+            await db.init_db()
+            await asyncio.gather(*(db.create_task(_task(f"t{i}")) for i in range(20)))
+            tasks = await asyncio.gather(*(db.get_task(f"t{i}") for i in range(20)))
+            await db.close()
+            return tasks
+
+        tasks = asyncio.run(run())
+        assert all(t is not None for t in tasks)
+        assert {t.task_id for t in tasks} == {f"t{i}" for i in range(20)}
+
+    def test_reopens_on_new_event_loop(self, tmp_path):
+        db = DBService(str(tmp_path / "workers.db"))
+        asyncio.run(db.init_db())
+        asyncio.run(db.create_task(_task("t1")))
+        assert asyncio.run(db.get_task("t1")) is not None
+
+
+class TestWriteBehind:
+
+    def test_submit_returns_result_and_commits(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            async def insert(db):
+                cursor = await db.execute("INSERT INTO t VALUES (1)")
+                return cursor.lastrowid
+
+            row_id = await pool.submit(insert)
+            async with pool.reader() as db:
+                async with db.execute("SELECT COUNT(*) FROM t") as cur:
+                    count = (await cur.fetchone())[0]
+            await pool.close()
+            return row_id, count
+
+        assert asyncio.run(run()) == (1, 1)
+
+    def test_concurrent_submits_share_one_commit(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            async def insert(db):
+                await db.execute("INSERT INTO t VALUES (1)")
+
+            await asyncio.gather(*(pool.submit(insert) for _ in range(50)))
+            await pool.close()
+            return pool.commits
+
+        assert asyncio.run(run()) == 1
+
+    def test_sequential_urgent_submits_commit_each(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            async def insert(db):
+                await db.execute("INSERT INTO t VALUES (1)")
+
+            for _ in range(20):
+                await pool.submit(insert)
+            commits = pool.commits
+            await pool.close()
+            return commits
+
+        # Результат после коммита: каждая последовательная вставка — свой коммит
+        assert asyncio.run(run()) == 20
+
+    def test_sequential_non_urgent_submits_share_commits(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"), flush_interval=60, max_batch=100)
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            async def insert(db):
+                cursor = await db.execute("INSERT INTO t VALUES (1)")
+                return cursor.lastrowid
+
+            ids = [await pool.submit(insert, urgent=False) for _ in range(250)]
+            await pool.flush()
+            commits = pool.commits
+            async with pool.reader() as db:
+                async with db.execute("SELECT COUNT(*) FROM t") as cur:
+                    count = (await cur.fetchone())[0]
+            await pool.close()
+            return ids, commits, count
+
+        ids, commits, count = asyncio.run(run())
+        assert ids == list(range(1, 251))
+        assert count == 250
+        # 250 вставок: две полные пачки по max_batch + хвост на flush()
+        assert commits == 3
+
+    def test_non_urgent_rows_hidden_from_readers_until_commit(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"), flush_interval=60)
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            async def insert(db):
+                await db.execute("INSERT INTO t VALUES (1)")
+
+            async def count():
+                async with pool.reader() as db:
+                    async with db.execute("SELECT COUNT(*) FROM t") as cur:
+                        return (await cur.fetchone())[0]
+
+            await pool.submit(insert, urgent=False)
+            before = await count()
+            await pool.flush()
+            after = await count()
+            await pool.close()
+            return before, after
+
+        assert asyncio.run(run()) == (0, 1)
+
+    def test_dead_worker_fails_pending_submits(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            async def broken():
+                raise RuntimeError("writer died")
+
+            pool._commit_batch = broken
+
+            async def insert(db):
+                await db.execute("INSERT INTO t VALUES (1)")
+
+            results = await asyncio.wait_for(
+                asyncio.gather(pool.submit(insert), pool.submit(insert),
+                               return_exceptions=True),
+                timeout=5
+            )
+            return results
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_cancelled_worker_cancels_waiting_submits(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"), flush_interval=60)
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            started = asyncio.Event()
+
+            async def slow(db):
+                started.set()
+                await asyncio.sleep(60)
+
+            async def insert(db):
+                await db.execute("INSERT INTO t VALUES (1)")
+
+            first = asyncio.ensure_future(pool.submit(slow))
+            await started.wait()
+            second = asyncio.ensure_future(pool.submit(insert))
+            await asyncio.sleep(0)
+            pool._batch_worker.cancel()
+            results = await asyncio.wait_for(
+                asyncio.gather(first, second, return_exceptions=True), timeout=5
+            )
+            return results
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+    def test_failed_op_does_not_abort_batch(self, tmp_path):
+        async def run():
+            pool = SQLitePool(str(tmp_path / "pool.db"))
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+
+            async def insert(db):
+                await db.execute("INSERT INTO t VALUES (1)")
+
+            results = await asyncio.gather(
+                pool.submit(insert), pool.submit(insert), return_exceptions=True
+            )
+            async with pool.reader() as db:
+                async with db.execute("SELECT COUNT(*) FROM t") as cur:
+                    count = (await cur.fetchone())[0]
+            await pool.close()
+            return results, count
+
+        results, count = asyncio.run(run())
+        assert results[0] is None
+        assert isinstance(results[1], Exception)
+        assert count == 1
+
+    def test_nowait_flushed_on_flush_and_close(self, tmp_path):
+        path = str(tmp_path / "pool.db")
+
+        async def run():
+            pool = SQLitePool(path, flush_interval=60)
+            async with pool.writer() as db:
+                await db.execute("CREATE TABLE t (x INTEGER)")
+
+            async def insert(db):
+                await db.execute("INSERT INTO t VALUES (1)")
+
+            pool.submit_nowait(insert)
+            await pool.flush()
+            async with pool.reader() as db:
+                async with db.execute("SELECT COUNT(*) FROM t") as cur:
+                    after_flush = (await cur.fetchone())[0]
+
+            pool.submit_nowait(insert)
+            await pool.close()
+            return after_flush
+
+        assert asyncio.run(run()) == 1
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+        conn.close()
+
+    def test_mark_as_notified_is_write_behind(self, tmp_path):
+        async def run():
+            db = DBService(str(tmp_path / "workers.db"), flush_interval=60)
+            await db.init_db()
+            await db.create_task(_task("t1"))
+            async with db._pool.writer() as conn:
+                cursor = await conn.execute("""
+                    INSERT INTO found_items (task_id, mode, date, message_text, message_link,
+                                             chat_name, message_date, found_at)
+                    VALUES ('t1', 'worker', '2026-02-05', 'x', 'l', '@c', 'd', 'f')
+                """)
+                item_id = cursor.lastrowid
+            await db.mark_as_notified(item_id)
+            before = await db.count_notified_items("t1")
+            await db.flush()
+            after = await db.count_notified_items("t1")
+            await db.close()
+            return before, after
+
+        assert asyncio.run(run()) == (0, 1)
@@ -0,0 +1,101 @@
+"""Тесты in-memory окна дедупликации (deduplicator.DedupWindow).
+
+Запуск:
+    pytest tests/test_dedup_window.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import date, datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from deduplicator import Deduplicator, DedupWindow
+from state_manager import state_manager
+
+HOUR = 3600
+
+
+class TestDedupWindow:
+
+    def test_content_duplicate_same_date(self):
+        window = DedupWindow(hours_window=24)
+        window.add("h1", "2026-02-05", None, 3000, ts=1000)
+        assert window.is_content_duplicate("h1", "2026-02-05")
+        assert not window.is_content_duplicate("h1", "2026-02-06")
+        assert not window.is_content_duplicate("h2", "2026-02-05")
+
+    def test_compatible_with_deduplicator_is_duplicate(self):
+        window = DedupWindow()
+        window.add("h1", "2026-02-05", None, 3000, ts=1000)
+        assert Deduplicator.is_duplicate("h1", "2026-02-05", window.content_hashes)
+
+    def test_author_duplicate_respects_price_and_date(self):
+        window = DedupWindow()
+        window.add("h1", "2026-02-05", "ivan", 3000, ts=1000)
+        assert window.is_author_duplicate("ivan", "2026-02-05", 3000)
+        assert not window.is_author_duplicate("ivan", "2026-02-05", 2500)
+        assert not window.is_author_duplicate("ivan", "2026-02-07", 3000)
+        assert not window.is_author_duplicate(None, "2026-02-05", 3000)
+
+    def test_entries_expire_with_window(self):
+        window = DedupWindow(hours_window=24)
+        window.add("h1", "2026-02-05", "ivan", 3000, ts=0)
+        window.add("h2", "2026-02-05", "petr", 2000, ts=10 * HOUR)
+
+        window.expire(now=24 * HOUR + 1)
+        assert not window.is_content_duplicate("h1", "2026-02-05")
+        assert not window.is_author_duplicate("ivan", "2026-02-05", 3000)
+        assert window.is_content_duplicate("h2", "2026-02-05")
+        assert len(window) == 1
+
+        window.expire(now=40 * HOUR)
+        assert len(window) == 0
+        assert window.content_hashes == {}
+        assert window.author_keys == {}
+
+    def test_readded_key_survives_expiry_of_old_entry(self):
+        window = DedupWindow(hours_window=24)
+        window.add("h1", "2026-02-05", "ivan", 3000, ts=0)
+        window.add("h1", "2026-02-05", "ivan", 3000, ts=20 * HOUR)
+
+        window.expire(now=25 * HOUR)
+        assert window.is_content_duplicate("h1", "2026-02-05")
+        assert window.is_author_duplicate("ivan", "2026-02-05", 3000)
+
+
+class RejectingDB:
+    """БД, до которой дубликаты из окна доходить не должны."""
+
+    async def add_found_item_deduplicated(self, item, hours_window=24, urgent=True):
+        raise AssertionError("дубликат из окна дошёл до БД")
+
+
+class TestWindowInProcessMessage:
+
+    def test_window_duplicates_counted_like_db_duplicates(self, make_task, make_message):
+        filters = {'date_from': date(2026, 2, 1), 'date_to': date(2026, 2, 28),
+                   'min_price': 0, 'max_price': 100000, 'shk_filter': 'любое'}
+        task = make_task('window-stats', filters=filters, db=RejectingDB())
+        chat = SimpleNamespace(id=-1, username='chat', title='Chat')
+        text = "Выйду 5 февраля, 3000"
+        task.dedup_window.add(
+            Deduplicator.create_content_hash(None, 3000, None, text), '2026-02-05', 'ivan', 3000
+        )
+
+        async def process(message):
+            await task.process_message(message, '@chat', persist_mark=False)
+
+        def scanned():
+            return state_manager.get_stats('window-stats')['total_messages_scanned']
+
+        # Дубликат по содержимому (автор неизвестен)
+        asyncio.run(process(make_message(1, chat, text, datetime(2026, 2, 1))))
+        by_content = scanned()
+        # Дубликат по автору
+        author_dup = make_message(2, chat, "Могу 5 февраля, 3000 руб", datetime(2026, 2, 1))
+        author_dup.from_user = SimpleNamespace(id=7, username='ivan', first_name='Иван', last_name=None)
+        asyncio.run(process(author_dup))
+        assert by_content == 2
+        assert scanned() - by_content == 2
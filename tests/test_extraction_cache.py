@@ -0,0 +1,81 @@
+"""Тесты кэша результатов извлечения (message_extractor.ExtractionCache).
+
+Запуск:
+    pytest tests/test_extraction_cache.py -v
+"""
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import message_extractor
+from message_extractor import ExtractionCache, MessageExtractor
+
+CORPUS_PATH = Path(__file__).parent.parent / 'benchmarks' / 'corpus.jsonl'
+TEXT = "Выйду завтра, 3000"
+
+
+class TestExtractionCache:
+
+    def test_same_result_as_extract(self):
+        cache = ExtractionCache()
+        with open(CORPUS_PATH, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        for row in rows:
+            message_date = datetime.fromisoformat(row['date'])
+            assert cache.extract(row['text'], message_date) == row['expected']
+        # В корпусе есть кросс-посты — часть запросов попадает в кэш
+        assert cache.hits > 0
+        assert cache.hits + cache.misses == len(rows)
+
+    def test_normalized_text_hits(self):
+        cache = ExtractionCache()
+        message_date = datetime(2026, 2, 3, 9, 0)
+        first = cache.extract(TEXT, message_date)
+        second = cache.extract("  ВЫЙДУ ЗАВТРА, 3000\n", message_date.replace(hour=23))
+        assert first == second
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_date_bucket_is_part_of_key(self):
+        cache = ExtractionCache()
+        today = cache.extract(TEXT, datetime(2026, 2, 3, 9, 0))
+        tomorrow = cache.extract(TEXT, datetime(2026, 2, 4, 9, 0))
+        assert today['date'] == "2026-02-04"
+        assert tomorrow['date'] == "2026-02-05"
+        assert cache.misses == 2
+
+    def test_result_is_a_copy(self):
+        cache = ExtractionCache()
+        message_date = datetime(2026, 2, 3)
+        cache.extract(TEXT, message_date)['price'] = 1
+        assert cache.extract(TEXT, message_date)['price'] == 3000
+
+    def test_lru_bound(self):
+        cache = ExtractionCache(max_size=2)
+        message_date = datetime(2026, 2, 3)
+        for price in (1000, 2000, 3000):
+            cache.extract(f"выйду завтра, {price}", message_date)
+        assert len(cache) == 2
+        cache.extract("выйду завтра, 1000", message_date)
+        assert cache.misses == 4
+
+    def test_ttl_expiry(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(message_extractor.time, "monotonic", lambda: now[0])
+        cache = ExtractionCache(ttl_seconds=60)
+        message_date = datetime(2026, 2, 3)
+        cache.extract(TEXT, message_date)
+        now[0] += 61
+        cache.extract(TEXT, message_date)
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    def test_unparsed_text_is_cached(self):
+        cache = ExtractionCache()
+        message_date = datetime(2026, 2, 3)
+        assert cache.extract("Привет всем", message_date) is None
+        assert cache.extract("Привет всем", message_date) is None
+        assert cache.stats()['hits'] == 1
+        assert MessageExtractor.extract("Привет всем", message_date) is None
@@ -0,0 +1,73 @@
+"""Тесты кеша гео-фильтра (GeoCache).
+
+Запуск:
+    pytest tests/test_geo_cache.py -v
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import geo_filter as geo_module
+from geo_filter import MOSCOW, GeoCache, GeoFilter
+
+
+def _count_normalize(monkeypatch):
+    calls = []
+    original = geo_module._normalize
+
+    def counting(text):
+        calls.append(text)
+        return original(text)
+
+    monkeypatch.setattr(geo_module, '_normalize', counting)
+    return calls
+
+
+class TestGeoCache:
+
+    def test_repeated_text_skips_normalization(self, monkeypatch):
+        geo = GeoFilter()
+        calls = _count_normalize(monkeypatch)
+        text = "Выйду завтра, метро Тверская"
+
+        assert geo.should_take_for_spb(text) is False
+        assert geo.should_take_for_moscow(text) is True
+        assert geo.should_take_for_spb(text) is False
+
+        assert len(calls) == 1
+        stats = geo.cache_stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (2, 1, 1)
+        assert stats['hit_rate'] == round(2 / 3, 4)
+
+    def test_memory_bound_evicts_oldest(self):
+        cache = GeoCache(max_bytes=GeoCache._ENTRY_BYTES * 3)
+        assert cache.max_size == 3
+        keys = [cache.key(f"text {i}") for i in range(5)]
+        for key in keys:
+            cache.put(key, (MOSCOW, 'metro'))
+
+        assert len(cache) == 3
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[4]) == (MOSCOW, 'metro')
+        stats = cache.stats()
+        assert stats['evictions'] == 2
+        assert 0 < stats['memory_bytes'] <= stats['max_bytes'] * 2
+
+    def test_results_are_shared(self):
+        cache = GeoCache()
+        first = cache.put(cache.key("a"), (MOSCOW, 'metro'))
+        second = cache.put(cache.key("b"), (MOSCOW, 'metro'))
+        assert first is second
+
+    def test_keys_do_not_keep_text(self):
+        cache = GeoCache()
+        key = cache.key("очень длинный текст " * 500)
+        assert isinstance(key, bytes) and len(key) == 16
+
+    def test_clear(self):
+        geo = GeoFilter()
+        geo.should_take_for_moscow("Невский проспект")
+        geo.clear_cache()
+        assert geo.cache_stats()['size'] == 0
+        assert geo.cache_stats()['misses'] == 0
@@ -0,0 +1,91 @@
+"""Тесты токенного trie гео-фильтра: совпадение с поиском по n-граммам.
+
+Эталон — прежний алгоритм: для каждого уровня отдельно перебираем n-граммы
+длиной 1..max_n и смотрим их в словаре.
+
+Запуск:
+    pytest tests/test_geo_index.py -v
+"""
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from geo_filter import MOSCOW, SPB, geo_filter, _normalize
+
+CORPUS_PATH = Path(__file__).parent.parent / 'benchmarks' / 'corpus.jsonl'
+
+FILLER = ['работа', 'склад', 'на', 'в', 'и', 'м', 'метро', 'ул', 'проспект', 'г.', 'спб', 'москва']
+
+
+def _scan_ngrams(tokens: list, level: tuple) -> int:
+    lookup, max_n = level
+    mask = 0
+    for size in range(1, min(max_n, len(tokens)) + 1):
+        for i in range(len(tokens) - size + 1):
+            mask |= lookup.get(' '.join(tokens[i:i + size]), 0)
+    return mask
+
+
+def _max_n(lookup: dict) -> int:
+    return max((len(k.split()) for k in lookup), default=1)
+
+
+ALIAS = (geo_filter._alias_dict, _max_n(geo_filter._alias_dict))
+METRO = (geo_filter._metro_dict, _max_n(geo_filter._metro_dict))
+STREET = (geo_filter._street_dict, _max_n(geo_filter._street_dict))
+
+
+def _reference_detect(normalized: str) -> tuple:
+    tokens = normalized.split()
+    if not tokens:
+        return 0, 'none'
+    alias = _scan_ngrams(tokens, ALIAS)
+    if alias:
+        return alias, 'explicit'
+    metro = _scan_ngrams(tokens, METRO)
+    if metro in (MOSCOW, SPB):
+        return metro, 'metro'
+    street = _scan_ngrams(tokens, STREET)
+    if street in (MOSCOW, SPB):
+        return street, 'street'
+    return 0, 'none'
+
+
+def _texts() -> list:
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        texts = [json.loads(line)['text'] for line in f]
+    phrases = [*geo_filter._alias_dict, *geo_filter._metro_dict, *geo_filter._street_dict]
+    texts += phrases
+    rng = random.Random(11)
+    for _ in range(3000):
+        texts.append(' '.join(
+            rng.choice(phrases) if rng.random() < 0.3 else rng.choice(FILLER)
+            for _ in range(rng.randint(0, 12))
+        ))
+    return texts
+
+
+class TestTrieIndex:
+
+    def test_matches_ngram_scan(self):
+        mismatches = []
+        for text in _texts():
+            normalized = _normalize(text)
+            if geo_filter._detect(normalized) != _reference_detect(normalized):
+                mismatches.append(text)
+        assert mismatches == []
+
+    @pytest.mark.parametrize("text, expected", [
+        ("", (0, 'none')),
+        ("москва", (MOSCOW, 'explicit')),
+        ("москва и спб, метро тверская", (MOSCOW | SPB, 'explicit')),
+        ("метро тверская", (MOSCOW, 'metro')),
+    ])
+    def test_levels(self, text, expected):
+        assert geo_filter._detect(_normalize(text)) == expected
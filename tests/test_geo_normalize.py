@@ -0,0 +1,108 @@
+"""Тесты нормализатора гео-фильтра: совпадение с прежней цепочкой regex-замен.
+
+Эталон — исходная реализация _normalize (lower, ё→е, «г.», точки, дефисы,
+18 замен аббревиатур, спецсимволы, пробелы). Проверяется посимвольное
+совпадение на всех строках словарей, корпусе сообщений и случайных текстах.
+
+Запуск:
+    pytest tests/test_geo_normalize.py -v
+"""
+import json
+import os
+import random
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import geo_filter as geo_module
+from geo_filter import _normalize
+
+CORPUS_PATH = Path(__file__).parent.parent / 'benchmarks' / 'corpus.jsonl'
+
+_ABBR = tuple((re.compile(pattern), replacement) for pattern, replacement in (
+    (r'\bпр-кт\b', 'проспект'), (r'\bпросп\b', 'проспект'), (r'\bбул\b', 'бульвар'),
+    (r'\bнаб\b', 'набережная'), (r'\bш\b', 'шоссе'), (r'\bпр\b', 'проспект'),
+    (r'\bул\b', ''), (r'\bулица\b', ''), (r'\bпроспект\b', ''), (r'\bбульвар\b', ''),
+    (r'\bнабережная\b', ''), (r'\bшоссе\b', ''), (r'\bпереулок\b', ''), (r'\bтупик\b', ''),
+    (r'\bплощадь\b', ''), (r'\bаллея\b', ''), (r'\bпроезд\b', ''), (r'\bпросека\b', ''),
+))
+
+
+def _reference_normalize(text: str) -> str:
+    text = text.lower()
+    text = text.replace('ё', 'е')
+    text = re.sub(r'\bг\.?\s+', '', text)
+    text = text.replace('.', ' ')
+    text = re.sub(r'(\w)-(\w)', r'\1 \2', text)
+    for pattern, replacement in _ABBR:
+        text = pattern.sub(replacement, text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+WORDS = [
+    'г', 'г.', 'Г.', 'пр-кт', 'пр', 'просп', 'бул', 'наб', 'ш', 'ул', 'улица', 'проспект',
+    'бульвар', 'набережная', 'шоссе', 'переулок', 'тупик', 'площадь', 'аллея', 'проезд',
+    'просека', 'м.', 'Санкт-Петербург', 'Ёлки', 'кт', '2г',
+]
+CHARS = list('абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБГЁabcXYZİ0123456789_') + [
+    ' ', '  ', '.', '-', '—', ',', '\t', '\n', '\xa0', '/', '(', '№', '̇', '\x1c',
+]
+SEPARATORS = ['', ' ', '-', '.', '. ', '  ']
+
+
+def _dictionary_lines() -> list:
+    lines = []
+    for name, _, _ in geo_module._SOURCES:
+        path = geo_module._DATA_DIR / name
+        if path.exists():
+            lines += path.read_text(encoding='utf-8').splitlines()
+    return lines
+
+
+def _random_texts(count: int) -> list:
+    rng = random.Random(7)
+    texts = []
+    for _ in range(count):
+        parts = [
+            rng.choice(WORDS) if rng.random() < 0.5
+            else ''.join(rng.choice(CHARS) for _ in range(rng.randint(0, 4)))
+            for _ in range(rng.randint(0, 12))
+        ]
+        texts.append(''.join(rng.choice(SEPARATORS) + part for part in parts))
+    return texts
+
+
+def _mismatches(texts: list) -> list:
+    return [t for t in texts if _normalize(t) != _reference_normalize(t)]
+
+
+class TestNormalize:
+
+    def test_dictionaries(self):
+        assert _mismatches(_dictionary_lines()) == []
+
+    def test_corpus(self):
+        with open(CORPUS_PATH, encoding='utf-8') as f:
+            texts = [json.loads(line)['text'] for line in f]
+        assert _mismatches(texts) == []
+
+    def test_random_texts(self):
+        assert _mismatches(_random_texts(20_000)) == []
+
+    @pytest.mark.parametrize("text, expected", [
+        ("г. Красногорск", "красногорск"),
+        ("г.Красногорск", "г красногорск"),      # без пробела «г.» не префикс
+        ("Санкт-Петербург, Невский пр.", "санкт петербург невский"),
+        ("пр-кт Мира", "кт мира"),
+        ("ул.Ленина, д.5", "ленина д 5"),
+        ("Ёлки-палки", "елки палки"),
+        ("", ""),
+    ])
+    def test_examples(self, text, expected):
+        assert _normalize(text) == expected
+        assert _reference_normalize(text) == expected
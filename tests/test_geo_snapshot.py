@@ -0,0 +1,80 @@
+"""Тесты снимка гео-словарей (data/geo/geo_index.bin).
+
+Запуск:
+    pytest tests/test_geo_snapshot.py -v
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import geo_filter as geo_module
+from geo_filter import MOSCOW, GeoFilter
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for name, _, _ in geo_module._SOURCES:
+        shutil.copy(geo_module._DATA_DIR / name, tmp_path / name)
+    return tmp_path
+
+
+def _count_builds(monkeypatch):
+    calls = []
+    original = geo_module._build_dicts
+
+    def counting(path):
+        calls.append(path)
+        return original(path)
+
+    monkeypatch.setattr(geo_module, '_build_dicts', counting)
+    return calls
+
+
+class TestSnapshot:
+
+    def test_built_once_then_loaded(self, data_dir, monkeypatch):
+        builds = _count_builds(monkeypatch)
+        first = GeoFilter(data_dir)
+        assert (data_dir / geo_module._SNAPSHOT_NAME).exists()
+
+        second = GeoFilter(data_dir)
+        assert len(builds) == 1
+        assert second._alias_dict == first._alias_dict
+        assert second._metro_dict == first._metro_dict
+        assert second._street_dict == first._street_dict
+        assert second._index == first._index
+
+    def test_rebuilt_when_source_changes(self, data_dir, monkeypatch):
+        builds = _count_builds(monkeypatch)
+        GeoFilter(data_dir)
+        with (data_dir / 'moscow_aliases.txt').open('a', encoding='utf-8') as fh:
+            fh.write('\nТестовоград\n')
+
+        geo = GeoFilter(data_dir)
+        assert len(builds) == 2
+        assert geo._detect('тестовоград') == (MOSCOW, 'explicit')
+
+    def test_corrupted_snapshot_is_rebuilt(self, data_dir, monkeypatch):
+        builds = _count_builds(monkeypatch)
+        GeoFilter(data_dir)
+        snapshot = data_dir / geo_module._SNAPSHOT_NAME
+        header = snapshot.read_bytes()[:geo_module._HEADER_SIZE]
+        snapshot.write_bytes(header + b'\x00garbage')
+
+        geo = GeoFilter(data_dir)
+        assert len(builds) == 2
+        assert geo.should_take_for_spb("метро Тверская") is False
+
+    def test_read_only_dir_still_works(self, data_dir, monkeypatch):
+        def fail(*args, **kwargs):
+            raise OSError("read-only file system")
+
+        monkeypatch.setattr(geo_module.os, 'replace', fail)
+        geo = GeoFilter(data_dir)
+        assert not (data_dir / geo_module._SNAPSHOT_NAME).exists()
+        assert list(data_dir.glob('*.tmp')) == []
+        assert geo.should_take_for_moscow("Невский проспект") is False
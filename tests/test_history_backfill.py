@@ -0,0 +1,265 @@
+"""Тесты параллельной загрузки истории по чатам и общей паузы FloodWait.
+
+Запуск:
+    pytest tests/test_history_backfill.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import date, datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pyrogram.errors import FloodWait
+
+import parser as parser_module
+import tasks as tasks_module
+from db_service import DBService
+from parser import FloodGate, TelegramParser
+from state_manager import state_manager
+
+JOB_FILTERS = {
+    'date_from': date(2026, 2, 1), 'date_to': date(2026, 2, 28),
+    'min_price': 0, 'max_price': 100000, 'shk_filter': 'любое',
+}
+
+
+class FakeBackfillParser:
+    """parse_history/get_forum_topics с задержкой и учётом параллельности."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def get_forum_topics(self, chat):
+        return {1: "Топик"} if chat == "@forum" else {}
+
+    async def parse_history(self, chat_username, days, handler, cities=(), **kwargs):
+        self.active += 1
+        self.max_active = max(self.active, self.max_active)
+        await asyncio.sleep(0.01)
+        for i in range(3):
+            message = SimpleNamespace(
+                id=i, chat=SimpleNamespace(id=hash(chat_username)), date=datetime(2026, 2, 1)
+            )
+            await handler(message, chat_username)
+        self.active -= 1
+        return 3
+
+
+class StoppableHistoryParser(FakeBackfillParser):
+    """История из 10 сообщений; задачу останавливают после stop_after."""
+
+    def __init__(self, stop_event, stop_after):
+        super().__init__()
+        self.stop_event = stop_event
+        self.stop_after = stop_after
+
+    async def parse_history(self, chat_username, days, handler, cities=(), stop_event=None, **kwargs):
+        for handled, i in enumerate(range(10, 0, -1)):
+            if handled == self.stop_after:
+                self.stop_event.set()
+            if stop_event is not None and stop_event.is_set():
+                break
+            message = SimpleNamespace(
+                id=i, chat=SimpleNamespace(id=hash(chat_username)), date=datetime(2026, 2, 1)
+            )
+            await handler(message, chat_username)
+
+
+class FakeDB:
+
+    def __init__(self):
+        self.marks = []
+
+    async def save_watermark(self, task_id, chat_id, chat_name, msg_id, msg_date):
+        self.marks.append((chat_name, msg_id))
+
+
+def _task(make_task, task_id, chats):
+    task = make_task(task_id, chats, db=FakeDB(), parse_history_days=1)
+    processed = []
+
+    async def process_message(message, chat_name, parsed=None, persist_mark=True, deferred=None):
+        processed.append(chat_name)
+
+    task.process_message = process_message
+    task.parser = FakeBackfillParser()
+    return task, processed
+
+
+class TestBackfill:
+
+    def test_bounded_parallel_with_progress(self, monkeypatch, make_task):
+        monkeypatch.setattr(tasks_module.config, 'HISTORY_CONCURRENCY', 2)
+        chats = ['@a', '@b', '@c', '@forum', '@e']
+        task, processed = _task(make_task, 'backfill-1', chats)
+
+        async def run():
+            semaphore = asyncio.Semaphore(2)
+            await asyncio.gather(*(task._backfill_chat(chat, semaphore) for chat in chats))
+
+        asyncio.run(run())
+
+        assert task.parser.max_active == 2
+        assert sorted(processed) == sorted(chats * 3)
+        assert task.topics_cache == {'@forum': {1: "Топик"}}
+        progress = state_manager.get_stats('backfill-1')['chats']
+        assert set(progress) == set(chats)
+        assert all(p['status'] == 'done' and p['messages'] == 3 for p in progress.values())
+        # Одна отметка на чат — самое новое сообщение, после дочитывания истории
+        assert sorted(task.db.marks) == sorted((chat, 2) for chat in chats)
+
+    def test_stopped_task_skips_backfill(self, make_task):
+        task, processed = _task(make_task, 'backfill-2', ['@a'])
+        task.stop_event.set()
+        asyncio.run(task._backfill_chat('@a', asyncio.Semaphore(1)))
+        assert processed == []
+
+    def test_stop_mid_history_aborts_chat_without_mark(self, make_task):
+        task, processed = _task(make_task, 'backfill-4', ['@a'])
+        task.parser = StoppableHistoryParser(task.stop_event, stop_after=2)
+        asyncio.run(task._backfill_chat('@a', asyncio.Semaphore(1)))
+        assert processed == ['@a', '@a']
+        # История не дочитана — отметки нет, следующий запуск прочитает чат заново
+        assert task.db.marks == []
+        assert state_manager.get_stats('backfill-4')['chats']['@a']['status'] == 'stopped'
+
+
+class JobHistoryParser:
+    """История из n объявлений (разные цены — не дубликаты), newest-first."""
+
+    def __init__(self, n, make_message):
+        self.n = n
+        self.make_message = make_message
+
+    async def get_forum_topics(self, chat):
+        return {}
+
+    async def parse_history(self, chat_username, days, handler, cities=(), **kwargs):
+        for i in range(self.n, 0, -1):
+            message = self.make_message(
+                i, SimpleNamespace(id=-100700), f"Выйду 5 февраля, {3000 + i}", datetime(2026, 2, 1)
+            )
+            await handler(message, chat_username)
+        return self.n
+
+
+class CommitCheckingNotifier:
+    """Уведомитель, проверяющий, что объявление уже видно читателям БД."""
+
+    def __init__(self, db):
+        self.db = db
+        self.sent = []
+
+    async def send_notification(self, data, item_id, mode):
+        self.sent.append((item_id, await self.db.get_found_item_by_id(item_id) is not None))
+        return True
+
+
+class TestBackfillInserts:
+
+    def test_history_inserts_share_commits_and_notify_after_commit(
+        self, tmp_path, make_task, make_message
+    ):
+        async def run():
+            db = DBService(str(tmp_path / "history.db"), flush_interval=60)
+            await db.init_db()
+            task = make_task('backfill-3', ['@jobs'], filters=JOB_FILTERS, db=db,
+                             parse_history_days=1)
+            task.parser = JobHistoryParser(120, make_message)
+            task.notifier = CommitCheckingNotifier(db)
+            commits_before = db._pool.commits
+            await task._backfill_chat('@jobs', asyncio.Semaphore(1))
+            commits = db._pool.commits - commits_before
+            await db.flush()
+            items = await db.count_items('backfill-3')
+            notified = await db.count_notified_items('backfill-3')
+            await db.close()
+            return task.notifier.sent, commits, items, notified
+
+        sent, commits, items, notified = asyncio.run(run())
+        assert items == 120 and len(sent) == 120
+        # Уведомление — только о закоммиченном объявлении
+        assert all(visible for _, visible in sent)
+        assert notified == 120
+        # 120 последовательных вставок: коммит на пачку уведомлений, а не на вставку
+        assert commits <= 120 // tasks_module.HISTORY_NOTIFY_BATCH + 2
+
+
+class FloodClient:
+    """get_chat_history: первый проход падает с FloodWait после двух сообщений."""
+
+    def __init__(self):
+        self.history_calls = []
+        self.get_chat_calls = 0
+
+    async def get_chat(self, username):
+        self.get_chat_calls += 1
+        if self.get_chat_calls == 1:
+            raise FloodWait(value=0)
+        return SimpleNamespace(id=100)
+
+    async def get_chat_history(self, chat_id, offset_id=0):
+        self.history_calls.append(offset_id)
+        ids = [m for m in (5, 4, 3, 2, 1) if not offset_id or m < offset_id]
+        for n, message_id in enumerate(ids):
+            if len(self.history_calls) == 1 and n == 2:
+                raise FloodWait(value=0)
+            yield SimpleNamespace(id=message_id, text=f"msg {message_id}", date=datetime.now())
+
+
+class TestFloodWait:
+
+    def test_history_resumes_after_flood_wait(self):
+        received = []
+
+        async def handler(message, chat_name):
+            received.append(message.id)
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = FloodClient()
+            count = await parser.parse_history('@chat', days=1, handler=handler)
+            return parser.client, count
+
+        client, count = asyncio.run(run())
+        assert received == [5, 4, 3, 2, 1]
+        assert count == 5
+        assert client.history_calls == [0, 4]
+        assert client.get_chat_calls == 2
+
+    def test_history_stops_on_stop_event(self):
+        received = []
+        stop = asyncio.Event()
+
+        async def handler(message, chat_name):
+            received.append(message.id)
+            if len(received) == 2:
+                stop.set()
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            client = FloodClient()
+            client.get_chat_calls = 1  # без FloodWait на get_chat
+            client.history_calls = [0]  # и посреди истории
+            parser.client = client
+            return await parser.parse_history('@chat', days=1, handler=handler, stop_event=stop)
+
+        assert asyncio.run(run()) == 2
+        assert received == [5, 4]
+
+    def test_gate_is_shared(self, monkeypatch):
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+
+        monkeypatch.setattr(parser_module.asyncio, 'sleep', fake_sleep)
+        gate = FloodGate()
+        gate.pause(30)
+        gate.pause(5)  # короче текущей паузы — не сокращает её
+
+        asyncio.run(gate.wait())
+        assert len(sleeps) == 1 and 29 < sleeps[0] <= 30
@@ -0,0 +1,129 @@
+"""Тесты центрального диспетчера сообщений (message_dispatcher).
+
+Запуск:
+    pytest tests/test_message_dispatcher.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import message_dispatcher
+from message_dispatcher import MessageDispatcher, ParsedMessage
+
+WORKER_TEXT = "Выйду на смену 5 февраля, ставка 3000"
+
+
+def _message(chat_id=100, text=WORKER_TEXT, username="chat"):
+    return SimpleNamespace(
+        id=1,
+        text=text,
+        date=datetime(2026, 2, 1, 12, 0),
+        chat=SimpleNamespace(id=chat_id, username=username, title="Chat"),
+    )
+
+
+def _count_extract(monkeypatch):
+    calls = []
+    original = message_dispatcher.extraction_cache.extract
+
+    def counting(text, message_date):
+        calls.append(text)
+        return original(text, message_date)
+
+    monkeypatch.setattr(message_dispatcher.extraction_cache, "extract", counting)
+    return calls
+
+
+class TestMessageDispatcher:
+
+    def test_extracts_once_for_all_subscribers(self, monkeypatch):
+        calls = _count_extract(monkeypatch)
+        received = []
+
+        async def worker(message, chat_name, parsed):
+            received.append(("worker", chat_name, parsed))
+
+        async def employer(message, chat_name, parsed):
+            received.append(("employer", chat_name, parsed))
+
+        dispatcher = MessageDispatcher()
+        dispatcher.subscribe([100], worker)
+        dispatcher.subscribe([100, 200], employer)
+        asyncio.run(dispatcher.dispatch(_message(chat_id=100)))
+
+        assert len(calls) == 1
+        assert [name for name, _, _ in received] == ["worker", "employer"]
+        assert received[0][1] == "@chat"
+        assert received[0][2] is received[1][2]
+
+    def test_only_chat_subscribers_receive(self, monkeypatch):
+        calls = _count_extract(monkeypatch)
+        received = []
+
+        async def handler(message, chat_name, parsed):
+            received.append(message.chat.id)
+
+        dispatcher = MessageDispatcher()
+        dispatcher.subscribe([200], handler)
+        asyncio.run(dispatcher.dispatch(_message(chat_id=100)))
+        asyncio.run(dispatcher.dispatch(_message(chat_id=200)))
+
+        assert received == [200]
+        assert len(calls) == 1
+
+    def test_unsubscribe(self):
+        received = []
+
+        async def handler(message, chat_name, parsed):
+            received.append(chat_name)
+
+        dispatcher = MessageDispatcher()
+        dispatcher.subscribe([100, 200], handler)
+        dispatcher.unsubscribe(handler)
+        asyncio.run(dispatcher.dispatch(_message(chat_id=100)))
+
+        assert received == []
+        assert len(dispatcher) == 0
+
+    def test_failing_subscriber_does_not_block_others(self):
+        received = []
+
+        async def broken(message, chat_name, parsed):
+            raise RuntimeError("boom")
+
+        async def handler(message, chat_name, parsed):
+            received.append(chat_name)
+
+        dispatcher = MessageDispatcher()
+        dispatcher.subscribe([100], broken)
+        dispatcher.subscribe([100], handler)
+        asyncio.run(dispatcher.dispatch(_message(chat_id=100)))
+
+        assert received == ["@chat"]
+
+
+class TestParsedMessage:
+
+    def test_geo_computed_once_per_city(self, monkeypatch):
+        calls = []
+
+        def should_take_for_moscow(text):
+            calls.append(text)
+            return True
+
+        monkeypatch.setattr(
+            message_dispatcher.geo_filter, "should_take_for_moscow", should_take_for_moscow
+        )
+        parsed = ParsedMessage("м. Тверская " + WORKER_TEXT, datetime(2026, 2, 1))
+        assert parsed.takes_city('МСК')
+        assert parsed.takes_city('МСК')
+        assert parsed.takes_city('ALL')
+        assert len(calls) == 1
+
+    def test_strips_null_bytes(self):
+        parsed = ParsedMessage("a\x00b", datetime(2026, 2, 1))
+        assert parsed.text == "ab"
@@ -0,0 +1,86 @@
+"""Тесты MessageExtractor: эталонный корпус и граничные случаи предкомпилированных паттернов.
+
+Запуск:
+    pytest tests/test_message_extractor.py -v
+"""
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from message_extractor import MessageExtractor
+
+CORPUS_PATH = Path(__file__).parent.parent / 'benchmarks' / 'corpus.jsonl'
+MESSAGE_DATE = datetime(2026, 2, 3, 12, 0)  # вторник
+
+
+def _corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class TestCorpus:
+
+    def test_matches_recorded_results(self):
+        """extract() даёт те же dict, что записаны эталонной реализацией."""
+        mismatches = [
+            row['text'] for row in _corpus()
+            if MessageExtractor.extract(row['text'], datetime.fromisoformat(row['date'])) != row['expected']
+        ]
+        assert mismatches == []
+
+
+class TestPrice:
+
+    @pytest.mark.parametrize("text, expected", [
+        ("2,5к", 2500),
+        ("1,2,3к", 2300),            # совпадение начинается со второго числа
+        ("67 к 3, 3000", 3000),      # "67 к 3" — адрес, не цена
+        ("123456 руб", 23456),       # \d{3,5} внутри длинного числа
+        ("а1234 2000", 2000),        # \b перед числом обязателен
+        ("оплата: 2800", 2800),
+        ("3 тыс", 3000),
+    ])
+    def test_worker_price(self, text, expected):
+        assert MessageExtractor.extract_price(text, "worker") == expected
+
+    def test_employer_takes_max(self):
+        assert MessageExtractor.extract_price("2500-3500 р", "employer") == 3500
+
+    def test_no_digits(self):
+        assert MessageExtractor.extract_price("цена договорная", "worker") is None
+
+
+class TestDate:
+
+    @pytest.mark.parametrize("text, expected", [
+        ("выйду послезавтра", "2026-02-05"),
+        ("выйду завтра", "2026-02-04"),
+        ("в пятницу или в среду", "2026-02-04"),   # приоритет — порядок WEEKDAYS
+        ("сб, вс", "2026-02-07"),
+        ("средство", None),                          # "ср" только целым словом
+        ("15-го", "2026-02-15"),
+        ("12.03", "2026-03-12"),
+        ("5 марта", "2026-03-05"),
+    ])
+    def test_extract_date(self, text, expected):
+        assert MessageExtractor.extract_date(text, MESSAGE_DATE) == expected
+
+
+class TestShk:
+
+    @pytest.mark.parametrize("text, expected", [
+        ("150-200 шк", "150-200"),
+        ("шк: 100-300", "100-300"),
+        ("12345 шк", "2345"),
+        ("ШК до 500", "500"),
+        ("шк мало", "мало"),
+        ("без шк", None),
+    ])
+    def test_extract_shk(self, text, expected):
+        assert MessageExtractor.extract_shk(text) == expected
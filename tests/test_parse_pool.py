@@ -0,0 +1,150 @@
+"""Тесты пула разбора истории (parse_pool) и пакетного parse_history.
+
+Запуск:
+    pytest tests/test_parse_pool.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import parser as parser_module
+from geo_filter import geo_filter
+from message_dispatcher import ParsedMessage
+from message_extractor import extraction_cache
+from parse_pool import ParsePool
+from parser import TelegramParser
+
+NOW = datetime.now()
+
+TEXTS = [
+    "Выйду на смену завтра, м. Тверская, ставка 3000",
+    "Ищу работу, Невский проспект, 2500 р",
+    "Нужен сотрудник на ПВЗ 15.03, оплата 2800, шк до 200",
+    "просто сообщение без данных",
+]
+
+
+def _message(index, text):
+    return SimpleNamespace(
+        id=index + 1,
+        text=text,
+        date=NOW - timedelta(minutes=index),
+        chat=SimpleNamespace(id=100, username="chat", title="Chat"),
+    )
+
+
+MESSAGES = [_message(i, text) for i, text in enumerate(TEXTS * 3)]
+
+
+def _expected():
+    return [
+        (p.text, p.extracted, p.takes_city('МСК'))
+        for p in (ParsedMessage(m.text, m.date) for m in MESSAGES)
+    ]
+
+
+class TestParsePool:
+
+    @pytest.mark.parametrize("mode", ["off", "thread", "process"])
+    def test_same_results_in_order(self, mode):
+        pool = ParsePool(mode=mode, workers=2)
+
+        async def run():
+            return await pool.parse_many(MESSAGES, cities=('МСК',))
+
+        try:
+            parsed = asyncio.run(run())
+        finally:
+            pool.shutdown()
+
+        assert [(p.text, p.extracted, p.takes_city('МСК')) for p in parsed] == _expected()
+
+    def test_unknown_mode_disables_pool(self):
+        assert ParsePool(mode='gpu').enabled is False
+
+    def test_thread_mode_shares_caches_safely(self, monkeypatch):
+        """Потоки пула вытесняют записи общих кэшей одновременно (корпус > max_size)."""
+        corpus = [
+            _message(i, f"Выйду {i % 28 + 1} марта, м. Тверская, ставка {2000 + i}")
+            for i in range(3000)
+        ]
+        extraction_cache.clear()
+        geo_filter.clear_cache()
+        monkeypatch.setattr(extraction_cache, 'max_size', 50)
+        monkeypatch.setattr(geo_filter._cache, 'max_size', 50)
+        # Частое переключение потоков — гонки проявляются сразу
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        pool = ParsePool(mode='thread', workers=4)
+
+        async def run():
+            chunks = [corpus[i:i + 100] for i in range(0, len(corpus), 100)]
+            results = await asyncio.gather(
+                *(pool.parse_many(chunk, cities=('МСК', 'СПБ')) for chunk in chunks)
+            )
+            return [parsed for chunk in results for parsed in chunk]
+
+        try:
+            parsed = asyncio.run(run())
+        finally:
+            sys.setswitchinterval(switch_interval)
+            pool.shutdown()
+
+        expected = [extraction_cache.extract(m.text, m.date) for m in corpus[:20]]
+        assert [p.extracted for p in parsed[:20]] == expected
+        assert len(parsed) == len(corpus)
+        assert all(p.extracted and p.extracted['price'] == 2000 + i for i, p in enumerate(parsed))
+        # Счётчики не теряют обращений, размер не превышает лимит
+        stats = extraction_cache.stats()
+        assert stats['hits'] + stats['misses'] == len(corpus) + 20
+        assert stats['size'] <= 50
+        geo_stats = geo_filter.cache_stats()
+        assert geo_stats['hits'] + geo_stats['misses'] == 2 * len(corpus)
+        assert geo_stats['size'] <= 50
+        extraction_cache.clear()
+        geo_filter.clear_cache()
+
+
+class FakeHistoryClient:
+
+    async def get_chat(self, username):
+        return SimpleNamespace(id=100)
+
+    async def get_chat_history(self, chat_id, offset_id=0):
+        for message in MESSAGES:
+            yield message
+
+
+class TestParseHistoryChunks:
+
+    @pytest.mark.parametrize("mode", ["off", "thread"])
+    def test_handler_order_and_parsed(self, monkeypatch, mode):
+        monkeypatch.setattr(parser_module, "parse_pool", ParsePool(mode=mode, chunk_size=5))
+        received = []
+
+        async def handler(message, chat_name, parsed=None):
+            received.append((message.id, chat_name, parsed))
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash="x")
+            parser.client = FakeHistoryClient()
+            return await parser.parse_history("@chat", days=1, handler=handler, cities=('МСК',))
+
+        try:
+            count = asyncio.run(run())
+        finally:
+            parser_module.parse_pool.shutdown()
+
+        assert count == len(MESSAGES)
+        assert [message_id for message_id, _, _ in received] == [m.id for m in MESSAGES]
+        assert {chat_name for _, chat_name, _ in received} == {"@chat"}
+        if mode == "off":
+            assert all(parsed is None for _, _, parsed in received)
+        else:
+            assert [(p.text, p.extracted) for _, _, p in received] == [(t, e) for t, e, _ in _expected()]
@@ -0,0 +1,168 @@
+"""Тесты адаптивного polling fallback (poll_scheduler + TelegramParser.poll_new_messages).
+
+Запуск:
+    pytest tests/test_poll_scheduler.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from parser import TelegramParser
+from poll_scheduler import PollScheduler
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(clock, **kwargs):
+    return PollScheduler(min_interval=5, max_interval=120, min_limit=5, max_limit=100,
+                         clock=clock, **kwargs)
+
+
+class TestPollScheduler:
+
+    def test_first_poll_after_initial_interval(self):
+        clock = FakeClock()
+        scheduler = _scheduler(clock)
+        assert scheduler.due(['@a']) == []
+        assert scheduler.seconds_until_due(['@a']) == 30
+        clock.now += 30
+        assert scheduler.due(['@a']) == ['@a']
+        assert scheduler.limit('@a') == 5
+
+    def test_quiet_chat_backs_off_to_max(self):
+        clock = FakeClock()
+        scheduler = _scheduler(clock)
+        for _ in range(20):
+            clock.now += 200
+            scheduler.record_poll('@quiet', newest_id=50, found=0, recovered=0)
+        stats = scheduler.stats()['chats']['@quiet']
+        assert stats['interval'] == 120
+        assert stats['limit'] == 5
+
+    def test_busy_chat_gets_bigger_page_and_shorter_interval(self):
+        clock = FakeClock()
+        scheduler = _scheduler(clock)
+        scheduler.bind('@busy', 1)
+        newest = 100
+        for _ in range(10):
+            clock.now += 30
+            newest += 60  # 2 сообщения/сек
+            scheduler.note_realtime(1)
+            scheduler.record_poll('@busy', newest_id=newest, found=0, recovered=0)
+        state = scheduler.stats()['chats']['@busy']
+        # За интервал набегает не больше страницы
+        assert state['limit'] > 5
+        assert state['rate_per_min'] > 60
+        assert state['interval'] * state['rate_per_min'] / 60 <= 100
+
+    def test_recovered_messages_tighten_interval(self):
+        clock = FakeClock()
+        scheduler = _scheduler(clock)
+        scheduler.record_poll('@a', newest_id=10, found=0, recovered=0)
+        relaxed = scheduler.stats()['chats']['@a']['interval']
+        scheduler.record_poll('@a', newest_id=12, found=2, recovered=2)
+        stats = scheduler.stats()
+        assert stats['chats']['@a']['interval'] < relaxed
+        assert stats['recovered'] == 2
+
+    def test_realtime_silence_in_active_chat_tightens(self):
+        clock = FakeClock()
+        scheduler = _scheduler(clock)
+        scheduler.bind('@a', 1)
+        scheduler.record_poll('@a', newest_id=10, found=0, recovered=0)
+        clock.now += 30
+        # Чат пишет (id вырос на 30), real-time не пришло ни одного
+        scheduler.record_poll('@a', newest_id=40, found=0, recovered=0)
+        assert scheduler.stats()['chats']['@a']['interval'] < 45
+
+
+CHATS = {
+    '@a': SimpleNamespace(id=-1, username='a', title='A'),
+    '@b': SimpleNamespace(id=-2, username='b', title='B'),
+}
+
+
+class BusyClient:
+    """Чаты с id 1..newest newest-first; считает одновременные запросы."""
+
+    def __init__(self, newest=30):
+        self.newest = newest
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+    async def get_chat_history(self, chat_id, limit=0, offset_id=0):
+        self.requests.append((chat_id, limit, offset_id))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            ids = [i for i in range(self.newest, 0, -1) if not offset_id or i < offset_id]
+            for i in ids[:limit or None]:
+                yield SimpleNamespace(id=i, chat=CHATS[chat_id], text=f"msg {i}", date=datetime.now())
+        finally:
+            self.active -= 1
+
+
+class TestPollNewMessages:
+
+    def test_concurrent_and_counts_recovered(self):
+        received = []
+        last_seen = {-1: 20, -2: 25}
+
+        async def handler(message, chat_name):
+            received.append((chat_name, message.id))
+            last_seen[message.chat.id] = max(last_seen[message.chat.id], message.id)
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = BusyClient()
+            recovered = await parser.poll_new_messages(['@a', '@b'], last_seen, handler)
+            return parser, recovered
+
+        parser, recovered = asyncio.run(run())
+        assert parser.client.max_active == 2
+        assert [i for chat, i in received if chat == '@a'] == list(range(21, 31))
+        assert [i for chat, i in received if chat == '@b'] == list(range(26, 31))
+        assert recovered == 15
+        stats = parser.poll_scheduler.stats()
+        assert stats['recovered'] == 15
+        assert stats['chats']['@a']['recovered'] == 10
+
+    def test_messages_from_realtime_not_counted(self):
+        last_seen = {-1: 27}
+
+        async def handler(message, chat_name):
+            # Пока обрабатывали 28, real-time доставил 29 и 30
+            last_seen[-1] = 30
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = BusyClient()
+            return await parser.poll_new_messages(['@a'], last_seen, handler)
+
+        assert asyncio.run(run()) == 1
+
+    def test_page_follows_scheduler_limit(self):
+        async def handler(message, chat_name):
+            pass
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = BusyClient()
+            parser.poll_scheduler._state('@a').limit = 40
+            await parser.poll_new_messages(['@a'], {-1: 1}, handler)
+            return parser.client.requests
+
+        assert asyncio.run(run()) == [('@a', 40, 0)]
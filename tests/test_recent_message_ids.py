@@ -0,0 +1,95 @@
+"""Тесты окна обработанных message_id (deduplicator.RecentMessageIds).
+
+Запуск:
+    pytest tests/test_recent_message_ids.py -v
+"""
+import asyncio
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from deduplicator import RecentMessageIds
+
+
+class TestRecentMessageIds:
+
+    def test_second_add_is_duplicate(self):
+        seen = RecentMessageIds(window=64)
+        assert seen.add(-100, 10)
+        assert not seen.add(-100, 10)
+        assert (-100, 10) in seen
+        # Тот же message_id в другом чате — другое сообщение
+        assert seen.add(-200, 10)
+
+    def test_out_of_order_inside_window(self):
+        seen = RecentMessageIds(window=64)
+        for message_id in (50, 48, 49, 20):
+            assert seen.add(1, message_id)
+        for message_id in (50, 48, 49, 20):
+            assert not seen.add(1, message_id)
+        assert (1, 47) not in seen
+
+    def test_forgets_only_ids_older_than_window(self):
+        seen = RecentMessageIds(window=64)
+        for message_id in range(1, 101):
+            seen.add(1, message_id)
+        # Окно — последние 64 id: 37..100
+        assert all((1, i) in seen for i in range(37, 101))
+        assert (1, 36) not in seen
+        assert seen.add(1, 36)  # старше окна — снова новое
+
+    def test_long_jump_clears_window(self):
+        seen = RecentMessageIds(window=64)
+        seen.add(1, 10)
+        seen.add(1, 10 + 64 * 5)
+        assert (1, 10) not in seen
+        assert seen.add(1, 10 + 64 * 5 - 1)
+
+    def test_matches_reference_sliding_set(self):
+        """Случайные потоки id (с повторами и опозданиями) против явного окна."""
+        rng = random.Random(5)
+        window = 128
+        seen = RecentMessageIds(window=window)
+        reference = {}
+        high = {}
+        for _ in range(20000):
+            chat = rng.choice((1, 2, 3))
+            top = high.get(chat, 1000)
+            message_id = max(1, top + rng.randint(-150, 5))
+            high[chat] = max(top, message_id)
+            ids = reference.setdefault(chat, set())
+            in_window = message_id > high[chat] - window
+            expected = not (in_window and message_id in ids)
+            assert seen.add(chat, message_id) == expected
+            ids.add(message_id)
+            ids.difference_update([i for i in ids if i <= high[chat] - window])
+
+    def test_memory_is_fixed_per_chat(self):
+        seen = RecentMessageIds(window=4096)
+        for message_id in range(1, 50001):
+            seen.add(-100500, message_id)
+        assert seen.memory_bytes() == 512
+        assert len(seen) == 1
+
+
+class TestProcessMessageDedup:
+
+    def test_no_reprocessing_after_many_messages(self, make_task, make_message):
+        """Раньше set очищался на 10 000 ключей — свежие сообщения обрабатывались повторно."""
+        from state_manager import state_manager
+
+        chat = SimpleNamespace(id=-1, username='chat', title='Chat')
+        task = make_task('recent-ids')
+
+        async def process(message_ids):
+            for message_id in message_ids:
+                await task.process_message(make_message(message_id, chat), '@chat', persist_mark=False)
+
+        asyncio.run(process(range(1, 10011)))
+        scanned = state_manager.get_stats('recent-ids')['total_messages_scanned']
+        # Polling перечитывает последние сообщения — повторно они не обрабатываются
+        asyncio.run(process(range(10001, 10011)))
+        assert state_manager.get_stats('recent-ids')['total_messages_scanned'] == scanned == 10010
@@ -0,0 +1,174 @@
+"""Тесты догона окна разрыва после переподключения клиента.
+
+Запуск:
+    pytest tests/test_reconnect_gap.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import parser as parser_module
+from config import config
+from parser import TelegramParser, client_registry
+
+NOW = datetime.now()
+CHAT = SimpleNamespace(id=-7, username='gap', title='Gap')
+
+
+class GapClient:
+    """Чат с сообщениями id 1..newest, по одному в минуту (newest — сейчас)."""
+
+    def __init__(self, newest=30):
+        self.newest = newest
+        self.requests = []
+        self.is_connected = True
+
+    async def get_chat_history(self, chat_id, limit=0, offset_id=0):
+        self.requests.append((limit, offset_id))
+        ids = [i for i in range(self.newest, 0, -1) if not offset_id or i < offset_id]
+        for i in ids[:limit or None]:
+            yield SimpleNamespace(
+                id=i, chat=CHAT, text=f"msg {i}",
+                date=NOW - timedelta(minutes=self.newest - i),
+            )
+
+    async def get_dialogs(self, limit=0):
+        return
+        yield
+
+
+def _collect():
+    received = []
+
+    async def handler(message, chat_name):
+        received.append(message.id)
+
+    return received, handler
+
+
+class TestCatchUp:
+
+    def test_gap_from_persisted_mark(self):
+        received, handler = _collect()
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = GapClient()
+            recovered = await parser.catch_up_after_reconnect(
+                ['@gap'], {CHAT.id: 12}, handler, down_since=NOW, down_seconds=42
+            )
+            return parser, recovered
+
+        parser, recovered = asyncio.run(run())
+        assert received == list(range(13, 31))
+        assert recovered == 18
+        assert parser.client.requests == [(100, 0)]
+        stats = parser.poll_scheduler.stats()
+        assert stats['reconnects'] == {
+            'count': 1, 'last_disconnect_seconds': 42,
+            'total_disconnect_seconds': 42, 'recovered': 18,
+        }
+        assert stats['chats']['@gap']['gap_recovered'] == 18
+        # Догон не влияет на интервал обычного polling
+        assert stats['chats']['@gap']['polls'] == 0
+
+    def test_chat_without_mark_reads_since_disconnect(self):
+        received, handler = _collect()
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = GapClient()
+            return await parser.catch_up_after_reconnect(
+                ['@gap'], {}, handler,
+                down_since=NOW - timedelta(minutes=4, seconds=30), down_seconds=270
+            )
+
+        assert asyncio.run(run()) == 5
+        assert received == [26, 27, 28, 29, 30]
+
+    def test_gap_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(config, 'RECONNECT_GAP_MAX_MESSAGES', 150)
+        received, handler = _collect()
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = GapClient(newest=1000)
+            await parser.catch_up_after_reconnect(
+                ['@gap'], {CHAT.id: 1}, handler, down_since=NOW, down_seconds=1
+            )
+            return parser.client.requests
+
+        assert asyncio.run(run()) == [(100, 0), (100, 901)]
+        assert received == list(range(801, 1001))
+
+
+class TestRunUntilStopped:
+
+    def _run(self, monkeypatch, on_tick):
+        """Крутит run_until_stopped, пока on_tick(tick, client) не вернёт True."""
+        monkeypatch.setattr(parser_module, '_CONNECTION_CHECK', 0.01)
+        session = 'gap-test-session'
+        entry = client_registry._entry(session)
+        entry['reconnects'] = 0
+
+        async def fake_reconnect(session_name):
+            client.is_connected = True
+            entry['reconnects'] += 1
+
+        monkeypatch.setattr(client_registry, 'reconnect', fake_reconnect)
+        client = GapClient()
+        received, handler = _collect()
+        last_seen = {CHAT.id: 30}
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x', session_name=session)
+            parser.client = client
+            stop = asyncio.Event()
+            tick = 0
+
+            async def driver():
+                nonlocal tick
+                while not stop.is_set():
+                    await asyncio.sleep(0.02)
+                    tick += 1
+                    if on_tick(tick, client, entry):
+                        await asyncio.sleep(0.05)
+                        stop.set()
+
+            await asyncio.gather(
+                parser.run_until_stopped(stop, ['@gap'], last_seen, handler), driver()
+            )
+            return parser
+
+        parser = asyncio.run(run())
+        del client_registry._entries[session]
+        return parser, received
+
+    def test_disconnect_recovers_gap_before_live(self, monkeypatch):
+        def on_tick(tick, client, entry):
+            if tick == 2:
+                # Пока клиент отключён, в чате появились 31..33
+                client.is_connected = False
+                client.newest = 33
+            return tick == 4
+
+        parser, received = self._run(monkeypatch, on_tick)
+        assert received == [31, 32, 33]
+        assert parser.poll_scheduler.stats()['reconnects']['count'] == 1
+        assert parser.poll_scheduler.stats()['reconnects']['recovered'] == 3
+
+    def test_reconnect_by_other_task_also_catches_up(self, monkeypatch):
+        def on_tick(tick, client, entry):
+            if tick == 2:
+                # Клиент сессии переподключила другая задача
+                client.newest = 32
+                entry['reconnects'] += 1
+            return tick == 4
+
+        parser, received = self._run(monkeypatch, on_tick)
+        assert received == [31, 32]
+        assert parser.poll_scheduler.stats()['reconnects']['recovered'] == 2
@@ -0,0 +1,174 @@
+"""Тесты отметок прогресса по чатам (chat_watermarks) и продолжения истории.
+
+Запуск:
+    pytest tests/test_watermarks.py -v
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from db_service import DBService
+from parser import TelegramParser
+
+NOW = datetime.now()
+CHAT = SimpleNamespace(id=-100500, username="chat", title="Chat")
+
+def _message(message_id, minutes_ago=0, text="сообщение"):
+    return SimpleNamespace(
+        id=message_id, chat=CHAT, text=text, date=NOW - timedelta(minutes=minutes_ago),
+        from_user=None, reply_to_top_message_id=None, reply_to_message_id=None,
+    )
+
+
+class TestWatermarkStorage:
+
+    def test_only_moves_forward(self, tmp_path):
+        async def run():
+            db = DBService(str(tmp_path / "marks.db"))
+            await db.init_db()
+            await db.save_watermark("t1", 1, "@a", 10, "2026-02-01T10:00:00")
+            await db.save_watermark("t1", 1, "@a", 7, "2026-02-01T09:00:00")
+            await db.save_watermark("t1", 2, "@b", 3, None)
+            await db.save_watermark("t2", 1, "@a", 99, None)
+            await db.flush()
+            marks = await db.get_watermarks("t1")
+            await db.close()
+            return marks
+
+        assert asyncio.run(run()) == {1: (10, "2026-02-01T10:00:00"), 2: (3, None)}
+
+    def test_restart_resumes_from_processed_messages(self, tmp_path, make_task):
+        db_path = str(tmp_path / "resume.db")
+
+        async def first_run():
+            db = DBService(db_path)
+            await db.init_db()
+            task = make_task("resume-1", db=db)
+            for message_id in (10, 12, 11):
+                await task.process_message(_message(message_id), "@chat")
+            await db.close()
+
+        async def second_run():
+            db = DBService(db_path)
+            await db.init_db()
+            task = make_task("resume-1", db=db)
+            await task._load_watermarks()
+            await db.close()
+            return task
+
+        asyncio.run(first_run())
+        task = asyncio.run(second_run())
+        assert task.resume_msg_id == {CHAT.id: 12}
+        assert task.last_seen_msg_id == {CHAT.id: 12}
+
+
+    def test_failed_message_does_not_move_mark(self, tmp_path, make_task):
+        filters = {'date_from': NOW.date(), 'date_to': NOW.date() + timedelta(days=60),
+                   'min_price': 0, 'max_price': 100000, 'shk_filter': 'любое'}
+        job_date = (NOW + timedelta(days=1)).strftime('%d.%m')
+
+        async def run():
+            db = DBService(str(tmp_path / "failed.db"))
+            await db.init_db()
+            task = make_task("failed-1", filters=filters, db=db)
+
+            async def broken_insert(*args, **kwargs):
+                raise RuntimeError("disk I/O error")
+
+            await task.process_message(_message(5), "@chat")
+            db.add_found_item_deduplicated = broken_insert
+            await task.process_message(_message(6, text=f"Выйду {job_date}, 3000"), "@chat")
+            await db.flush()
+            marks = await db.get_watermarks("failed-1")
+            await db.close()
+            return marks
+
+        assert asyncio.run(run())[CHAT.id][0] == 5
+
+
+class HistoryClient:
+    """История чата newest-first: id 20..1, по сообщению в сутки."""
+
+    def __init__(self, newest=20):
+        self.ids = list(range(newest, 0, -1))
+        self.requests = []
+
+    async def get_chat(self, username):
+        return CHAT
+
+    async def get_chat_history(self, chat_id, limit=0, offset_id=0):
+        self.requests.append((limit, offset_id))
+        ids = [i for i in self.ids if not offset_id or i < offset_id]
+        for i in ids[:limit or None]:
+            yield _message(i, minutes_ago=(self.ids[0] - i) * 60 * 24)
+
+
+class TestResume:
+
+    def test_history_stops_at_mark(self):
+        received = []
+
+        async def handler(message, chat_name):
+            received.append(message.id)
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = HistoryClient()
+            # days=0 (восстановленная задача), но есть отметка — догоняем до неё
+            return await parser.parse_history(
+                '@chat', days=0, handler=handler, min_ids={CHAT.id: 15}, resume_days=30
+            )
+
+        assert asyncio.run(run()) == 5
+        assert received == [20, 19, 18, 17, 16]
+
+    def test_resume_limited_by_resume_days(self):
+        received = []
+
+        async def handler(message, chat_name):
+            received.append(message.id)
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = HistoryClient()
+            # Сообщения идут раз в сутки: моложе 3 дней — id 20..18
+            return await parser.parse_history(
+                '@chat', days=0, handler=handler, min_ids={CHAT.id: 1}, resume_days=3
+            )
+
+        asyncio.run(run())
+        assert received == [20, 19, 18]
+
+    def test_polling_catches_up_to_mark(self):
+        received = []
+
+        async def handler(message, chat_name):
+            received.append(message.id)
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = HistoryClient()
+            await parser.poll_new_messages(['@chat'], {CHAT.id: 8}, handler)
+            return parser.client.requests
+
+        requests = asyncio.run(run())
+        assert received == list(range(9, 21))
+        assert requests == [(5, 0), (100, 16)]
+
+    def test_polling_without_mark_reads_latest_only(self):
+        received = []
+
+        async def handler(message, chat_name):
+            received.append(message.id)
+
+        async def run():
+            parser = TelegramParser(api_id=1, api_hash='x')
+            parser.client = HistoryClient()
+            await parser.poll_new_messages(['@chat'], {}, handler)
+
+        asyncio.run(run())
+        assert received == [16, 17, 18, 19, 20]